@@ -0,0 +1,53 @@
+"""
+Memoria del DataFrame de cotizaciones: frame previo (object/float64/datetime64, todas las
+columnas) frente al frame compacto, completo y con la proyección de cada endpoint.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_cotizaciones_frame           # 100k cotizaciones
+    python -m benchmarks.bench_cotizaciones_frame 500000
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+from services.cotizacion_frame import (
+    ALL_COLUMNS, SUMMARY_COLUMNS, TOP_ESTILO_COLUMNS, TOP_DISTRITO_COLUMNS, build_frame,
+)
+from tests.test_cotizacion_frame import legacy_frame, make_cotizaciones
+
+
+def _mb(df) -> float:
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def main(n: int) -> None:
+    rows = make_cotizaciones(n)
+    print(f"{n} cotizaciones")
+    print(f"{'frame':<28} {'MB':>8} {'bytes/fila':>11} {'build (s)':>10}")
+
+    start = time.perf_counter()
+    legacy = legacy_frame(rows)
+    elapsed = time.perf_counter() - start
+    base = _mb(legacy)
+    print(f"{'previo (todas)':<28} {base:>8.2f} {base * 1024 ** 2 / n:>11.1f} {elapsed:>10.3f}")
+
+    for name, cols in [
+        ("compacto (todas)", ALL_COLUMNS),
+        ("compacto summary", SUMMARY_COLUMNS),
+        ("compacto top-estilo", TOP_ESTILO_COLUMNS),
+        ("compacto top-distrito", TOP_DISTRITO_COLUMNS),
+    ]:
+        keep = ("id",) + tuple(cols)
+        projected = [{c: r[c] for c in keep} for r in rows]  # lo que devuelve el select proyectado
+        start = time.perf_counter()
+        df = build_frame(projected, cols)
+        elapsed = time.perf_counter() - start
+        mb = _mb(df)
+        print(f"{name:<28} {mb:>8.2f} {mb * 1024 ** 2 / n:>11.1f} {elapsed:>10.3f}  ({base / mb:.1f}x menos)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,55 @@
+"""
+Benchmark del escáner de rangos paralelo contra un PostgREST falso con latencia.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_range_scanner                 # 20k filas, 50 ms por petición
+    python -m benchmarks.bench_range_scanner 50000 0.08      # filas, latencia (s)
+concurrency=1 equivale al recorrido secuencial anterior.
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+from benchmarks.fake_postgrest import FakePostgrest
+from services.database_manager import SupabaseManager
+from services.range_scanner import scan_ranges
+
+
+def make_rows(n: int):
+    return [
+        {"id": i + 1, "ultima_interaccion": f"2025-01-01T00:00:{i % 60:02d}+00:00", "nombre": f"Cliente {i}"}
+        for i in range(n)
+    ]
+
+
+async def run_scan(manager: SupabaseManager, concurrency: int) -> int:
+    total = await manager.get_total_count()
+    rows = await scan_ranges(
+        lambda start, end: manager.get_clients_range(start, end, order_by="ultima_interaccion", desc=True),
+        total,
+        page_size=1000,
+        concurrency=concurrency,
+    )
+    return len(rows)
+
+
+def main(n_rows: int, latency: float):
+    with FakePostgrest({"clients_pravi": make_rows(n_rows)}, latency=latency) as server:
+        manager = SupabaseManager(url=server.url, key="dummy")
+        print(f"{n_rows} filas, latencia {latency * 1000:.0f} ms por petición")
+        print(f"{'concurrency':>12} {'segundos':>10} {'filas':>8} {'peticiones':>11}")
+        for concurrency in (1, 2, 4, 8):
+            before = server.requests
+            start = time.perf_counter()
+            count = asyncio.run(run_scan(manager, concurrency))
+            elapsed = time.perf_counter() - start
+            print(f"{concurrency:>12} {elapsed:>10.2f} {count:>8} {server.requests - before:>11}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 20_000, float(args[1]) if len(args) > 1 else 0.05)
@@ -0,0 +1,54 @@
+"""
+Peticiones/segundo contra un PostgREST falso: create_client por petición (como hacían las
+dependencias de las rutas) frente al cliente compartido del registro, con su pool.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_supabase_pool              # 500 peticiones, 16 hilos, 2 ms
+    python -m benchmarks.bench_supabase_pool 5000 32 0.005
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+from supabase import create_client
+
+from benchmarks.fake_postgrest import FakePostgrest
+from services.supabase_registry import SupabaseRegistry
+
+
+def _query(client) -> None:
+    client.table("clients_pravi").select("id,nombre").eq("id", 1).execute()
+
+
+def _run(label: str, n: int, threads: int, task) -> None:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: task(), range(n)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<26} {n / elapsed:>10.0f} req/s  ({elapsed:.2f} s)")
+
+
+def main(n: int, threads: int, latency: float) -> None:
+    rows = [{"id": i, "nombre": f"Cliente {i}"} for i in range(1, 101)]
+    with FakePostgrest({"clients_pravi": rows}, latency=latency) as server:
+        print(f"{n} peticiones, {threads} hilos, latencia {latency * 1000:.0f} ms")
+        _run("create_client por petición", n, threads, lambda: _query(create_client(server.url, "dummy")))
+
+        registry = SupabaseRegistry()
+        _run("cliente compartido", n, threads, lambda: _query(registry.get(server.url, "dummy")))
+        for url, metrics in registry.pool_metrics().items():
+            print(f"pool {url}: {metrics}")
+        registry.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if len(args) > 0 else 500,
+        int(args[1]) if len(args) > 1 else 16,
+        float(args[2]) if len(args) > 2 else 0.002,
+    )
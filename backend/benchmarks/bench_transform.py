@@ -0,0 +1,42 @@
+"""
+Benchmark de DataProcessor.transform_data (motor columnar) frente a la referencia fila a fila.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_transform            # 10k, 100k y 1M filas
+    python -m benchmarks.bench_transform 10000      # tamaños a medida
+La referencia fila a fila solo se mide hasta 100k filas (a 1M tarda minutos).
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+from services.database_module import DataProcessor
+from tests.test_derivation_parity import legacy_transform_data, make_clients
+
+ROWWISE_MAX_ROWS = 100_000
+
+
+def _timed(fn, rows) -> float:
+    start = time.perf_counter()
+    fn(rows)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'filas':>10} {'columnar (s)':>14} {'fila a fila (s)':>16} {'speedup':>9}")
+    base = make_clients(10_000)
+    for n in sizes:
+        rows = (base * (n // len(base) + 1))[:n]
+        vectorized = _timed(DataProcessor.transform_data, rows)
+        if n <= ROWWISE_MAX_ROWS:
+            rowwise = _timed(legacy_transform_data, rows)
+            print(f"{n:>10} {vectorized:>14.3f} {rowwise:>16.3f} {rowwise / vectorized:>8.1f}x")
+        else:
+            print(f"{n:>10} {vectorized:>14.3f} {'-':>16} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
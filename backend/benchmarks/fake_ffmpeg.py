@@ -0,0 +1,31 @@
+"""
+FFmpeg falso para tests: lee el audio de stdin (o del archivo de -i) y escribe "ID3" + el audio
+en stdout. FAKE_FFMPEG_SLEEP simula una conversión lenta; una entrada que empieza con "bad"
+termina con error, y un MP4 ('ftyp') por pipe falla como uno con el 'moov' al final.
+"""
+import os
+import sys
+import time
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    source = args[args.index("-i") + 1]
+    if source == "pipe:0":
+        data = sys.stdin.buffer.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    time.sleep(float(os.environ.get("FAKE_FFMPEG_SLEEP", "0")))
+    if source == "pipe:0" and data[4:8] == b"ftyp":
+        sys.stderr.write("pipe:0: moov atom not found\n")
+        return 1
+    if data.startswith(b"bad"):
+        sys.stderr.write("Invalid data found when processing input\n")
+        return 1
+    sys.stdout.buffer.write(b"ID3" + data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
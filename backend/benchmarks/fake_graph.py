@@ -0,0 +1,123 @@
+"""
+Graph API de WhatsApp falsa en un hilo local, para tests y benchmarks.
+
+Soporta lo que usa el backend: POST /{phone_id}/messages, POST /{phone_id}/media (multipart),
+GET /{media_id} (URL temporal) y GET /download/{media_id} (el archivo, por trozos).
+`fail_next` encola respuestas de error (status, headers[, error]) para probar reintentos y límites.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+
+class FakeGraph:
+    def __init__(self, token: str = "dummy-token", media: Optional[Dict[str, bytes]] = None, latency: float = 0.0, chunk_size: int = 64 * 1024):
+        self.token = token
+        self.media: Dict[str, bytes] = dict(media or {})
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.fail_next: List[Tuple[Any, ...]] = []
+        self.requests: List[Tuple[str, str]] = []
+        self.sent: List[Dict[str, Any]] = []
+        self.uploads: List[bytes] = []
+        self.peers: Set[Tuple[str, int]] = set()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v20.0"
+
+    def start(self) -> "FakeGraph":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if isinstance(body, bytes) else "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                for i in range(0, len(payload), fake.chunk_size):
+                    self.wfile.write(payload[i:i + fake.chunk_size])
+
+            def _begin(self) -> Optional[List[str]]:
+                """Registra la petición y responde error si toca; devuelve las partes del path."""
+                length = int(self.headers.get("Content-Length") or 0)
+                self.body = self.rfile.read(length) if length else b""
+                with fake._lock:
+                    fake.requests.append((self.command, self.path))
+                    fake.peers.add(self.client_address)
+                    failure = fake.fail_next.pop(0) if fake.fail_next else None
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if self.headers.get("Authorization") != f"Bearer {fake.token}":
+                    self._send(401, {"error": {"message": "Invalid OAuth access token"}})
+                    return None
+                if failure is not None:
+                    status, headers, *error = failure
+                    self._send(status, {"error": error[0] if error else {"message": "fallo simulado", "code": status}}, headers)
+                    return None
+                parts = [p for p in urlsplit(self.path).path.split("/") if p]
+                return parts[1:] if parts and parts[0].startswith("v") else parts
+
+            def do_GET(self):
+                parts = self._begin()
+                if parts is None:
+                    return
+                if len(parts) == 2 and parts[0] == "download" and parts[1] in fake.media:
+                    self._send(200, fake.media[parts[1]])
+                elif len(parts) == 1 and parts[0] in fake.media:
+                    base = fake.url.rsplit("/", 1)[0]
+                    self._send(200, {
+                        "id": parts[0],
+                        "url": f"{base}/download/{parts[0]}",
+                        "file_size": len(fake.media[parts[0]]),
+                    })
+                else:
+                    self._send(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                parts = self._begin()
+                if parts is None:
+                    return
+                if len(parts) == 2 and parts[1] == "messages":
+                    with fake._lock:
+                        fake.sent.append(json.loads(self.body or b"{}"))
+                        n = len(fake.sent)
+                    self._send(200, {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.{n}"}]})
+                elif len(parts) == 2 and parts[1] == "media":
+                    with fake._lock:
+                        fake.uploads.append(self.body)
+                        media_id = f"media-{len(fake.uploads)}"
+                    self._send(200, {"id": media_id})
+                else:
+                    self._send(404, {"error": {"message": "not found"}})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeGraph":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,197 @@
+"""
+PostgREST falso en un hilo local para benchmarks: tablas en memoria y latencia configurable.
+
+Soporta lo que usa el backend: select (columnas simples), filtros eq/neq/gt/gte/lt/lte/in/is,
+or=(...) con and(...) anidados, order, offset/limit, Prefer: count=exact (Content-Range), HEAD
+e inserts por POST.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+RESERVED_PARAMS = {"select", "order", "offset", "limit", "columns", "on_conflict", "or", "and"}
+
+
+def _coerce(value: Any, raw: str) -> Any:
+    if isinstance(value, bool):
+        return raw.lower() == "true"
+    if isinstance(value, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _split_top_level(body: str) -> List[str]:
+    """'a.eq.1,and(b.lt.2,c.gt.3)' -> ['a.eq.1', 'and(b.lt.2,c.gt.3)'] (respeta paréntesis y comillas)."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in body:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    return parts + [current] if current else parts
+
+
+def _matches_logic(row: Dict[str, Any], op: str, expr: str) -> bool:
+    results = []
+    for item in _split_top_level(expr.strip()[1:-1]):
+        if item.startswith(("and(", "or(")):
+            name, _, rest = item.partition("(")
+            results.append(_matches_logic(row, name, "(" + rest))
+        else:
+            column, _, condition = item.partition(".")
+            results.append(_matches(row, column, condition))
+    return all(results) if op == "and" else any(results)
+
+
+def _matches(row: Dict[str, Any], column: str, expr: str) -> bool:
+    op, _, raw = expr.partition(".")
+    raw = raw.strip('"')
+    value = row.get(column)
+    if op == "is":
+        return value is None if raw == "null" else str(value).lower() == raw
+    if op == "in":
+        options = [v.strip('"') for v in raw.strip("()").split(",")]
+        return value is not None and str(value) in options
+    if value is None:
+        return False
+    other = _coerce(value, raw)
+    if op == "eq":
+        return value == other
+    if op == "neq":
+        return value != other
+    if op == "gt":
+        return value > other
+    if op == "gte":
+        return value >= other
+    if op == "lt":
+        return value < other
+    if op == "lte":
+        return value <= other
+    return True
+
+
+class FakePostgrest:
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], latency: float = 0.0, max_rows: int = 1000):
+        self.tables = tables
+        self.latency = latency
+        self.max_rows = max_rows
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakePostgrest":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _table(self):
+                parts = urlsplit(self.path)
+                name = parts.path.rstrip("/").rsplit("/", 1)[-1]
+                return name, parse_qsl(parts.query, keep_blank_values=True)
+
+            def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None, head: bool = False):
+                payload = json.dumps(body, default=str).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(0 if head else len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if not head:
+                    self.wfile.write(payload)
+
+            def _select(self, head: bool = False):
+                fake._tick()
+                name, params = self._table()
+                rows = list(fake.tables.get(name, []))
+                for key, expr in params:
+                    if key in ("or", "and"):
+                        rows = [r for r in rows if _matches_logic(r, key, expr)]
+                    elif key not in RESERVED_PARAMS:
+                        rows = [r for r in rows if _matches(r, key, expr)]
+                total = len(rows)
+                orders = dict(params).get("order")
+                if orders:
+                    for spec in reversed(orders.split(",")):
+                        col, _, direction = spec.partition(".")
+                        desc = direction.startswith("desc")
+                        present = [r for r in rows if r.get(col) is not None]
+                        missing = [r for r in rows if r.get(col) is None]
+                        present.sort(key=lambda r: r[col], reverse=desc)
+                        rows = missing + present if desc else present + missing
+                offset = int(dict(params).get("offset", 0))
+                limit = min(int(dict(params).get("limit", fake.max_rows)), fake.max_rows)
+                page = rows[offset:offset + limit]
+                select = dict(params).get("select", "*")
+                if select != "*":
+                    cols = [c.strip() for c in select.split(",")]
+                    page = [{c: r.get(c) for c in cols} for r in page]
+                headers = {}
+                if "count=exact" in (self.headers.get("Prefer") or ""):
+                    end = offset + len(page) - 1
+                    headers["Content-Range"] = f"{offset}-{end}/{total}" if page else f"*/{total}"
+                self._send(200, page, headers, head=head)
+
+            def do_GET(self):
+                self._select()
+
+            def do_HEAD(self):
+                self._select(head=True)
+
+            def do_POST(self):
+                fake._tick()
+                name, _ = self._table()
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null")
+                items = body if isinstance(body, list) else [body]
+                table = fake.tables.setdefault(name, [])
+                with fake._lock:
+                    for item in items:
+                        item.setdefault("id", len(table) + 1)
+                        table.append(item)
+                self._send(201, items)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _tick(self) -> None:
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def __enter__(self) -> "FakePostgrest":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,88 @@
+"""
+Supabase Storage falso en un hilo local: POST /storage/v1/object/{bucket}/{path} con el cuerpo
+crudo. Lee por trozos y solo guarda tamaño y encabezados, para medir subidas grandes.
+`latency` demora cada respuesta y `fail_next` encola códigos de error.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+PREFIX = "/storage/v1/object/"
+
+
+class FakeStorage:
+    def __init__(self, key: str = "dummy", latency: float = 0.0):
+        self.key = key
+        self.latency = latency
+        self.fail_next: List[int] = []
+        self.uploads: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeStorage":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                remaining = int(self.headers.get("Content-Length") or 0)
+                size = 0
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 64 * 1024))
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    remaining -= len(chunk)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                with fake._lock:
+                    failure = fake.fail_next.pop(0) if fake.fail_next else None
+                if failure:
+                    self._send(failure, b'{"error": "fallo simulado"}')
+                    return
+                if self.headers.get("Authorization") != f"Bearer {fake.key}" or not self.path.startswith(PREFIX):
+                    self._send(401 if self.path.startswith(PREFIX) else 404, b'{"error": "rechazado"}')
+                    return
+                with fake._lock:
+                    fake.uploads.append({
+                        "path": self.path[len(PREFIX):],
+                        "size": size,
+                        "content_type": self.headers.get("Content-Type"),
+                        "cache_control": self.headers.get("Cache-Control"),
+                        "upsert": self.headers.get("x-upsert"),
+                    })
+                self._send(200, b'{"Key": "ok"}')
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeStorage":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
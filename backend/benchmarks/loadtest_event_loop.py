@@ -0,0 +1,113 @@
+"""
+Prueba de carga contra un PostgREST falso: N consultas simultáneas en un solo event loop y
+cuánto se retrasa el loop mientras tanto (lag = retraso de un asyncio.sleep periódico).
+
+Modos:
+    bloqueante  cliente sync llamado dentro de async def (como chat_manager antes)
+    to_thread   cliente sync envuelto en asyncio.to_thread (como los managers antes)
+    async       PostgREST async del registro (services/supabase_registry.get_async_postgrest)
+
+Uso (desde backend/):
+    python -m benchmarks.loadtest_event_loop                 # 300 consultas, 20 ms de latencia
+    python -m benchmarks.loadtest_event_loop 1000 0.05
+"""
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+from benchmarks.fake_postgrest import FakePostgrest
+from services.supabase_registry import SupabaseRegistry
+
+
+def _worker_threads() -> int:
+    # hilos del executor por defecto (to_thread) y de anyio (DNS de httpx async)
+    return sum(1 for t in threading.enumerate() if t.name.startswith(("asyncio_", "AnyIO")))
+
+
+class LoopLagMonitor:
+    """Mide cada `interval` s cuánto tarda de más el loop en despertar un sleep."""
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.lags = []
+        self.peak_threads = 0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+            self.peak_threads = max(self.peak_threads, _worker_threads())
+
+    async def __aenter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        # el monitor ya tiene un sleep en curso: si la carga bloquea el loop, ese retraso se mide
+        await asyncio.sleep(self.interval * 2)
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.sleep(self.interval * 2)  # deja registrar la muestra pendiente
+        self._task.cancel()
+
+    def summary(self):
+        lags = sorted(self.lags) or [0.0]
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        return statistics.median(lags) * 1000, p99 * 1000, lags[-1] * 1000
+
+
+async def run_mode(mode: str, registry: SupabaseRegistry, url: str, n: int):
+    sync_client = registry.get(url, "dummy")
+
+    async def one(i: int):
+        if mode == "bloqueante":
+            return sync_client.table("clients_pravi").select("id").eq("id", i % 100 + 1).execute()
+        if mode == "to_thread":
+            return await asyncio.to_thread(
+                lambda: sync_client.table("clients_pravi").select("id").eq("id", i % 100 + 1).execute()
+            )
+        return await registry.get_async(url, "dummy").table("clients_pravi").select("id").eq("id", i % 100 + 1).execute()
+
+    await one(0)  # conexión inicial e imports perezosos fuera de la medición
+    async with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        elapsed = time.perf_counter() - start
+    return elapsed, monitor
+
+
+def _serve(latency: float, urls, stop) -> None:
+    # en otro proceso: los hilos del servidor no compiten por el GIL con el loop medido
+    with FakePostgrest({"clients_pravi": [{"id": i} for i in range(1, 101)]}, latency=latency) as server:
+        urls.put(server.url)
+        stop.wait()
+
+
+def main(n: int, latency: float) -> None:
+    urls, stop = multiprocessing.Queue(), multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve, args=(latency, urls, stop), daemon=True)
+    process.start()
+    server_url = urls.get(timeout=10)
+    try:
+        print(f"{n} consultas simultáneas, latencia {latency * 1000:.0f} ms")
+        print(f"{'modo':<11} {'seg':>7} {'req/s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag máx ms':>11} {'hilos':>6}")
+        for mode in ("bloqueante", "to_thread", "async"):
+            registry = SupabaseRegistry()
+            elapsed, monitor = asyncio.run(run_mode(mode, registry, server_url, n))
+            p50, p99, worst = monitor.summary()
+            print(f"{mode:<11} {elapsed:>7.2f} {n / elapsed:>8.0f} {p50:>11.2f} {p99:>11.2f} {worst:>11.2f} {monitor.peak_threads:>6}")
+            registry.close()
+    finally:
+        stop.set()
+        process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 300, float(args[1]) if len(args) > 1 else 0.02)
@@ -19,3 +19,97 @@ WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 
 # WebSocket URL
 BACKEND_WS_URL = os.getenv("BACKEND_WS_URL")
+
+# Caché de clientes en proceso (segundos)
+CLIENTS_SNAPSHOT_TTL = float(os.getenv("CLIENTS_SNAPSHOT_TTL", "60"))
+CLIENTS_SNAPSHOT_FULL_TTL = float(os.getenv("CLIENTS_SNAPSHOT_FULL_TTL", "900"))
+
+# Dashboard en modo streaming: agrega página a página sin cargar toda la tabla en memoria
+DASHBOARD_STREAMING = os.getenv("DASHBOARD_STREAMING", "0") == "1"
+DASHBOARD_STREAM_PAGE_SIZE = int(os.getenv("DASHBOARD_STREAM_PAGE_SIZE", "1000"))
+DASHBOARD_STREAM_CONCURRENCY = int(os.getenv("DASHBOARD_STREAM_CONCURRENCY", "4"))
+
+# Recorridos completos de tablas: peticiones de rango simultáneas
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "4"))
+
+# Rollup mensual de cotizaciones (segundos): lectura incremental del mes en curso y recálculo completo
+COTIZ_ROLLUP_REFRESH = float(os.getenv("COTIZ_ROLLUP_REFRESH", "30"))
+COTIZ_ROLLUP_CURRENT_TTL = float(os.getenv("COTIZ_ROLLUP_CURRENT_TTL", "300"))
+
+# Frame de cotizaciones compartido (summary/top-*): ttl en segundos (0 = sin caché) y modo stale-while-revalidate
+COTIZ_FRAME_TTL = float(os.getenv("COTIZ_FRAME_TTL", "60"))
+COTIZ_FRAME_SWR = os.getenv("COTIZ_FRAME_SWR", "0") == "1"
+
+# Pool HTTP del cliente Supabase compartido (services/supabase_registry.py)
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "60"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "120"))
+
+# Cabezas de conversación (último mensaje por sesión): lectura incremental y nueva siembra (segundos)
+CHAT_HEADS_REFRESH = float(os.getenv("CHAT_HEADS_REFRESH", "5"))
+CHAT_HEADS_FULL_TTL = float(os.getenv("CHAT_HEADS_FULL_TTL", "900"))
+
+# Mensajes en vivo por WebSocket (/chat/ws): mensajes recientes retenidos para reanudar,
+# intervalo del sondeo compartido a la BD (segundos) y cola máxima por visor
+CHAT_EVENTS_BUFFER = int(os.getenv("CHAT_EVENTS_BUFFER", "2000"))
+CHAT_EVENTS_POLL = float(os.getenv("CHAT_EVENTS_POLL", "2"))
+CHAT_EVENTS_QUEUE = int(os.getenv("CHAT_EVENTS_QUEUE", "500"))
+
+# /chat/updates: máximo de filas por respuesta
+CHAT_UPDATES_MAX_ROWS = int(os.getenv("CHAT_UPDATES_MAX_ROWS", "500"))
+
+# Estado del bot por sesión (chat_activation_pravi) en memoria: segundos de validez
+BOT_STATUS_TTL = float(os.getenv("BOT_STATUS_TTL", "15"))
+
+# Graph API de WhatsApp (services/whatsapp_client.py): timeouts en segundos de mensajes/consultas
+# y de subida/descarga de media, reintentos ante 429/5xx, espera máxima por reintento y pool
+WHATSAPP_TIMEOUT = float(os.getenv("WHATSAPP_TIMEOUT", "30"))
+WHATSAPP_MEDIA_TIMEOUT = float(os.getenv("WHATSAPP_MEDIA_TIMEOUT", "120"))
+WHATSAPP_MAX_RETRIES = int(os.getenv("WHATSAPP_MAX_RETRIES", "3"))
+WHATSAPP_MAX_BACKOFF = float(os.getenv("WHATSAPP_MAX_BACKOFF", "30"))
+WHATSAPP_MAX_CONNECTIONS = int(os.getenv("WHATSAPP_MAX_CONNECTIONS", "20"))
+
+# Media entrante (services/media_transfer.py): bytes que una transferencia puede tener en memoria
+# antes de pasar a disco y tamaño de los trozos de descarga/subida
+MEDIA_MEMORY_BUDGET = int(os.getenv("MEDIA_MEMORY_BUDGET", str(8 * 1024 * 1024)))
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(256 * 1024)))
+
+# SQLite local (services/local_store.py): cola de media entrante e índices que sobreviven a reinicios
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pravi_local.db"))
+
+# Media entrante en segundo plano: 202 inmediato y jobs con concurrencia e intentos acotados
+MEDIA_INBOUND_ASYNC = os.getenv("MEDIA_INBOUND_ASYNC", "1") == "1"
+MEDIA_JOB_CONCURRENCY = int(os.getenv("MEDIA_JOB_CONCURRENCY", "4"))
+MEDIA_JOB_MAX_ATTEMPTS = int(os.getenv("MEDIA_JOB_MAX_ATTEMPTS", "3"))
+MEDIA_JOB_RETRY_DELAY = float(os.getenv("MEDIA_JOB_RETRY_DELAY", "5"))
+
+# Índice de idempotencia de la media entrante (services/media_index.py): entradas 'done' en
+# memoria y segundos tras los que una entrada 'pending' abandonada se puede reclamar
+INBOUND_MEDIA_INDEX_SIZE = int(os.getenv("INBOUND_MEDIA_INDEX_SIZE", "10000"))
+INBOUND_MEDIA_PENDING_TTL = float(os.getenv("INBOUND_MEDIA_PENDING_TTL", "900"))
+
+# Conversión de audios de asesores a MP3 (services/transcoder.py): procesos FFmpeg a la vez,
+# conversiones en espera antes de responder 503 y segundos máximos por conversión
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", str(min(4, os.cpu_count() or 2))))
+TRANSCODE_MAX_QUEUE = int(os.getenv("TRANSCODE_MAX_QUEUE", "16"))
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT", "60"))
+
+# Registro de media por contenido (services/media_registry.py): vida de un media_id subido a la
+# Graph API (Meta lo borra a los 30 días) y audios convertidos que se conservan
+WHATSAPP_MEDIA_TTL = float(os.getenv("WHATSAPP_MEDIA_TTL", str(29 * 24 * 3600)))
+CONVERTED_AUDIO_ENTRIES = int(os.getenv("CONVERTED_AUDIO_ENTRIES", "200"))
+
+# Difusión de un mensaje del asesor a varias sesiones (/chat/broadcast): envíos por segundo a la
+# Graph API (compartidos entre difusiones), ráfaga, envíos en vuelo y destinatarios por llamada
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "10"))
+BROADCAST_BURST = int(os.getenv("BROADCAST_BURST", "20"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_MAX_RECIPIENTS = int(os.getenv("BROADCAST_MAX_RECIPIENTS", "500"))
+
+# Write-behind de persist_message (services/message_batcher.py): segundos que se juntan mensajes
+# antes de insertarlos en un solo lote (0 = desactivado, un insert por mensaje) y filas por lote
+MESSAGE_BATCH_WINDOW = float(os.getenv("MESSAGE_BATCH_WINDOW", "0"))
+MESSAGE_BATCH_MAX_ROWS = int(os.getenv("MESSAGE_BATCH_MAX_ROWS", "100"))
@@ -16,6 +16,10 @@ from tasks.polling import schedule_polling
 from routes import dashboard
 from routes import table_data
 from routes.chats import router as chat_router, media_inbound_router
+from services.supabase_registry import REGISTRY
+from services.chat_manager import AUDIO_TRANSCODER, MEDIA_JOBS, MEDIA_REGISTRY, MESSAGE_BATCHER
+from services.whatsapp_client import close_whatsapp_clients
+from services.media_transfer import TRANSFER_METRICS, close_storage_uploaders
 
 
 app = FastAPI(title="VISOR-PRAVI API", version="1.0.0")
@@ -46,6 +50,39 @@ scheduler.start()
 def shutdown_event():
     scheduler.shutdown()
 
+@app.on_event("startup")
+async def start_media_jobs():
+    # Retoma los jobs de media que quedaron pendientes antes del reinicio
+    await MEDIA_JOBS.start()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await MEDIA_JOBS.stop()
+    # Los mensajes que esperaban su lote se insertan antes de cerrar
+    await MESSAGE_BATCHER.flush()
+    await close_whatsapp_clients()
+    await close_storage_uploaders()
+
 @app.get("/")
 async def root():
     return {"message": "VISOR-TRAN API is running"}
+
+@app.get("/metrics/supabase-pool")
+async def supabase_pool_metrics():
+    """Pool HTTP del cliente Supabase compartido: en uso, conexiones ociosas y espera por cupo."""
+    return REGISTRY.pool_metrics()
+
+@app.get("/metrics/media-transfers")
+async def media_transfer_metrics():
+    """Media entrante: transferencias, bytes, cuántas pasaron a disco y MB/s promedio por etapa."""
+    return TRANSFER_METRICS.snapshot()
+
+@app.get("/metrics/media-registry")
+async def media_registry_metrics():
+    """Media por contenido: URLs de Storage y media_id vigentes registrados, audios convertidos y aciertos."""
+    return MEDIA_REGISTRY.stats()
+
+@app.get("/metrics/transcoder")
+async def transcoder_metrics():
+    """Conversión de audio a MP3: en curso, en cola, rechazadas, timeouts y latencia p50/p95."""
+    return AUDIO_TRANSCODER.stats()
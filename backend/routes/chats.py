@@ -1,25 +1,68 @@
-from fastapi import APIRouter, Body, Query, UploadFile, File, Form, HTTPException, Header
-from schemas.chat import BotActivationRequest, AdvisorMessageRequest
+from typing import Literal
+from fastapi import APIRouter, Body, Query, UploadFile, File, Form, HTTPException, Header, Response, WebSocket
+from config import CHAT_UPDATES_MAX_ROWS
+from schemas.chat import BotActivationRequest, AdvisorMessageRequest, BroadcastRequest
 from services.chat_manager import (get_active_conversations , 
                                    get_conversations_messages,
-                                   get_bot_status, 
-                                   get_new_messages_since, send_advisor_message_to_session, 
-                                   send_media_message_to_session, ingest_inbound_media_message, supabase )
+                                   get_bot_status, get_bot_statuses, set_bot_status,
+                                   get_new_messages_since, send_advisor_message_to_session, broadcast_advisor_message,
+                                   send_media_message_to_session, receive_inbound_media, get_media_job,
+                                   serve_chat_events )
 
 router = APIRouter(prefix="/chat", tags=["Chat Viewer"])
 media_inbound_router = APIRouter(tags=["Media Inbound"])
 
 @router.get("/conversation")
-async def list_conversations():
-    return await get_active_conversations()
+async def list_conversations(
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = Query(None),
+):
+    """Último mensaje por sesión. Con `limit` responde {data, next_cursor} para paginar."""
+    return await get_active_conversations(limit=limit, cursor=cursor)
 
 @router.get("/messages/{session_id}")
-async def list_messages(session_id: str):
-    return await get_conversations_messages(session_id)
+async def list_messages(
+    session_id: str,
+    limit: int | None = Query(None, ge=1, le=1000),
+    before: str | None = Query(None),
+    after: str | None = Query(None),
+    view: Literal["full", "slim"] = Query("full"),
+):
+    """
+    Historial de la sesión. Sin parámetros, la lista completa; con `limit`/`before`/`after`
+    pagina por (time, id) y responde {data, before_cursor, after_cursor}.
+    """
+    return await get_conversations_messages(session_id, limit=limit, before=before, after=after, view=view)
+
+@router.websocket("/ws")
+async def chat_events(
+    websocket: WebSocket,
+    session_ids: str | None = Query(None),
+    cursor: str | None = Query(None),
+):
+    """Mensajes nuevos en vivo. `session_ids` separados por coma; `cursor` para reanudar."""
+    ids = [s for s in session_ids.split(",") if s] if session_ids else None
+    await serve_chat_events(websocket, ids, cursor)
 
 @router.get("/updates")
-async def get_updates(since:str = Query(None)):
-    return await get_new_messages_since(since)
+async def get_updates(
+    since: str | None = Query(None),
+    cursor: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=CHAT_UPDATES_MAX_ROWS),
+    session_ids: str | None = Query(None),
+):
+    """
+    Mensajes nuevos. Con `cursor`/`limit`/`session_ids` (separados por coma) responde
+    {data, next_since}; `next_since` se pasa como `cursor` en la siguiente consulta.
+    """
+    ids = [s for s in session_ids.split(",") if s] if session_ids else None
+    return await get_new_messages_since(since, limit=limit, session_ids=ids, cursor=cursor)
+
+@router.get("/bot-status")
+async def get_bot_statuses_endpoint(session_ids: str = Query(..., min_length=1)):
+    """Estado del bot de varias sesiones (separadas por coma) en una sola llamada"""
+    ids = [s for s in session_ids.split(",") if s]
+    return await get_bot_statuses(ids)
 
 @router.get("/bot-status/{session_id}")
 async def get_bot_status_endpoint(session_id: str):
@@ -28,17 +71,11 @@ async def get_bot_status_endpoint(session_id: str):
     return {"session_id": session_id, "is_active": status}
 
 @router.post("/bot-status")
-async def set_bot_status(
+async def set_bot_status_endpoint(
     payload: BotActivationRequest = Body(...)
 ):
     try:
-        record = {
-            "session_id": payload.session_id,
-            "is_active": payload.is_active
-        }
-        result = supabase.client.table("chat_activation_pravi") \
-            .upsert(record, on_conflict="session_id") \
-            .execute()
+        result = await set_bot_status(payload.session_id, payload.is_active)
 
         status = "bot_resumed" if payload.is_active else "bot_paused"
         return {"status": status, "data": result.data}
@@ -57,6 +94,15 @@ async def send_advisor_message(payload: AdvisorMessageRequest):
     
     return await send_advisor_message_to_session(session_id, message)
 
+@router.post("/broadcast")
+async def broadcast(payload: BroadcastRequest):
+    """Mismo mensaje del asesor (texto o media por URL) a varias sesiones, con resultado por destinatario."""
+    return await broadcast_advisor_message(
+        payload.session_ids,
+        payload.message,
+        payload.media.model_dump() if payload.media else None,
+    )
+
 @router.post("/send-media")
 async def send_media(
     session_id: str = Form(...),
@@ -65,19 +111,35 @@ async def send_media(
 ):
     return await send_media_message_to_session(session_id, file, media_type)
 
+async def _receive_inbound(payload: dict, x_internal_token: str | None, response: Response):
+    result = await receive_inbound_media(payload, x_internal_token)
+    if result.get("status") in ("queued", "in_progress"):
+        response.status_code = 202
+    return result
+
 @router.post("/media/inbound")
 async def inbound_media_chat(
+    response: Response,
     payload: dict = Body(...),
     x_internal_token: str | None = Header(None, alias="X-Internal-Token")
 ):
-    return await ingest_inbound_media_message(payload, x_internal_token)
+    return await _receive_inbound(payload, x_internal_token, response)
 
 @media_inbound_router.post("/media/inbound")
 async def inbound_media_root(
+    response: Response,
     payload: dict = Body(...),
     x_internal_token: str | None = Header(None, alias="X-Internal-Token")
 ):
-    return await ingest_inbound_media_message(payload, x_internal_token)
+    return await _receive_inbound(payload, x_internal_token, response)
+
+@media_inbound_router.get("/media/jobs/{job_id}")
+async def media_job_status(
+    job_id: str,
+    x_internal_token: str | None = Header(None, alias="X-Internal-Token")
+):
+    """Estado de un job de media entrante: queued, running, done (con result) o failed (con error)."""
+    return await get_media_job(job_id, x_internal_token)
 
 
 #Futura mejora// no se si funcione pero por ahora no se implementará, a menos que sea necesaria de urgencia
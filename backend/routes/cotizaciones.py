@@ -1,6 +1,7 @@
 # routes/cotizaciones.py
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query
 from config import SUPABASE_KEY, SUPABASE_URL
+from services.chat_manager import authorize_inbound_media
 from services.cotizacion_dashboard import CotizacionDashboard 
 from services.cotizacion_manager import CotizacionesManager
 
@@ -9,8 +10,14 @@ router = APIRouter(prefix="/cotizaciones", tags=["cotizaciones"])
 def get_cotiz_manager() -> CotizacionesManager:
     return CotizacionesManager()
 
+_cotiz_dashboard: CotizacionDashboard | None = None
+
 def get_cotiz_dashboard() -> CotizacionDashboard:
-    return CotizacionDashboard()
+    # Una sola instancia (y un solo cliente Supabase) para todo el proceso
+    global _cotiz_dashboard
+    if _cotiz_dashboard is None:
+        _cotiz_dashboard = CotizacionDashboard()
+    return _cotiz_dashboard
 
 #Route de Test Unitario
 @router.get("/test/last5")
@@ -36,14 +43,16 @@ async def metrics_summary(mgr: CotizacionDashboard = Depends(get_cotiz_dashboard
 @router.get("/series-monthly")
 async def cotizaciones_series_monthly(
     tz: str = Query("America/Lima"),
+    months_back: int = Query(12, ge=1, le=120),
     mgr: CotizacionDashboard = Depends(get_cotiz_dashboard),
 ):
     """
     mode=business -> agrupa por fecha_hora (fecha de la cotización)
     mode=ingreso  -> agrupa por coalesce(fecha_hora, created_at)
     tz            -> zona horaria para definir el mes (ej: America/Lima)
+    months_back   -> cantidad de meses hasta el actual (se sirve desde el rollup mensual)
     """
-    return await mgr.series_monthly(tz=tz)
+    return await mgr.series_monthly(months_back=months_back, tz=tz)
 
 @router.get("/top-estilo")
 async def metrics_top_estilo(limit: int = 5, mgr: CotizacionDashboard = Depends(get_cotiz_dashboard)):
@@ -53,6 +62,19 @@ async def metrics_top_estilo(limit: int = 5, mgr: CotizacionDashboard = Depends(
 async def metrics_top_distrito(limit: int = 5, mgr: CotizacionDashboard = Depends(get_cotiz_dashboard)):
     return await mgr.top_distrito(limit=limit)
 
+@router.post("/cache/invalidate")
+async def invalidate_cache(
+    x_internal_token: str | None = Header(None, alias="X-Internal-Token"),
+    mgr: CotizacionDashboard = Depends(get_cotiz_dashboard),
+):
+    """
+    Descarta el frame compartido y el rollup mensual; la próxima lectura vuelve a la BD.
+    Solo con X-Internal-Token (como /media/jobs): cada llamada obliga a recargar toda la tabla.
+    """
+    authorize_inbound_media(x_internal_token)
+    mgr.invalidate_cache()
+    return {"ok": True}
+
 @router.get("/histogram")
 async def histogram(
     bin: int = Query(5, ge=1, le=1000),
@@ -1,11 +1,26 @@
 # backend/routes/dashboard.py
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, HTTPException, Query
+from typing import Optional
 from services.database_manager import SupabaseManager
-from services.dashboard_manager import DashboardManager
+from services.dashboard_manager import DashboardManager, BUNDLE_SECTIONS
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 dashboard = DashboardManager(SupabaseManager())
 
+@router.get("/bundle")
+async def get_dashboard_bundle(
+    sections: Optional[str] = Query(None, description="Secciones separadas por coma (ej: metrics,followup). Vacío = todas")
+):
+    """Todas las secciones pedidas con una sola carga y derivación del DataFrame."""
+    wanted = [s.strip() for s in (sections or "").split(",") if s.strip()]
+    unknown = [s for s in wanted if s not in BUNDLE_SECTIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Secciones desconocidas: {', '.join(unknown)}. Disponibles: {', '.join(BUNDLE_SECTIONS)}",
+        )
+    return await dashboard.get_bundle(wanted or None)
+
 @router.get("/metrics")
 async def get_dashboard_metrics():
     return await dashboard.get_metrics_summary()
@@ -43,9 +43,8 @@ def _dist(df: pd.DataFrame, col: str) -> dict:
 async def get_table_chart_data(
     scope: Literal["total", "mes_actual"] = Query("total", description="total | mes_actual")
 ):
-    # 1) Traer datos (todos) y derivar (seguimiento/calificación requieren derivación)
-    raw = await db.get_all_clients()
-    df = DataProcessor.transform_data(raw) if raw else pd.DataFrame()
+    # 1) Datos ya derivados (seguimiento/calificación) desde el snapshot compartido
+    df = await db.get_clients_dataframe()
 
     # 2) Filtrar mes si aplica
     df_scope = _filter_current_month(df) if scope == "mes_actual" else df
@@ -128,10 +127,33 @@ async def get_clients(
                 "current_page_count": len(records),
                 "client_stats": DataProcessor.get_client_counts(df),
             }
-        else:
-        # Camino para calificación (y otros derivados): traer todo -> derivar -> filtrar -> paginar en memoria
-            raw = await db.get_all_clients_allpages()
-            df = DataProcessor.transform_data(raw) if raw else pd.DataFrame()
+
+        has_other_filters = any(
+            v for v in [*db_filtros.values(), mes, año, tipo_cliente] if v not in (None, "")
+        )
+        if not has_other_filters:
+            # Solo filtros derivados: el índice da los ids de la página y se piden solo esas filas
+            seg_label = seguimiento if str(seguimiento or "").strip().lower() in {"agendado", "seguimiento", "no cliente"} else None
+            result = await db.get_clients_by_derived_labels(
+                page, size,
+                seguimiento=seg_label,
+                calificacion=calificacion,
+                calificacion_nivel=calificacion_nivel,
+            )
+            page_df = DataProcessor.transform_data(result["data"]) if result["data"] else pd.DataFrame()
+            records = sanitize_dataframe(page_df) if not page_df.empty else []
+            return {
+                "total": result["total"],
+                "data": records,
+                "page": page,
+                "size": size,
+                "total_pages": (result["total"] + size - 1) // size,
+                "current_page_count": len(records),
+                "client_stats": DataProcessor.get_client_counts(page_df),
+            }
+
+        # Derivados combinados con otros filtros: snapshot ya derivado -> filtrar -> paginar en memoria
+        df = await db.get_clients_dataframe()
 
         if any(v for v in local_filtros.values() if v not in (None, "")):
             df = DataProcessor.filter_data(df, local_filtros)
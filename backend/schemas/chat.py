@@ -1,3 +1,4 @@
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 class BotActivationRequest(BaseModel):
@@ -6,4 +7,15 @@ class BotActivationRequest(BaseModel):
 
 class AdvisorMessageRequest(BaseModel):
     session_id: str
-    message: str
\ No newline at end of file
+    message: str
+
+class BroadcastMedia(BaseModel):
+    url: str
+    kind: Literal["image", "audio", "video", "document"] = "document"
+    mime: Optional[str] = None
+    name: Optional[str] = None
+
+class BroadcastRequest(BaseModel):
+    session_ids: List[str]
+    message: Optional[str] = None
+    media: Optional[BroadcastMedia] = None
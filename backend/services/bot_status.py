@@ -0,0 +1,92 @@
+# services/bot_status.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+FetchStatuses = Callable[[List[str]], Awaitable[Dict[str, bool]]]
+InsertDefault = Callable[[str], Awaitable[None]]
+
+# Sin fila en chat_activation_pravi el bot se considera activo
+DEFAULT_ACTIVE = True
+
+logger = logging.getLogger(__name__)
+
+
+class BotStatusCache:
+    """
+    Estado del bot (chat_activation_pravi.is_active) por sesión, en memoria:
+      - cada lectura vale `ttl` s (n8n también puede cambiar el estado en la tabla)
+      - store(): escritura directa tras el upsert de POST /chat/bot-status
+      - sesión sin fila: entrada negativa (activo por defecto); get() crea la fila una sola
+        vez aunque lleguen varias peticiones a la vez, get_many() no escribe
+      - get_many(): las sesiones que faltan se leen en una sola consulta
+    """
+    def __init__(self, fetch_many: FetchStatuses, insert_default: InsertDefault, ttl: float = 15):
+        self._fetch_many = fetch_many
+        self._insert_default = insert_default
+        self.ttl = ttl
+        # session_id -> (is_active, tiene fila, vence)
+        self._entries: Dict[str, Tuple[bool, bool, float]] = {}
+        self._inserting: Dict[str, asyncio.Future] = {}
+        # Generación de cada store(): una lectura que empezó antes no pisa lo que escribió el asesor
+        self._generation = 0
+        self._stored: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _fresh(self, session_id: str, now: float) -> bool:
+        entry = self._entries.get(session_id)
+        return entry is not None and entry[2] > now
+
+    def store(self, session_id: str, is_active: bool) -> None:
+        self._generation += 1
+        self._stored[session_id] = self._generation
+        self._entries[session_id] = (is_active, True, time.monotonic() + self.ttl)
+
+    def invalidate(self, session_id: Optional[str] = None) -> None:
+        if session_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(session_id, None)
+
+    async def get_many(self, session_ids: Iterable[str]) -> Dict[str, bool]:
+        ids = list(dict.fromkeys(session_ids))
+        now = time.monotonic()
+        missing = [s for s in ids if not self._fresh(s, now)]
+        if missing:
+            generation = self._generation
+            found = await self._fetch_many(missing)
+            expires = time.monotonic() + self.ttl
+            for s in missing:
+                if self._stored.get(s, 0) > generation:
+                    continue  # store() durante la lectura: el valor leído ya es viejo
+                self._entries[s] = (found.get(s, DEFAULT_ACTIVE), s in found, expires)
+        return {s: self._entries[s][0] for s in ids}
+
+    async def get(self, session_id: str) -> bool:
+        is_active = (await self.get_many([session_id]))[session_id]
+        if not self._entries[session_id][1]:
+            await self._ensure_row(session_id)
+        return is_active
+
+    async def _ensure_row(self, session_id: str) -> None:
+        task = self._inserting.get(session_id)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.get_running_loop().create_task(self._insert(session_id))
+            self._inserting[session_id] = task
+        # shield: si un cliente cancela, el insert compartido sigue para los demás
+        await asyncio.shield(task)
+
+    async def _insert(self, session_id: str) -> None:
+        try:
+            await self._insert_default(session_id)
+            entry = self._entries.get(session_id)
+            if entry is not None and not entry[1]:
+                self._entries[session_id] = (entry[0], True, entry[2])
+        except Exception as e:
+            # Se reintenta en la próxima lectura; mientras tanto sigue siendo activo por defecto
+            logger.warning("No se pudo crear el estado del bot de %s: %s", session_id, e)
+        finally:
+            self._inserting.pop(session_id, None)
@@ -0,0 +1,54 @@
+# services/broadcast.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    Límite de `rate` envíos por segundo con ráfagas de hasta `burst` (GCRA). Sin primitivas
+    atadas a un event loop: el turno se reserva de forma síncrona y luego se duerme hasta él,
+    así varias difusiones simultáneas comparten el mismo límite.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self._tat = 0.0  # momento teórico del próximo envío
+
+    def reserve(self) -> float:
+        """Reserva un turno y devuelve cuántos segundos hay que esperarlo."""
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        self._tat = tat + self.interval
+        return max(0.0, tat - now - (self.burst - 1) * self.interval)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+async def fan_out(
+    items: Iterable[T],
+    send: Callable[[T], Awaitable[Dict[str, Any]]],
+    limiter: TokenBucket,
+    concurrency: int = 10,
+) -> List[Dict[str, Any]]:
+    """
+    Llama send(item) para cada item respetando `limiter` y con `concurrency` envíos en vuelo;
+    devuelve los resultados en el orden de `items`. Los errores de send() se devuelven como
+    {"status": "failed", "error": ...} para no cortar el resto de la difusión.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(item: T) -> Dict[str, Any]:
+        async with slots:
+            await limiter.acquire()
+            try:
+                return await send(item)
+            except Exception as e:
+                return {"status": "failed", "error": str(getattr(e, "detail", None) or e)}
+
+    return list(await asyncio.gather(*(one(item) for item in items)))
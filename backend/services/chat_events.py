@@ -0,0 +1,172 @@
+# services/chat_events.py
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import pandas as pd
+from services.chat_pagination import encode_cursor, time_ns
+
+FetchSince = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+# (time_ns, id): orden de entrega y de reanudación
+EventKey = Tuple[int, int]
+
+logger = logging.getLogger(__name__)
+
+
+def event_key(row: Dict[str, Any]) -> EventKey:
+    return time_ns(row.get("time")), int(row.get("id") or 0)
+
+
+def message_event(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Lo que recibe el visor por cada mensaje: la fila y el cursor para reanudar tras ella."""
+    return {"type": "message", "cursor": encode_cursor(*event_key(row)), "data": row}
+
+
+class Subscription:
+    """Cola de un visor conectado. sessions=None recibe todas las sesiones."""
+    def __init__(self, sessions: Optional[Iterable[str]], max_queue: int):
+        self.sessions: Optional[Set[str]] = set(sessions) if sessions is not None else None
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def wants(self, row: Dict[str, Any]) -> bool:
+        return self.sessions is None or row.get("session_id") in self.sessions
+
+    def subscribe(self, sessions: Iterable[str]) -> None:
+        if self.sessions is not None:
+            self.sessions.update(sessions)
+
+    def unsubscribe(self, sessions: Iterable[str]) -> None:
+        if self.sessions is not None:
+            self.sessions.difference_update(sessions)
+
+
+class ChatEventBus:
+    """
+    Difusión en proceso de los mensajes nuevos de n8n_chat_pravi a los visores conectados.
+      - publish(): lo llama persist_message tras cada insert propio; deduplica por id
+      - un único sondeo a la BD (cada `poll_interval` s y solo mientras hay suscriptores)
+        capta lo que el bot de n8n escribe directo en la tabla, para todos los visores a la vez
+      - buffer de los últimos `buffer_size` mensajes en orden (time, id): replay() reanuda
+        desde un cursor sin ir a la BD si el cursor cae dentro del buffer
+      - un visor lento cuya cola se llena queda `overflowed`: se le cierra el canal y
+        reanuda desde su último cursor
+      - ensure_fresh(): el mismo sondeo bajo demanda para /chat/updates, como mucho uno
+        cada `poll_interval` s para todos los clientes que consultan
+    """
+    def __init__(self, fetch_since: FetchSince, buffer_size: int = 2000, poll_interval: float = 2, max_queue: int = 500):
+        self._fetch_since = fetch_since
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.max_queue = max_queue
+        self._keys: List[EventKey] = []
+        self._rows: Dict[EventKey, Dict[str, Any]] = {}
+        self._ids: Set[Any] = set()
+        # El buffer tiene todo lo posterior a _floor (lo anterior se descartó o es previo al sondeo)
+        self._floor: Optional[EventKey] = None
+        self._high_water: Optional[str] = None
+        self._subscribers: Set[Subscription] = set()
+        self._poller: Optional[asyncio.Future] = None
+        self._polled_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Guarda y reparte las filas nuevas; devuelve cuántas no se habían visto."""
+        fresh = 0
+        for row in rows:
+            if row.get("id") is None or row.get("session_id") is None or row["id"] in self._ids:
+                continue
+            key = event_key(row)
+            bisect.insort(self._keys, key)
+            self._rows[key] = row
+            self._ids.add(row["id"])
+            fresh += 1
+            self._fan_out(row)
+        while len(self._keys) > self.buffer_size:
+            oldest = self._keys.pop(0)
+            self._ids.discard(self._rows.pop(oldest)["id"])
+            self._floor = max(self._floor, oldest) if self._floor else oldest
+        return fresh
+
+    def _fan_out(self, row: Dict[str, Any]) -> None:
+        event = message_event(row)
+        for sub in self._subscribers:
+            if sub.overflowed or not sub.wants(row):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                sub.overflowed = True
+
+    def replay(self, after: EventKey, sessions: Optional[Iterable[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """Mensajes del buffer posteriores a `after`; None si el buffer no cubre ese cursor."""
+        if self._floor is None or after < self._floor:
+            return None
+        wanted = set(sessions) if sessions is not None else None
+        start = bisect.bisect_right(self._keys, after)
+        rows = (self._rows[k] for k in self._keys[start:])
+        return [r for r in rows if wanted is None or r.get("session_id") in wanted]
+
+    def tip(self) -> Optional[EventKey]:
+        """Clave más reciente conocida: desde aquí sigue quien empieza a consultar ahora."""
+        known = self._keys[-1:] + ([self._floor] if self._floor else [])
+        return max(known) if known else None
+
+    def subscribe(self, sessions: Optional[Iterable[str]] = None) -> Subscription:
+        sub = Subscription(sessions, self.max_queue)
+        self._subscribers.add(sub)
+        self._ensure_poller()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+
+    def _ensure_poller(self) -> None:
+        loop = asyncio.get_running_loop()
+        task = self._poller
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+
+    async def _poll(self) -> None:
+        while self._subscribers:
+            await self.poll_once()
+            await asyncio.sleep(self.poll_interval)
+
+    async def ensure_fresh(self) -> None:
+        if self._high_water is not None and (time.monotonic() - self._polled_at) < self.poll_interval:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._inflight
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self.poll_once())
+            self._inflight = task
+        # shield: si un cliente cancela, el sondeo compartido sigue para los demás
+        await asyncio.shield(task)
+
+    async def poll_once(self) -> None:
+        """Una lectura compartida de filas con time >= marca de agua (gte: empates no se pierden)."""
+        if self._high_water is None:
+            # Primer sondeo: el buffer queda completo desde ahora
+            start = pd.Timestamp.now(tz="UTC")
+            self._high_water = start.isoformat()
+            self._floor = max(self._floor, (int(start.value), 0)) if self._floor else (int(start.value), 0)
+        try:
+            rows = await self._fetch_since(self._high_water)
+        except Exception as e:
+            logger.warning("Sondeo de mensajes falló: %s", e)
+            return
+        self._polled_at = time.monotonic()
+        self.publish(rows)
+        # Solo el sondeo avanza la marca: una fila propia con reloj local no tapa las de n8n
+        for row in rows:
+            if time_ns(row.get("time")) > time_ns(self._high_water):
+                self._high_water = row.get("time")
@@ -0,0 +1,140 @@
+# services/chat_heads.py
+import asyncio
+import bisect
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import pandas as pd
+from services.chat_pagination import time_ns
+
+FetchRows = Callable[[], Awaitable[List[Dict[str, Any]]]]
+FetchByIds = Callable[[List[Any]], Awaitable[List[Dict[str, Any]]]]
+FetchSince = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+# (-time_ns, -id): ordenar asc = time desc, id desc
+HeadKey = Tuple[int, int]
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+class ConversationHeads:
+    """
+    Último mensaje de cada sesión de n8n_chat_pravi (la "cabeza" de la conversación).
+      - siembra: recorre solo (id, session_id, time), elige la cabeza de cada sesión y
+        trae esas filas completas por id
+      - cada `refresh_interval` s se leen las filas con time >= marca de agua (el bot de n8n
+        escribe directo en la tabla, sin pasar por persist_message)
+      - `full_ttl`: pasado este tiempo se vuelve a sembrar (sesiones borradas)
+      - record(): escritura directa tras cada insert propio (persist_message); no mueve la
+        marca de agua, que solo avanza con lo leído de la tabla
+    page() cuesta O(limit) y el listado completo O(sesiones), sin leer el histórico.
+    """
+    def __init__(
+        self,
+        fetch_index: FetchRows,
+        fetch_by_ids: FetchByIds,
+        fetch_since: FetchSince,
+        refresh_interval: float = 5,
+        full_ttl: float = 900,
+    ):
+        self._fetch_index = fetch_index
+        self._fetch_by_ids = fetch_by_ids
+        self._fetch_since = fetch_since
+        self.refresh_interval = refresh_interval
+        self.full_ttl = full_ttl
+        self._heads: Dict[str, Tuple[HeadKey, Dict[str, Any]]] = {}
+        self._keys: List[HeadKey] = []
+        self._sessions: Dict[HeadKey, str] = {}
+        self._high_water: Optional[str] = None
+        self._high_water_ns = 0
+        self._seeded_at: Optional[float] = None
+        self._refreshed_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self._heads)
+
+    @staticmethod
+    def _key(row: Dict[str, Any]) -> HeadKey:
+        return (-time_ns(row.get("time")), -int(row.get("id") or 0))
+
+    def record(self, row: Dict[str, Any]) -> None:
+        """Aplica una fila nueva o actualizada; solo cambia la cabeza si es más reciente."""
+        session_id = row.get("session_id")
+        if session_id is None:
+            return
+        key = self._key(row)
+        current = self._heads.get(session_id)
+        if current is not None:
+            if current[0] < key:  # la actual es más reciente
+                return
+            self._drop(current[0])
+        self._heads[session_id] = (key, row)
+        bisect.insort(self._keys, key)
+        self._sessions[key] = session_id
+
+    def record_many(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.record(row)
+
+    def _apply_polled(self, rows: List[Dict[str, Any]]) -> None:
+        # Solo lo leído de la tabla avanza la marca: una fila propia con reloj local no tapa
+        # las que n8n escriba con una hora anterior
+        self.record_many(rows)
+        for row in rows:
+            t = time_ns(row.get("time"))
+            if t > self._high_water_ns:
+                self._high_water_ns, self._high_water = t, row.get("time")
+
+    def _drop(self, key: HeadKey) -> None:
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            self._keys.pop(i)
+        self._sessions.pop(key, None)
+
+    def invalidate(self) -> None:
+        """Fuerza una nueva siembra en la próxima lectura."""
+        self._seeded_at = None
+
+    async def ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if self._seeded_at is not None and (now - self._refreshed_at) < self.refresh_interval:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._inflight
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self._refresh())
+            self._inflight = task
+        # shield: si un cliente cancela, la lectura compartida sigue para los demás
+        await asyncio.shield(task)
+
+    async def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._seeded_at is None or (now - self._seeded_at) >= self.full_ttl:
+            await self._seed()
+            self._seeded_at = now
+        elif self._high_water is not None:
+            # gte: otra fila con la misma marca de tiempo no se pierde; record() ignora repetidas
+            self._apply_polled(await self._fetch_since(self._high_water))
+        self._refreshed_at = now
+
+    async def _seed(self) -> None:
+        index = pd.DataFrame(await self._fetch_index(), columns=["id", "session_id", "time"])
+        index = index.dropna(subset=["session_id", "id"])
+        # misma clave que record(): time (UTC, inválido = 0) y luego id
+        index["t"] = pd.to_datetime(index["time"], errors="coerce", utc=True, format="ISO8601").fillna(EPOCH)
+        latest = index.sort_values(["t", "id"]).drop_duplicates("session_id", keep="last")
+        rows = await self._fetch_by_ids(latest["id"].tolist())
+        self._heads, self._keys, self._sessions = {}, [], {}
+        self._high_water, self._high_water_ns = None, 0
+        self._apply_polled(rows)
+
+    def page(self, limit: Optional[int] = None, after: Optional[HeadKey] = None) -> Tuple[List[Dict[str, Any]], Optional[HeadKey]]:
+        """
+        Cabezas en orden time desc a partir de `after` (exclusivo, clave del último ítem ya
+        entregado). Devuelve (filas, clave del último si puede haber más).
+        """
+        start = bisect.bisect_right(self._keys, after) if after is not None else 0
+        stop = len(self._keys) if limit is None else min(len(self._keys), start + limit)
+        keys = self._keys[start:stop]
+        rows = [self._heads[self._sessions[k]][1] for k in keys]
+        more = stop < len(self._keys)
+        return rows, (keys[-1] if keys and more else None)
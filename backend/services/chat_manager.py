@@ -1,15 +1,44 @@
 from services.database_manager import SupabaseManager
 from datetime import datetime
+import asyncio
+import hashlib
 from fastapi import UploadFile, HTTPException
-import requests
+import io
 import json
-import subprocess
-import tempfile
 from pathlib import Path
 import os
 import re
 import unicodedata
-from typing import Optional, Any, Dict
+import time
+import uuid
+import httpx
+from postgrest import APIResponse
+from typing import Optional, Any, BinaryIO, Dict, List, Tuple, Union
+from fastapi import WebSocket, WebSocketDisconnect
+from config import (
+    CHAT_HEADS_REFRESH, CHAT_HEADS_FULL_TTL, SCAN_CONCURRENCY,
+    CHAT_EVENTS_BUFFER, CHAT_EVENTS_POLL, CHAT_EVENTS_QUEUE, CHAT_UPDATES_MAX_ROWS,
+    BOT_STATUS_TTL, MEDIA_INBOUND_ASYNC, MEDIA_JOB_CONCURRENCY, MEDIA_JOB_MAX_ATTEMPTS, MEDIA_JOB_RETRY_DELAY,
+    INBOUND_MEDIA_INDEX_SIZE, INBOUND_MEDIA_PENDING_TTL,
+    FFMPEG_BINARY, TRANSCODE_CONCURRENCY, TRANSCODE_MAX_QUEUE, TRANSCODE_TIMEOUT,
+    WHATSAPP_MEDIA_TTL, CONVERTED_AUDIO_ENTRIES, MEDIA_CHUNK_SIZE,
+    BROADCAST_RATE, BROADCAST_BURST, BROADCAST_CONCURRENCY, BROADCAST_MAX_RECIPIENTS,
+    MESSAGE_BATCH_WINDOW, MESSAGE_BATCH_MAX_ROWS,
+)
+from services.bot_status import BotStatusCache
+from services.broadcast import TokenBucket, fan_out
+from services.chat_events import ChatEventBus, event_key, message_event
+from services.chat_heads import ConversationHeads
+from services.chat_pagination import decode_cursor, encode_cursor, keyset_filter, time_ns
+from services.range_scanner import scan_ranges
+from services.local_store import get_local_store
+from services.media_index import InboundMediaIndex
+from services.media_jobs import MediaJobQueue
+from services.message_batcher import MessageWriteBatcher
+from services.media_registry import MediaRegistry, media_digest
+from services.media_transfer import SpoolReader, StorageUploader, download_to_spool, get_storage_uploader
+from services.transcoder import AudioTranscoder, TranscoderBusy
+from services.whatsapp_client import DEFAULT_GRAPH_URL, WhatsAppClient, WhatsAppError, get_whatsapp_client
 
 #Configuración WhatsApp (agregar a tus variables de entorno)
 WHATSAPP_API_URL = os.getenv("WHATSAPP_API_URL")
@@ -19,81 +48,310 @@ supabase = SupabaseManager()
 
 ALLOWED_MEDIA_KINDS = {"image", "audio", "video", "document"}
 DEFAULT_STORAGE_BUCKET = "media"
+CHAT_TABLE = "n8n_chat_pravi"
+PAGE_SIZE = 1000  # max-rows de PostgREST
 
-async def get_active_conversations():
-    response = supabase.client.table("n8n_chat_pravi")\
-        .select("*") \
-        .order("time", desc=True) \
-        .execute()
-    
-    data = response.data
-    sessions = {}
-    for row in data:
-        sid = row["session_id"]
-        if sid not in sessions:
-            sessions[sid] = row
-    return list(sessions.values())
-
-async def get_conversations_messages(session_id: str):
+
+async def _fetch_message_index() -> List[Dict[str, Any]]:
+    """(id, session_id, time) de todos los mensajes: lo mínimo para elegir la cabeza de cada sesión."""
+    count = await supabase.aclient.table(CHAT_TABLE).select("id", count="exact", head=True).execute()
+
+    async def fetch(start: int, end: int):
+        resp = await supabase.aclient.table(CHAT_TABLE)\
+            .select("id,session_id,time")\
+            .order("id")\
+            .range(start, end)\
+            .execute()
+        return resp.data or []
+
+    return await scan_ranges(fetch, count.count or 0, page_size=PAGE_SIZE, concurrency=SCAN_CONCURRENCY)
+
+
+async def _fetch_messages_by_ids(ids: List[Any]) -> List[Dict[str, Any]]:
+    chunks = [ids[i:i + 200] for i in range(0, len(ids), 200)]  # URLs de largo razonable
+    results = await asyncio.gather(*(
+        supabase.aclient.table(CHAT_TABLE).select("*").in_("id", chunk).execute() for chunk in chunks
+    ))
+    return [row for resp in results for row in resp.data or []]
+
+
+async def _fetch_messages_since(since: str) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        resp = await supabase.aclient.table(CHAT_TABLE)\
+            .select("*")\
+            .gte("time", since)\
+            .order("time")\
+            .order("id")\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute()
+        chunk = resp.data or []
+        out.extend(chunk)
+        if len(chunk) < PAGE_SIZE:
+            return out
+        start += PAGE_SIZE
+
+
+CONVERSATION_HEADS = ConversationHeads(
+    _fetch_message_index, _fetch_messages_by_ids, _fetch_messages_since,
+    refresh_interval=CHAT_HEADS_REFRESH, full_ttl=CHAT_HEADS_FULL_TTL,
+)
+
+
+async def _tail_messages(since: str) -> List[Dict[str, Any]]:
+    rows = await _fetch_messages_since(since)
+    # Lo que ve el sondeo de eventos también sube la conversación en el listado
+    CONVERSATION_HEADS.record_many(rows)
+    return rows
+
+
+CHAT_EVENTS = ChatEventBus(
+    _tail_messages, buffer_size=CHAT_EVENTS_BUFFER,
+    poll_interval=CHAT_EVENTS_POLL, max_queue=CHAT_EVENTS_QUEUE,
+)
+
+
+async def _fetch_messages_after(after, session_ids: Optional[List[str]], limit: int) -> List[Dict[str, Any]]:
+    """Mensajes posteriores al cursor (time, id), para reanudar cuando el buffer ya no lo cubre."""
+    query = supabase.aclient.table(CHAT_TABLE).select("*").or_(keyset_filter(after, "gt"))
+    if session_ids is not None:
+        query = query.in_("session_id", session_ids)
+    resp = await query.order("time").order("id").limit(limit).execute()
+    return resp.data or []
+
+
+async def serve_chat_events(websocket: WebSocket, session_ids: Optional[List[str]] = None, cursor: Optional[str] = None):
     """
-    Obtiene el histórico completo de mensajes para una sesión.
+    Canal en vivo de mensajes (reemplaza el sondeo de /chat/updates):
+      - session_ids: solo esas sesiones (None = todas); se cambian con
+        {"action": "subscribe" | "unsubscribe", "session_ids": [...]}
+      - cursor: reanuda tras el último mensaje recibido (campo `cursor` de cada evento),
+        desde el buffer en memoria o, si ya no lo cubre, desde la BD
+      - {"type": "resync"}: el hueco es demasiado grande; recargar con /chat/messages
     """
-    response = supabase.client.table("n8n_chat_pravi")\
-        .select("*") \
-        .eq("session_id", session_id) \
-        .order("time") \
-        .execute()
-    return response.data
+    try:
+        after = decode_cursor(cursor)
+    except HTTPException:
+        await websocket.close(code=1008, reason="cursor inválido")
+        return
+    await websocket.accept()
+    # Suscribirse antes de reanudar: lo que llegue mientras tanto queda en la cola
+    sub = CHAT_EVENTS.subscribe(session_ids)
+    try:
+        sent = set()
+        if after is not None:
+            rows = CHAT_EVENTS.replay(after, session_ids)
+            if rows is None:
+                rows = await _fetch_messages_after(after, session_ids, PAGE_SIZE)
+                if len(rows) == PAGE_SIZE:
+                    await websocket.send_json({"type": "resync"})
+                    rows = []
+            for row in rows:
+                sent.add(row.get("id"))
+                await websocket.send_json(message_event(row))
+
+        async def read_commands():
+            while True:
+                try:
+                    command = json.loads(await websocket.receive_text())
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(command, dict):
+                    continue
+                ids = [str(s) for s in command.get("session_ids") or []]
+                if command.get("action") == "subscribe":
+                    sub.subscribe(ids)
+                elif command.get("action") == "unsubscribe":
+                    sub.unsubscribe(ids)
+
+        reader = asyncio.create_task(read_commands())
+        try:
+            while True:
+                getter = asyncio.create_task(sub.queue.get())
+                done, _ = await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if reader in done:
+                    getter.cancel()
+                    reader.result()  # WebSocketDisconnect u otro error del cliente
+                    return
+                if sub.overflowed:
+                    # Visor lento: se cierra y reanuda desde su último cursor
+                    await websocket.close(code=1013, reason="cola llena")
+                    return
+                event = getter.result()
+                if event["data"].get("id") in sent:
+                    continue
+                await websocket.send_json(event)
+        finally:
+            reader.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        CHAT_EVENTS.unsubscribe(sub)
+
 
-async def get_new_messages_since(since: str):
+async def get_active_conversations(limit: Optional[int] = None, cursor: Optional[str] = None):
     """
-    Recupera mensajes posteriores a un timestamp ISO 8601.
+    Último mensaje de cada sesión (time desc), desde CONVERSATION_HEADS.
+    Sin `limit` devuelve la lista completa; con `limit`, {"data", "next_cursor"}.
     """
-    response = supabase.client.table("n8n_chat_pravi") \
-        .select("*") \
-        .gt("time", since) \
-        .order("time") \
-        .execute()
-    return response.data
+    await CONVERSATION_HEADS.ensure_fresh()
+    after = decode_cursor(cursor)
+    rows, last = CONVERSATION_HEADS.page(limit, (-after[0], -after[1]) if after else None)
+    if limit is None and cursor is None:
+        return rows
+    return {"data": rows, "next_cursor": encode_cursor(-last[0], -last[1]) if last else None}
+
+# Vista "slim" del historial: el payload del mensaje sin lo que el visor no pinta
+SLIM_DROP_KEYS = ("tool_calls", "invalid_tool_calls", "response_metadata", "additional_kwargs")
+SLIM_KWARGS_KEYS = ("media", "attachment", "attachments")
+SLIM_MEDIA_KEYS = (
+    "kind", "type", "url", "mediaUrl", "downloadUrl", "download_url",
+    "mime", "mime_type", "name", "filename", "fileName", "size", "size_bytes",
+)
+
+
+def slim_message_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copia de la fila con `message` reducido: sin tool_calls/response_metadata/etc., y media
+    solo con lo necesario para mostrarla (se descartan whatsapp_media_id y demás metadatos).
+    """
+    payload = row.get("message")
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except json.JSONDecodeError:
+            return row
+    if not isinstance(payload, dict):
+        return row
+    slim = {k: v for k, v in payload.items() if k not in SLIM_DROP_KEYS}
+    media = payload.get("media")
+    if isinstance(media, dict):
+        slim["media"] = {k: media[k] for k in SLIM_MEDIA_KEYS if k in media}
+    extra = payload.get("additional_kwargs")
+    if isinstance(extra, dict):
+        attachments = {k: extra[k] for k in SLIM_KWARGS_KEYS if k in extra}
+        if attachments:
+            slim["additional_kwargs"] = attachments
+    return {**row, "message": slim}
+
+
+async def get_conversations_messages(
+    session_id: str,
+    limit: Optional[int] = None,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    view: str = "full",
+):
+    """
+    Histórico de mensajes de una sesión, en orden (time, id) ascendente.
+    Sin `limit` ni cursores devuelve la lista completa, como antes.
+    Con ellos pagina por keyset sobre (time, id) y responde {data, before_cursor, after_cursor}:
+      - solo `limit`: los `limit` mensajes más recientes (primera carga del visor)
+      - `before`: los `limit` anteriores al cursor; `after`: los `limit` posteriores
+      - before_cursor: para pedir mensajes más antiguos (None si ya no hay)
+      - after_cursor: último mensaje entregado (o el `after` recibido), para pedir los nuevos
+    view="slim" aplica slim_message_row a cada fila.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use before o after, no ambos")
+    before_key, after_key = decode_cursor(before), decode_cursor(after)
+
+    query = supabase.aclient.table(CHAT_TABLE).select("*").eq("session_id", session_id)
+    paged = limit is not None or before_key is not None or after_key is not None
+    if not paged:
+        rows = (await query.order("time").order("id").execute()).data or []
+    else:
+        limit = limit or PAGE_SIZE
+        if after_key is not None:
+            # Hacia adelante: los más antiguos posteriores al cursor
+            query = query.or_(keyset_filter(after_key, "gt")).order("time").order("id")
+        else:
+            # Última página o hacia atrás: los más recientes, y luego se invierte
+            if before_key is not None:
+                query = query.or_(keyset_filter(before_key, "lt"))
+            query = query.order("time", desc=True).order("id", desc=True)
+        rows = (await query.limit(limit).execute()).data or []
+        if after_key is None:
+            rows.reverse()
+
+    if view == "slim":
+        rows = [slim_message_row(r) for r in rows]
+    if not paged:
+        return rows
+
+    def cursor_of(row: Dict[str, Any]) -> str:
+        return encode_cursor(time_ns(row.get("time")), row.get("id"))
+
+    older = after_key is None and len(rows) == limit
+    return {
+        "data": rows,
+        "before_cursor": cursor_of(rows[0]) if rows and older else None,
+        "after_cursor": cursor_of(rows[-1]) if rows else after,
+    }
 
+# id mayor que cualquiera: (t, MAX_ID) equivale a "time > t" para `since` con timestamp
+MAX_ID = 2 ** 63 - 1
 
-def upload_media(file_stream, filename: str, mime_type: str) -> str:
-    whatsapp_api_base = (WHATSAPP_API_URL or "https://graph.facebook.com/v20.0").rstrip("/")
+
+async def get_new_messages_since(
+    since: Optional[str] = None,
+    limit: Optional[int] = None,
+    session_ids: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Mensajes posteriores a `cursor` (opaco, (time, id)) o a `since` (ISO 8601), en orden
+    (time, id), como mucho CHAT_UPDATES_MAX_ROWS. Se responden desde el buffer de
+    CHAT_EVENTS (un sondeo compartido por intervalo) y solo van a la BD si el punto de
+    partida es anterior al buffer.
+      - solo `since`: lista, como antes; sin `since` ya no recorre la tabla entera
+      - con limit/session_ids/cursor: {data, next_since}; next_since es el cursor de la
+        última fila entregada (o el recibido si no hay nuevas), así que con filas de igual
+        time no se repite ni se salta ninguna
+      - sin `since` ni `cursor`: data vacía y next_since = lo más reciente, para empezar a consultar
+    """
+    legacy = limit is None and session_ids is None and cursor is None
+    limit = min(limit or CHAT_UPDATES_MAX_ROWS, CHAT_UPDATES_MAX_ROWS)
+    after = decode_cursor(cursor)
+    if after is None and since:
+        since_ns = time_ns(since)
+        if since_ns == 0:
+            raise HTTPException(status_code=400, detail="since inválido")
+        after = (since_ns, MAX_ID)
+
+    await CHAT_EVENTS.ensure_fresh()
+    if after is None:
+        rows: List[Dict[str, Any]] = []
+        next_key = CHAT_EVENTS.tip()
+    else:
+        rows = CHAT_EVENTS.replay(after, session_ids)
+        if rows is None:
+            rows = await _fetch_messages_after(after, session_ids, limit)
+        rows = rows[:limit]
+        next_key = event_key(rows[-1]) if rows else after
+
+    if legacy:
+        return rows
+    return {"data": rows, "next_since": encode_cursor(*next_key) if next_key else None}
+
+
+def _whatsapp() -> WhatsAppClient:
+    return get_whatsapp_client(WHATSAPP_API_URL or DEFAULT_GRAPH_URL, WHATSAPP_ACCESS_TOKEN)
+
+
+async def upload_media(file_bytes: Union[bytes, BinaryIO], filename: str, mime_type: str) -> str:
     phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 
     if not WHATSAPP_ACCESS_TOKEN or not phone_number_id:
         raise Exception("Configuración de WhatsApp incompleta para subir multimedia")
 
-    url = f"{whatsapp_api_base}/{phone_number_id}/media"
-
-    headers = {
-        "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}"
-    }
-
-    files = {
-        "file": (
-            filename or "archivo",
-            file_stream,
-            mime_type or "application/octet-stream"
-        )
-    }
-
-    data = {
-        "messaging_product": "whatsapp"
-    }
-
-    response = requests.post(
-        url,
-        headers=headers,
-        data=data,
-        files=files,
-        timeout=30
+    response_data = await _whatsapp().upload_media(
+        phone_number_id,
+        file_bytes,
+        filename or "archivo",
+        mime_type or "application/octet-stream",
     )
-
-    if not response.ok:
-        raise Exception(f"{response.status_code} {response.text}")
-
-    response_data = response.json()
     media_id = response_data.get("id")
 
     if not media_id:
@@ -115,20 +373,12 @@ def normalize_media_type(media_type: str | None, mime_type: str | None = None) -
         return "video"
 
     return "document"
-def send_media_message_to_whatsapp(to: str, media_id: str, media_type: str):
-    whatsapp_api_base = (WHATSAPP_API_URL or "https://graph.facebook.com/v20.0").rstrip("/")
+async def send_media_message_to_whatsapp(to: str, media_id: str, media_type: str):
     phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 
     if not WHATSAPP_ACCESS_TOKEN or not phone_number_id:
         raise Exception("Configuración de WhatsApp incompleta para enviar multimedia")
 
-    url = f"{whatsapp_api_base}/{phone_number_id}/messages"
-
-    headers = {
-        "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "messaging_product": "whatsapp",
         "to": to,
@@ -138,44 +388,23 @@ def send_media_message_to_whatsapp(to: str, media_id: str, media_type: str):
         }
     }
 
-    response = requests.post(url, headers=headers, json=payload, timeout=30)
-
-    if not response.ok:
-        raise Exception(f"{response.status_code} {response.text}")
-
-    return response.json()
+    return await _whatsapp().send_message(phone_number_id, payload)
 
 async def send_whatsapp_message(phone_number: str, message: str):
     """Envía mensaje de texto a WhatsApp usando la API de Meta."""
     try:
-        whatsapp_api_base = (WHATSAPP_API_URL or "https://graph.facebook.com/v20.0").rstrip("/")
         phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 
         if not WHATSAPP_ACCESS_TOKEN or not phone_number_id:
             raise Exception("Configuración de WhatsApp incompleta para enviar mensaje")
 
-        url = f"{whatsapp_api_base}/{phone_number_id}/messages"
-
-        response = requests.post(
-            url,
-            json={
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": phone_number,
-                "type": "text",
-                "text": {"body": message}
-            },
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}"
-            },
-            timeout=30
-        )
-
-        if not response.ok:
-            raise Exception(f"{response.status_code} {response.text}")
-
-        return response.json()
+        return await _whatsapp().send_message(phone_number_id, {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": phone_number,
+            "type": "text",
+            "text": {"body": message}
+        })
 
     except Exception as e:
         raise Exception(f"Error enviando mensaje a WhatsApp: {e}")
@@ -194,10 +423,107 @@ async def send_advisor_message_to_session(session_id: str, message: str):
         "invalid_tool_calls": []
     }
 
-    result = persist_message(session_id, message_payload)
+    result = await persist_message(session_id, message_payload)
     await send_whatsapp_message(session_id, message)
     return {"status": "message_sent", "data": result.data}
 
+
+async def send_media_link_to_whatsapp(to: str, media: Dict[str, Any], caption: Optional[str] = None):
+    """Media por URL pública (Meta la descarga); caption solo aplica a imagen, video y documento."""
+    phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
+
+    if not WHATSAPP_ACCESS_TOKEN or not phone_number_id:
+        raise Exception("Configuración de WhatsApp incompleta para enviar multimedia")
+
+    kind = media["kind"]
+    body: Dict[str, Any] = {"link": media["url"]}
+    if caption and kind in {"image", "video", "document"}:
+        body["caption"] = caption
+    if kind == "document" and media.get("name"):
+        body["filename"] = media["name"]
+
+    return await _whatsapp().send_message(phone_number_id, {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": to,
+        "type": kind,
+        kind: body,
+    })
+
+
+BROADCAST_LIMITER = TokenBucket(BROADCAST_RATE, BROADCAST_BURST)
+
+
+async def broadcast_advisor_message(
+    session_ids: List[str], message: Optional[str] = None, media: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Mismo mensaje (texto o media por URL) del asesor a varias sesiones:
+      - estado del bot de todas en una consulta; las que tienen el bot activo se omiten
+      - una sola inserción con todas las filas de n8n_chat_pravi
+      - envíos a la Graph API en paralelo, limitados por BROADCAST_LIMITER (compartido)
+    Devuelve el resultado por destinatario, en el orden recibido.
+    """
+    started = time.perf_counter()
+    ids = list(dict.fromkeys(s.strip() for s in session_ids if s and s.strip()))
+    if not ids:
+        raise HTTPException(status_code=400, detail="session_ids es requerido")
+    if len(ids) > BROADCAST_MAX_RECIPIENTS:
+        raise HTTPException(status_code=400, detail=f"Máximo {BROADCAST_MAX_RECIPIENTS} destinatarios por difusión")
+    if not message and not media:
+        raise HTTPException(status_code=400, detail="message o media es requerido")
+
+    statuses = {row["session_id"]: row["is_active"] for row in await get_bot_statuses(ids)}
+    recipients = [s for s in ids if not statuses.get(s, True)]
+
+    if media:
+        message_payload = {
+            "type": "ai",
+            "content": message or f"Archivo enviado ({media.get('name') or media['kind']})",
+            "media": {"kind": media["kind"], "url": media["url"], "mime": media.get("mime"), "name": media.get("name")},
+            "mediaUrl": media["url"],
+            "tool_calls": [],
+            "additional_kwargs": {},
+            "response_metadata": {},
+            "invalid_tool_calls": [],
+        }
+    else:
+        message_payload = {
+            "type": "ai",
+            "content": message,
+            "tool_calls": [],
+            "additional_kwargs": {},
+            "response_metadata": {},
+            "invalid_tool_calls": []
+        }
+
+    persisted = await persist_messages([(s, message_payload) for s in recipients]) if recipients else None
+    message_ids = {row.get("session_id"): row.get("id") for row in getattr(persisted, "data", None) or []}
+
+    async def send(session_id: str) -> Dict[str, Any]:
+        if media:
+            response = await send_media_link_to_whatsapp(session_id, media, message)
+        else:
+            response = await send_whatsapp_message(session_id, message)
+        return {"status": "sent", "wamid": ((response or {}).get("messages") or [{}])[0].get("id")}
+
+    sent = dict(zip(recipients, await fan_out(recipients, send, BROADCAST_LIMITER, BROADCAST_CONCURRENCY)))
+
+    results = []
+    for session_id in ids:
+        if session_id in sent:
+            results.append({"session_id": session_id, "message_id": message_ids.get(session_id), **sent[session_id]})
+        else:
+            results.append({"session_id": session_id, "status": "skipped", "detail": "El bot está activo"})
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("sent", "failed", "skipped")}
+    return {
+        "status": "broadcast_done",
+        "total": len(ids),
+        **counts,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results,
+    }
+
 ALLOWED_TYPES = {"image/jpeg", "image/png", "application/pdf", "application/msword", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"}
 MAX_FILE_SIZE = 30 * 1024 * 1024  # 30MB
 
@@ -226,16 +552,14 @@ def validate_inbound_media_payload(payload: Dict[str, Any]) -> None:
         raise HTTPException(status_code=400, detail="kind inválido")
 
 
-def find_existing_inbound_media_message(session_id: str, media_id: str) -> Optional[Dict[str, Any]]:
-    try:
-        response = supabase.client.table("n8n_chat_pravi")\
-            .select("id, message")\
-            .eq("session_id", session_id)\
-            .execute()
-    except Exception as e:
-        print(f"Error querying existing inbound media messages: {e}")
-        return None
+async def _scan_inbound_media(session_id: str) -> Dict[str, Tuple[Any, Dict[str, Any]]]:
+    """Media ya guardada en el historial de la sesión: {whatsapp_media_id: (id, mensaje)}."""
+    response = await supabase.aclient.table("n8n_chat_pravi")\
+        .select("id, message")\
+        .eq("session_id", session_id)\
+        .execute()
 
+    found: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
     for row in response.data or []:
         message_payload = row.get("message")
         parsed_payload: Optional[Dict[str, Any]] = None
@@ -249,28 +573,33 @@ def find_existing_inbound_media_message(session_id: str, media_id: str) -> Optio
 
         if isinstance(parsed_payload, dict):
             media_payload = parsed_payload.get("media")
-            if isinstance(media_payload, dict) and media_payload.get("whatsapp_media_id") == media_id:
-                return row
+            if isinstance(media_payload, dict) and media_payload.get("whatsapp_media_id"):
+                found[str(media_payload["whatsapp_media_id"])] = (row.get("id"), parsed_payload)
+
+    return found
+
 
-    return None
+INBOUND_MEDIA = InboundMediaIndex(
+    get_local_store, _scan_inbound_media,
+    capacity=INBOUND_MEDIA_INDEX_SIZE, pending_ttl=INBOUND_MEDIA_PENDING_TTL,
+)
 
 
-def get_whatsapp_media_url(media_id: str) -> str:
+async def find_existing_inbound_media_message(session_id: str, media_id: str) -> Optional[Dict[str, Any]]:
+    """Entrada de INBOUND_MEDIA para la media (pending o done), sin recorrer el historial cada vez."""
+    await INBOUND_MEDIA.ensure_session(session_id)
+    return INBOUND_MEDIA.lookup(session_id, media_id)
+
+
+async def get_whatsapp_media_url(media_id: str) -> str:
     if not WHATSAPP_API_URL or not WHATSAPP_ACCESS_TOKEN:
         raise HTTPException(status_code=500, detail="Configuración de WhatsApp incompleta")
 
-    url = f"{WHATSAPP_API_URL}/{media_id}"
     try:
-        response = requests.get(
-            url,
-            headers={"Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}"},
-            timeout=30,
-        )
-        response.raise_for_status()
-    except requests.RequestException as exc:
+        payload = await _whatsapp().media_info(media_id)
+    except (httpx.HTTPError, WhatsAppError) as exc:
         raise HTTPException(status_code=502, detail=f"No se pudo resolver la URL temporal del archivo: {exc}") from exc
 
-    payload = response.json()
     if isinstance(payload, dict):
         media_url = payload.get("url")
         if media_url:
@@ -284,18 +613,12 @@ def get_whatsapp_media_url(media_id: str) -> str:
     raise HTTPException(status_code=502, detail="No se pudo resolver la URL temporal del archivo")
 
 
-def download_whatsapp_media(media_url: str) -> bytes:
+async def download_whatsapp_media(media_url: str):
+    """Descarga por trozos a un spool (memoria hasta MEDIA_MEMORY_BUDGET, luego disco): (spool, TransferStats)."""
     try:
-        access_token = os.getenv("WHATSAPP_ACCESS_TOKEN")
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
-
-        response = requests.get(media_url, headers=headers, timeout=30)
-        response.raise_for_status()
-    except requests.RequestException as exc:
+        return await download_to_spool(_whatsapp(), media_url)
+    except (httpx.HTTPError, WhatsAppError) as exc:
         raise HTTPException(status_code=502, detail=f"No se pudo descargar el archivo desde WhatsApp: {exc}")
-    return response.content
 def sanitize_storage_filename(filename: str, media_id: str) -> str:
     raw_name = filename or f"media-{media_id}"
     normalized = unicodedata.normalize("NFKD", raw_name)
@@ -311,23 +634,24 @@ def normalize_media_kind_by_mime(kind: str, mime: str) -> str:
     if mime.startswith("video/"):
         return "video"
     return kind or "document" 
-def upload_inbound_media_to_storage(file_bytes: bytes, session_id: str, media_id: str, filename: str, mime_type: str) -> str:
+def _storage() -> StorageUploader:
+    return get_storage_uploader(supabase._url, supabase._key)
+
+
+async def upload_inbound_media_to_storage(spool, size: int, session_id: str, media_id: str, filename: str, mime_type: str):
+    """Sube el spool a Storage en streaming: (URL pública, TransferStats)."""
     safe_filename = sanitize_storage_filename(filename, media_id)
     storage_path = f"whatsapp-inbound/{session_id}/{media_id}-{safe_filename}"
     try:
-        storage_client = supabase.client.storage.from_(DEFAULT_STORAGE_BUCKET)
-
-        storage_client.upload(
+        stats = await _storage().upload(
+            DEFAULT_STORAGE_BUCKET,
             storage_path,
-            file_bytes,
-            file_options={
-                "content-type": mime_type or "application/octet-stream",
-                "cache-control": "3600",
-                "upsert": "true",
-            }
+            spool,
+            size,
+            mime_type or "application/octet-stream",
         )
 
-        public_url_response = storage_client.get_public_url(storage_path)
+        public_url_response = supabase.client.storage.from_(DEFAULT_STORAGE_BUCKET).get_public_url(storage_path)
 
         if isinstance(public_url_response, dict):
             public_url = public_url_response.get("publicUrl") or public_url_response.get("public_url")
@@ -337,26 +661,65 @@ def upload_inbound_media_to_storage(file_bytes: bytes, session_id: str, media_id
         if not public_url:
             raise Exception("No public URL returned")
 
-        return str(public_url)
+        return str(public_url), stats
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error subiendo archivo a Supabase Storage: {e}")
-def build_inbound_media_payload(public_url: str, kind: str, mime_type: str, filename: str, file_bytes: bytes, media_id: str) -> Dict[str, Any]:
+def build_inbound_media_payload(public_url: str, kind: str, mime_type: str, filename: str, size: int, media_id: str) -> Dict[str, Any]:
     return {
         "url": public_url,
         "kind": kind,
         "mime": mime_type or "application/octet-stream",
         "name": filename,
-        "size": len(file_bytes),
+        "size": size,
         "whatsapp_media_id": media_id,
     }
 
 
-async def ingest_inbound_media_message(payload: Dict[str, Any], internal_token: Optional[str] = None) -> Dict[str, Any]:
+def authorize_inbound_media(internal_token: Optional[str]) -> None:
     expected_token = os.getenv("INTERNAL_MEDIA_TOKEN")
     if not expected_token or internal_token != expected_token:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+
+def already_exists_response(entry: Dict[str, Any]) -> Dict[str, Any]:
+    if entry["status"] == "pending":
+        # Duplicado que llega mientras la primera entrega sigue en curso
+        return {
+            "success": True,
+            "status": "in_progress",
+            "job_id": entry.get("owner"),
+            "status_url": f"/media/jobs/{entry['owner']}" if entry.get("owner") else None,
+        }
+    return {
+        "success": True,
+        "status": "already_exists",
+        "media": entry.get("message"),
+        "message_id": entry.get("message_id"),
+    }
+
+
+def _inbound_key(payload: Dict[str, Any]) -> Tuple[str, str]:
+    return str(payload.get("session_id") or "").strip(), str(payload.get("media_id") or "").strip()
+
+
+async def ingest_inbound_media_message(payload: Dict[str, Any], internal_token: Optional[str] = None) -> Dict[str, Any]:
+    authorize_inbound_media(internal_token)
+    validate_inbound_media_payload(payload)
+    session_id, media_id = _inbound_key(payload)
+    await INBOUND_MEDIA.ensure_session(session_id)
+    existing_message = INBOUND_MEDIA.claim(session_id, media_id)
+    if existing_message:
+        return already_exists_response(existing_message)
+    try:
+        return await process_inbound_media(payload)
+    except BaseException:
+        INBOUND_MEDIA.release(session_id, media_id)
+        raise
+
+
+async def process_inbound_media(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Graph API -> Storage -> n8n_chat_pravi. Reentrante: si el mensaje ya existe no repite nada."""
     validate_inbound_media_payload(payload)
 
     session_id = str(payload.get("session_id") or "").strip()
@@ -367,78 +730,109 @@ async def ingest_inbound_media_message(payload: Dict[str, Any], internal_token:
     filename = str(payload.get("filename") or f"{kind}-{media_id}").strip()
     caption = str(payload.get("caption") or "").strip()
 
-    existing_message = find_existing_inbound_media_message(session_id, media_id)
-    if existing_message:
-        return {
-            "success": True,
-            "status": "already_exists",
-            "media": existing_message.get("message") and json.loads(existing_message.get("message")) if isinstance(existing_message.get("message"), str) else None,
-            "message_id": existing_message.get("id"),
-        }
+    existing_message = await find_existing_inbound_media_message(session_id, media_id)
+    if existing_message and existing_message["status"] == "done":
+        return already_exists_response(existing_message)
 
     try:
-        media_url = get_whatsapp_media_url(media_id)
-        file_bytes = download_whatsapp_media(media_url)
-        public_url = upload_inbound_media_to_storage(file_bytes, session_id, media_id, filename, mime)
-        media_payload = build_inbound_media_payload(public_url, kind, mime, filename, file_bytes, media_id)
+        media_url = await get_whatsapp_media_url(media_id)
+        # El archivo va de la Graph API a Storage por trozos, sin tenerlo entero en memoria
+        spool, download = await download_whatsapp_media(media_url)
+        with spool:
+            # Mismo contenido ya en Storage (p. ej. una imagen reenviada): se reutiliza la URL
+            public_url, upload = MEDIA_REGISTRY.storage_url(download.digest), None
+            if not public_url:
+                public_url, upload = await upload_inbound_media_to_storage(spool, download.bytes, session_id, media_id, filename, mime)
+                MEDIA_REGISTRY.remember_storage(download.digest, public_url, download.bytes)
+        media_payload = build_inbound_media_payload(public_url, kind, mime, filename, download.bytes, media_id)
         message_payload = {
             "type": "human",
             "media": media_payload,
             "content": caption or "",
         }
-        result = persist_message(session_id, message_payload)
+        result = await persist_message(session_id, message_payload)
         message_id = None
         if getattr(result, "data", None):
             message_id = result.data[0].get("id") if isinstance(result.data[0], dict) else None
+        INBOUND_MEDIA.complete(session_id, media_id, message_id, message_payload)
         return {
             "success": True,
             "status": "created",
             "media": media_payload,
             "message_id": message_id,
+            "transfer": {"download": download.as_dict(), "upload": upload.as_dict() if upload else None},
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando media entrante: {e}")
-    
 
 
-def convert_audio_to_mp3(file_bytes: bytes, filename: str) -> tuple[bytes, str, str]:
-    original_suffix = Path(filename or "audio").suffix or ".audio"
-    output_filename = f"{Path(filename or 'audio').stem}.mp3"
+MEDIA_JOBS = MediaJobQueue(
+    get_local_store, process_inbound_media, concurrency=MEDIA_JOB_CONCURRENCY,
+    max_attempts=MEDIA_JOB_MAX_ATTEMPTS, retry_delay=MEDIA_JOB_RETRY_DELAY,
+    # Un job fallido libera la media para que el reintento de n8n la vuelva a procesar
+    on_failed=lambda job_id, payload: INBOUND_MEDIA.release(*_inbound_key(payload), owner=job_id),
+)
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=original_suffix) as input_file:
-        input_file.write(file_bytes)
-        input_path = input_file.name
 
-    output_path = f"{input_path}.mp3"
+async def receive_inbound_media(payload: Dict[str, Any], internal_token: Optional[str] = None) -> Dict[str, Any]:
+    """
+    /media/inbound: token, payload y duplicado se revisan al momento (401/400, o
+    already_exists / in_progress según INBOUND_MEDIA); lo demás va a MEDIA_JOBS y se responde
+    status="queued" con el job_id (el router lo devuelve como 202).
+    Con MEDIA_INBOUND_ASYNC=0 se procesa en la petición.
+    """
+    if not MEDIA_INBOUND_ASYNC:
+        return await ingest_inbound_media_message(payload, internal_token)
+    authorize_inbound_media(internal_token)
+    validate_inbound_media_payload(payload)
 
-    try:
-        subprocess.run(
-            [
-                "ffmpeg",
-                "-y",
-                "-i",
-                input_path,
-                "-vn",
-                "-ar",
-                "44100",
-                "-ac",
-                "1",
-                "-b:a",
-                "128k",
-                output_path,
-            ],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+    session_id, media_id = _inbound_key(payload)
+    await INBOUND_MEDIA.ensure_session(session_id)
+    job_id = uuid.uuid4().hex
+    existing_message = INBOUND_MEDIA.claim(session_id, media_id, owner=job_id)
+    if existing_message:
+        return already_exists_response(existing_message)
+
+    job = await MEDIA_JOBS.submit(payload, job_id=job_id)
+    return {
+        "success": True,
+        "status": "queued",
+        "job_id": job["job_id"],
+        "status_url": f"/media/jobs/{job['job_id']}",
+    }
+
+
+async def get_media_job(job_id: str, internal_token: Optional[str] = None) -> Dict[str, Any]:
+    authorize_inbound_media(internal_token)
+    job = MEDIA_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
+    
+
+
+MEDIA_REGISTRY = MediaRegistry(get_local_store, whatsapp_ttl=WHATSAPP_MEDIA_TTL, converted_entries=CONVERTED_AUDIO_ENTRIES)
+
+AUDIO_TRANSCODER = AudioTranscoder(
+    [FFMPEG_BINARY], concurrency=TRANSCODE_CONCURRENCY, max_queue=TRANSCODE_MAX_QUEUE, timeout=TRANSCODE_TIMEOUT,
+)
 
-        with open(output_path, "rb") as converted_file:
-            converted_bytes = converted_file.read()
 
+async def convert_audio_to_mp3(file_bytes: bytes, filename: str) -> tuple[bytes, str, str]:
+    output_filename = f"{Path(filename or 'audio').stem}.mp3"
+
+    try:
+        converted_bytes = await AUDIO_TRANSCODER.transcode(file_bytes)
         return converted_bytes, output_filename, "audio/mpeg"
 
+    except TranscoderBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Hay demasiados audios convirtiéndose. Intenta de nuevo en unos segundos.",
+            headers={"Retry-After": "5"},
+        )
     except FileNotFoundError:
         raise HTTPException(
             status_code=500,
@@ -449,52 +843,43 @@ def convert_audio_to_mp3(file_bytes: bytes, filename: str) -> tuple[bytes, str,
             status_code=500,
             detail=f"No se pudo convertir el audio a MP3: {e}"
         )
-    finally:
-        try:
-            os.remove(input_path)
-        except Exception:
-            pass
-
-        try:
-            os.remove(output_path)
-        except Exception:
-            pass
-
 
-async def send_media_message_to_session(session_id: str, file: UploadFile, media_type: str):
-    is_active = await get_bot_status(session_id)
-    if is_active:
-        raise HTTPException(status_code=403, detail="El bot está activo. No se puede intervenir.")
 
-    file_bytes = await file.read()
-
-    if len(file_bytes) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="Archivo demasiado grande (máx 30MB)")
-
-    mime_type = file.content_type or "application/octet-stream"
-    wa_media_type = normalize_media_type(media_type, mime_type)
-    upload_filename = file.filename or "archivo"
+async def _timed(stage: str, timings: Dict[str, float], awaitable):
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 1)
 
-    if wa_media_type == "audio" and mime_type not in SUPPORTED_AUDIO_MIME_TYPES:
-        file_bytes, upload_filename, mime_type = convert_audio_to_mp3(file_bytes, upload_filename)
 
+async def read_outbound_upload(file: UploadFile, chunk_size: int = MEDIA_CHUNK_SIZE) -> Tuple[str, int]:
+    """
+    SHA-256 y tamaño del archivo del asesor leyéndolo por trozos; el contenido se queda en el
+    spool de Starlette (file.file) en vez de cargarse entero con file.read().
+    """
+    digest, size = hashlib.sha256(), 0
+    await file.seek(0)
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_FILE_SIZE:
+            raise HTTPException(status_code=400, detail="Archivo demasiado grande (máx 30MB)")
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+
+async def upload_outbound_media_to_storage(session_id: str, source: BinaryIO, size: int, upload_filename: str, mime_type: str) -> str:
     timestamp_id = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
     safe_filename = sanitize_storage_filename(upload_filename, timestamp_id)
     path = f"chat/{session_id}/{timestamp_id}-{safe_filename}"
 
     try:
-        storage_client = supabase.client.storage.from_("media")
-        storage_client.upload(
-            path,
-            file_bytes,
-            file_options={
-                "content-type": mime_type,
-                "cache-control": "3600",
-                "upsert": "true",
-            }
-        )
+        await _storage().upload(DEFAULT_STORAGE_BUCKET, path, source, size, mime_type)
 
-        public_url_response = storage_client.get_public_url(path)
+        public_url_response = supabase.client.storage.from_(DEFAULT_STORAGE_BUCKET).get_public_url(path)
 
         if isinstance(public_url_response, dict):
             public_url = public_url_response.get("publicUrl") or public_url_response.get("public_url")
@@ -504,12 +889,121 @@ async def send_media_message_to_session(session_id: str, file: UploadFile, media
         if not public_url:
             raise Exception("No public URL returned")
 
+        return public_url
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error subiendo archivo: {e}")
 
+
+async def registered_whatsapp_media_id(digest: str, source: BinaryIO, filename: str, mime_type: str) -> Tuple[str, bool]:
+    """media_id vigente de MEDIA_REGISTRY o el de una subida nueva; True si se reutilizó."""
+    phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID") or ""
+    media_id = MEDIA_REGISTRY.whatsapp_media_id(digest, phone_number_id)
+    if media_id:
+        return media_id, True
+    media_id = await upload_media(SpoolReader(source), filename, mime_type)
+    MEDIA_REGISTRY.remember_whatsapp(digest, phone_number_id, media_id)
+    return media_id, False
+
+
+# Errores de la Graph API que indican que el media_id ya no sirve (expiró o Meta no lo encuentra)
+MEDIA_ID_ERROR_CODES = {131052, 131053}
+
+
+def media_id_rejected(error: WhatsAppError, media_id: str) -> bool:
+    """True si Meta rechazó el envío por el media_id y no por el destinatario, la ventana de 24h, etc."""
+    if error.status_code >= 500:
+        return False
     try:
-        media_id = upload_media(file_bytes, upload_filename, mime_type)
-        send_media_message_to_whatsapp(session_id, media_id, wa_media_type)
+        detail = json.loads(error.text).get("error") or {}
+    except (ValueError, AttributeError):
+        return False
+    if detail.get("code") in MEDIA_ID_ERROR_CODES:
+        return True
+    message = " ".join(str(detail.get(k) or "") for k in ("message", "error_user_msg"))
+    message += " " + str((detail.get("error_data") or {}).get("details") or "")
+    # 100 "Invalid parameter" también se usa para un id de media desconocido; el mensaje lo nombra
+    return detail.get("code") == 100 and (media_id in message or "media" in message.lower())
+
+
+async def send_registered_media_to_whatsapp(
+    to: str, digest: str, media_id: str, reused: bool, source: BinaryIO, filename: str, mime_type: str, wa_media_type: str,
+) -> bool:
+    """
+    Envía el media_id; si era uno reutilizado y Meta lo rechaza por el propio id, se olvida,
+    se sube el archivo de nuevo y se reenvía. Cualquier otro error se propaga sin tocar la caché.
+    Devuelve si al final se reutilizó.
+    """
+    try:
+        await send_media_message_to_whatsapp(to, media_id, wa_media_type)
+        return reused
+    except WhatsAppError as e:
+        if not reused or not media_id_rejected(e, media_id):
+            raise
+    MEDIA_REGISTRY.forget_whatsapp(digest, os.getenv("WHATSAPP_PHONE_NUMBER_ID") or "")
+    media_id, _ = await registered_whatsapp_media_id(digest, source, filename, mime_type)
+    await send_media_message_to_whatsapp(to, media_id, wa_media_type)
+    return False
+
+
+async def send_media_message_to_session(session_id: str, file: UploadFile, media_type: str):
+    """
+    Archivo del asesor -> Storage y Graph API a la vez -> mensaje de WhatsApp -> n8n_chat_pravi.
+    Las dos subidas no dependen entre sí: la latencia es la de la más lenta y no la suma.
+    El envío espera a que ambas terminen, así un fallo de Storage no deja un mensaje sin registrar.
+    """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    is_active = await get_bot_status(session_id)
+    if is_active:
+        raise HTTPException(status_code=403, detail="El bot está activo. No se puede intervenir.")
+
+    mime_type = file.content_type or "application/octet-stream"
+    wa_media_type = normalize_media_type(media_type, mime_type)
+    upload_filename = file.filename or "archivo"
+
+    digest, size = await _timed("read", timings, read_outbound_upload(file))
+    source: BinaryIO = file.file
+
+    if wa_media_type == "audio" and mime_type not in SUPPORTED_AUDIO_MIME_TYPES:
+        # Notas de voz: pequeñas; FFmpeg las recibe por stdin
+        converted = MEDIA_REGISTRY.converted(digest)
+        if converted is None:
+            await file.seek(0)
+            converted = await _timed("convert", timings, convert_audio_to_mp3(await file.read(), upload_filename))
+            MEDIA_REGISTRY.remember_converted(digest, *converted)
+        file_bytes, upload_filename, mime_type = converted
+        source, size, digest = io.BytesIO(file_bytes), len(file_bytes), media_digest(file_bytes)
+
+    # El mismo archivo (catálogo, foto de producto...) enviado otra vez no se vuelve a subir
+    public_url = MEDIA_REGISTRY.storage_url(digest)
+    reused = {"storage": public_url is not None, "whatsapp": False}
+
+    async def storage_branch() -> str:
+        if public_url:
+            return public_url
+        url = await _timed("storage", timings, upload_outbound_media_to_storage(session_id, source, size, upload_filename, mime_type))
+        MEDIA_REGISTRY.remember_storage(digest, url, size)
+        return url
+
+    async def whatsapp_branch() -> Tuple[str, bool]:
+        try:
+            return await _timed("whatsapp_upload", timings, registered_whatsapp_media_id(digest, source, upload_filename, mime_type))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error enviando multimedia a WhatsApp: {e}")
+
+    branches = [asyncio.ensure_future(storage_branch()), asyncio.ensure_future(whatsapp_branch())]
+    try:
+        public_url, (media_id, reused_media_id) = await asyncio.gather(*branches)
+    except BaseException:
+        for branch in branches:
+            branch.cancel()
+        raise
+
+    try:
+        reused["whatsapp"] = await _timed("whatsapp_send", timings, send_registered_media_to_whatsapp(
+            session_id, digest, media_id, reused_media_id, source, upload_filename, mime_type, wa_media_type,
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error enviando multimedia a WhatsApp: {e}")
 
@@ -521,7 +1015,7 @@ async def send_media_message_to_session(session_id: str, file: UploadFile, media
             "url": public_url,
             "mime": mime_type,
             "name": upload_filename,
-            "size": len(file_bytes),
+            "size": size,
         },
         "mediaUrl": public_url,
         "tool_calls": [],
@@ -530,48 +1024,101 @@ async def send_media_message_to_session(session_id: str, file: UploadFile, media
         "invalid_tool_calls": [],
     }
 
-    result = persist_message(session_id, message_payload)
+    result = await _timed("persist", timings, persist_message(session_id, message_payload))
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
 
     return {
         "status": "media_sent",
         "mediaUrl": public_url,
         "data": result.data,
+        "reused": reused,
+        "timings_ms": timings,
     }
 
+ACTIVATION_TABLE = "chat_activation_pravi"
+
+
+async def _fetch_bot_statuses(session_ids: List[str]) -> Dict[str, bool]:
+    chunks = [session_ids[i:i + 200] for i in range(0, len(session_ids), 200)]  # URLs de largo razonable
+    results = await asyncio.gather(*(
+        supabase.aclient.table(ACTIVATION_TABLE).select("session_id,is_active").in_("session_id", chunk).execute()
+        for chunk in chunks
+    ))
+    return {row["session_id"]: row["is_active"] for resp in results for row in resp.data or []}
+
+
+async def _insert_default_bot_status(session_id: str) -> None:
+    # ignore_duplicates: si otra petición (u otro proceso) ya creó la fila, no se pisa su estado
+    await supabase.aclient.table(ACTIVATION_TABLE)\
+        .upsert({"session_id": session_id, "is_active": True}, on_conflict="session_id", ignore_duplicates=True)\
+        .execute()
+
+
+BOT_STATUS = BotStatusCache(_fetch_bot_statuses, _insert_default_bot_status, ttl=BOT_STATUS_TTL)
+
+
 async def get_bot_status(session_id: str):
-    """Obtiene el estado actual del bot para una sesión específica"""
+    """Obtiene el estado actual del bot para una sesión específica (vía BOT_STATUS)"""
     try:
-        result = supabase.client.table("chat_activation_pravi")\
-            .select("is_active")\
-            .eq("session_id", session_id)\
-            .execute()
-        
-        if result.data:
-            return result.data[0]["is_active"]
-        else:
-            # Si no existe registro, crear uno activo por defecto
-            supabase.client.table("chat_activation_pravi")\
-                .insert({"session_id": session_id, "is_active": True})\
-                .execute()
-            return True
+        # Si no existe registro, BOT_STATUS crea uno activo por defecto
+        return await BOT_STATUS.get(session_id)
     except Exception as e:
         print(f"Error getting bot status: {e}")
         return True  # Por defecto activo
-    
-def persist_message(session_id: str, message_payload: dict):
-    timestamp = datetime.utcnow().isoformat()
+
+
+async def get_bot_statuses(session_ids: List[str]) -> List[Dict[str, Any]]:
+    """Estado del bot de varias sesiones en una sola consulta (sin crear filas)."""
     try:
-        response = supabase.client.table("n8n_chat_pravi").insert({
-            "session_id": session_id,
-            "message": message_payload,
-            "time": timestamp,
-        }).execute()
+        statuses = await BOT_STATUS.get_many(session_ids)
+    except Exception as e:
+        print(f"Error getting bot statuses: {e}")
+        statuses = {s: True for s in session_ids}
+    return [{"session_id": s, "is_active": a} for s, a in statuses.items()]
+
+
+async def set_bot_status(session_id: str, is_active: bool):
+    """Upsert en chat_activation_pravi y escritura directa en BOT_STATUS."""
+    result = await supabase.aclient.table(ACTIVATION_TABLE)\
+        .upsert({"session_id": session_id, "is_active": is_active}, on_conflict="session_id")\
+        .execute()
+    BOT_STATUS.store(session_id, is_active)
+    return result
 
-        return response
+async def persist_message(session_id: str, message_payload: dict):
+    return await persist_messages([(session_id, message_payload)], single=True)
+
+
+async def persist_messages(messages: List[Tuple[str, dict]], single: bool = False):
+    """
+    Inserta varios mensajes en una sola petición (difusión); persist_message usa la misma ruta
+    o, con MESSAGE_BATCH_WINDOW > 0, se junta con los de otras peticiones en MESSAGE_BATCHER.
+    """
+    timestamp = datetime.utcnow().isoformat()
+    rows = [{"session_id": session_id, "message": payload, "time": timestamp} for session_id, payload in messages]
+    try:
+        if single and MESSAGE_BATCHER.enabled:
+            data = [await MESSAGE_BATCHER.submit(rows[0])]
+        else:
+            data = await _insert_message_batch(rows[0] if single else rows)
+        return APIResponse(data=data, count=None)
     except Exception as e:
         print(f"Error persisting message: {e}")
         raise
-    
+
+
+async def _insert_message_batch(rows: Union[Dict[str, Any], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Único punto de escritura en n8n_chat_pravi: inserta y avisa a CONVERSATION_HEADS y CHAT_EVENTS."""
+    response = await supabase.aclient.table("n8n_chat_pravi").insert(rows).execute()
+
+    # La conversación pasa arriba y llega a los visores sin esperar a ningún sondeo
+    CONVERSATION_HEADS.record_many(response.data or [])
+    CHAT_EVENTS.publish(response.data or [])
+    return response.data or []
+
+
+MESSAGE_BATCHER = MessageWriteBatcher(_insert_message_batch, window=MESSAGE_BATCH_WINDOW, max_rows=MESSAGE_BATCH_MAX_ROWS)
+
 # SI en algún momento queremos recuperar un archivo que fue enviado por el usuario y solo tienes el media_id.
 #def get_media_url(media_id: str) -> str:
 #    url = f"{WHATSAPP_API_URL}/{media_id}"
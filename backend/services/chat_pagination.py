@@ -0,0 +1,52 @@
+# services/chat_pagination.py
+import base64
+from typing import Any, Optional, Tuple
+import pandas as pd
+from fastapi import HTTPException
+
+
+def time_ns(value: Any) -> int:
+    """`time` de n8n_chat_pravi -> epoch en ns (UTC; sin zona se asume UTC). Inválido -> 0."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        ts = pd.to_datetime(value, errors="coerce", utc=True, format="ISO8601")
+    else:
+        ts = pd.Timestamp(value)
+    if pd.isna(ts):
+        return 0
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.value)
+
+
+def cursor_time(time_key: int) -> str:
+    """time_ns -> ISO 8601 UTC con microsegundos, para filtrar `time` en PostgREST."""
+    return pd.Timestamp(time_key, tz="UTC").isoformat()
+
+
+def keyset_filter(cursor: Tuple[int, int], op: str) -> str:
+    """
+    Filtro `or` de PostgREST para (time, id) `op` cursor, con op 'lt' o 'gt':
+    time op t, o bien time = t e id op id (desempata filas con la misma marca de tiempo).
+    """
+    t = cursor_time(cursor[0])
+    return f'time.{op}."{t}",and(time.eq."{t}",id.{op}.{cursor[1]})'
+
+
+def encode_cursor(time_key: int, row_id: Any) -> str:
+    """Cursor opaco 'time|id' (base64 url-safe) para paginar por (time, id)."""
+    raw = f"{time_key}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Cursor -> (time_ns, id). 400 si no es un cursor emitido por esta API."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        time_part, id_part = raw.split("|", 1)
+        return int(time_part), int(id_part)
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor inválido")
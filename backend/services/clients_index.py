@@ -0,0 +1,128 @@
+# services/clients_index.py
+import bisect
+import heapq
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import pandas as pd
+
+# (0 si ultima_interaccion es nula, -epoch_ns, id): ordenar asc = ultima_interaccion desc, NULLs primero
+SortKey = Tuple[int, int, Any]
+
+
+class DerivedLabelIndex:
+    """
+    Índice secundario etiqueta derivada -> ids de clientes en el orden de la tabla
+    (ultima_interaccion desc). Indexa:
+      - 'seguimiento': en minúsculas, igual que la comparación de DataProcessor.filter_data
+      - 'calificacion': etiqueta exacta ('3: Cliente Potencial'); el nivel se resuelve por prefijo
+    Se reconstruye con rebuild() y se mantiene con upsert()/remove() al cambiar filas.
+    """
+    FIELDS = ("seguimiento", "calificacion")
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, str], List[SortKey]] = {}
+        self._entries: Dict[Hashable, Tuple[SortKey, Dict[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def rebuild(self, df: pd.DataFrame) -> None:
+        self._postings = {}
+        self._entries = {}
+        for key, labels in self._iter_entries(df):
+            self._entries[key[2]] = (key, labels)
+            for field, label in labels.items():
+                self._postings.setdefault((field, label), []).append(key)
+        for keys in self._postings.values():
+            keys.sort()
+
+    def upsert(self, df: pd.DataFrame) -> None:
+        for key, labels in self._iter_entries(df):
+            self._remove(key[2])
+            self._entries[key[2]] = (key, labels)
+            for field, label in labels.items():
+                bisect.insort(self._postings.setdefault((field, label), []), key)
+
+    def remove(self, ids: List[Hashable]) -> None:
+        for client_id in ids:
+            self._remove(client_id)
+
+    def page(
+        self,
+        offset: int,
+        size: int,
+        seguimiento: Optional[str] = None,
+        calificacion: Optional[str] = None,
+        calificacion_nivel: Optional[int] = None,
+    ) -> Tuple[List[Hashable], int]:
+        """
+        Ids de la página [offset, offset+size) que cumplen todos los filtros y el total.
+        Con un solo filtro cuesta O(size); con varios, O(lista más corta).
+        """
+        constraints: List[Tuple[List[SortKey], str, Callable[[str], bool]]] = []
+        if seguimiento not in (None, ""):
+            wanted_seg = str(seguimiento).strip().lower()
+            constraints.append((
+                self._postings.get(("seguimiento", wanted_seg), []),
+                "seguimiento", lambda v: v == wanted_seg,
+            ))
+        if calificacion not in (None, ""):
+            wanted_cal = str(calificacion).strip()
+            constraints.append((
+                self._postings.get(("calificacion", wanted_cal), []),
+                "calificacion", lambda v: v == wanted_cal,
+            ))
+        if calificacion_nivel is not None:
+            prefix = f"{int(calificacion_nivel)}:"
+            lists = [
+                keys for (field, label), keys in self._postings.items()
+                if field == "calificacion" and label.startswith(prefix)
+            ]
+            merged = lists[0] if len(lists) == 1 else list(heapq.merge(*lists))
+            constraints.append((merged, "calificacion", lambda v: v.startswith(prefix)))
+
+        if not constraints:
+            keys = sorted(key for key, _ in self._entries.values())
+        elif len(constraints) == 1:
+            keys = constraints[0][0]
+        else:
+            constraints.sort(key=lambda c: len(c[0]))
+            driver, others = constraints[0][0], constraints[1:]
+            keys = [
+                key for key in driver
+                if all(match(self._entries[key[2]][1][field]) for _, field, match in others)
+            ]
+        return [key[2] for key in keys[offset:offset + size]], len(keys)
+
+    def _remove(self, client_id: Hashable) -> None:
+        entry = self._entries.pop(client_id, None)
+        if entry is None:
+            return
+        key, labels = entry
+        for field, label in labels.items():
+            keys = self._postings.get((field, label), [])
+            pos = bisect.bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                del keys[pos]
+
+    @staticmethod
+    def _iter_entries(df: pd.DataFrame):
+        if df is None or df.empty or "id" not in df.columns:
+            return
+        ts = pd.to_datetime(df["ultima_interaccion"], errors="coerce") if "ultima_interaccion" in df.columns \
+            else pd.Series(pd.NaT, index=df.index)
+        is_null = ts.isna().to_numpy()
+        epoch = ts.to_numpy(dtype="datetime64[ns]").view("int64")
+        seguimiento = (
+            df["seguimiento"].astype(str).str.strip().str.lower() if "seguimiento" in df.columns
+            else pd.Series("", index=df.index)
+        ).to_numpy()
+        calificacion = (
+            df["calificacion"].astype(str) if "calificacion" in df.columns
+            else pd.Series("", index=df.index)
+        ).to_numpy()
+        for client_id, null, ns, seg, cal in zip(df["id"].to_numpy(), is_null, epoch, seguimiento, calificacion):
+            if pd.isna(client_id):
+                continue
+            client_id = client_id.item() if hasattr(client_id, "item") else client_id
+            key = (0, 0, client_id) if null else (1, -int(ns), client_id)
+            yield key, {"seguimiento": seg, "calificacion": cal}
@@ -0,0 +1,102 @@
+# services/clients_snapshot.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import pandas as pd
+from services.database_module import DataProcessor
+from services.clients_index import DerivedLabelIndex
+
+FetchAll = Callable[[], Awaitable[List[Dict[str, Any]]]]
+FetchSince = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+
+class ClientsSnapshot:
+    """
+    Caché en proceso de la tabla de clientes ya transformada con DataProcessor.transform_data.
+      - ttl: pasado este tiempo solo se piden las filas con ultima_interaccion >= marca de agua
+      - full_ttl: pasado este tiempo se recarga todo (borrados y re-cálculo de 'seguimiento')
+      - varias peticiones en frío comparten una única descarga
+      - mantiene un DerivedLabelIndex (seguimiento/calificacion -> ids) al ritmo de los cambios
+    El DataFrame devuelto es compartido: los consumidores no deben modificarlo en sitio.
+    """
+    def __init__(self, fetch_all: FetchAll, fetch_since: FetchSince, ttl: float = 60, full_ttl: float = 900):
+        self._fetch_all = fetch_all
+        self._fetch_since = fetch_since
+        self.ttl = ttl
+        self.full_ttl = full_ttl
+        self._df: Optional[pd.DataFrame] = None
+        self._high_water: Optional[pd.Timestamp] = None
+        self._refreshed_at = 0.0
+        self._loaded_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self.index = DerivedLabelIndex()
+
+    def _is_fresh(self) -> bool:
+        return self._df is not None and (time.monotonic() - self._refreshed_at) < self.ttl
+
+    async def get(self) -> pd.DataFrame:
+        if self._is_fresh():
+            return self._df
+
+        loop = asyncio.get_running_loop()
+        task = self._inflight
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self._refresh())
+            self._inflight = task
+        # shield: si un cliente cancela, la descarga compartida sigue para los demás
+        await asyncio.shield(task)
+        return self._df
+
+    async def get_index(self) -> DerivedLabelIndex:
+        """Índice de etiquetas derivadas, al día con el snapshot."""
+        await self.get()
+        return self.index
+
+    def invalidate(self) -> None:
+        """Fuerza una recarga completa en la próxima lectura."""
+        self._df = None
+        self._high_water = None
+
+    async def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._df is None or self._high_water is None or (now - self._loaded_at) >= self.full_ttl:
+            rows = await self._fetch_all()
+            self._df = self._sort(DataProcessor.transform_data(rows)) if rows else pd.DataFrame()
+            self.index.rebuild(self._df)
+            self._high_water = self._max_timestamp(rows)
+            self._loaded_at = now
+        else:
+            delta = await self._fetch_since(self._high_water.isoformat())
+            if delta:
+                delta_df = DataProcessor.transform_data(delta)
+                self._df = self._merge(self._df, delta_df)
+                self.index.upsert(delta_df)
+                delta_top = self._max_timestamp(delta)
+                if delta_top is not None and delta_top > self._high_water:
+                    self._high_water = delta_top
+        self._refreshed_at = now
+
+    @staticmethod
+    def _merge(df: pd.DataFrame, delta_df: pd.DataFrame) -> pd.DataFrame:
+        if df.empty:
+            return ClientsSnapshot._sort(delta_df)
+        kept = df[~df["id"].isin(delta_df["id"])]
+        return ClientsSnapshot._sort(pd.concat([kept, delta_df], ignore_index=True))
+
+    @staticmethod
+    def _sort(df: pd.DataFrame) -> pd.DataFrame:
+        # Mismo orden que la consulta a BD: ultima_interaccion desc (Postgres pone NULLs primero)
+        if df.empty or "ultima_interaccion" not in df.columns:
+            return df
+        return df.sort_values(
+            "ultima_interaccion", ascending=False, na_position="first", kind="mergesort"
+        ).reset_index(drop=True)
+
+    @staticmethod
+    def _max_timestamp(rows: List[Dict[str, Any]]) -> Optional[pd.Timestamp]:
+        values = pd.to_datetime(
+            pd.Series([r.get("ultima_interaccion") for r in rows], dtype=object),
+            errors="coerce", utc=True, format="ISO8601",
+        )
+        top = values.max()
+        return None if pd.isna(top) else top
@@ -0,0 +1,80 @@
+# services/cotizacion_cache.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+import pandas as pd
+from services.cotizacion_frame import projection
+
+LoadFrame = Callable[[], Awaitable[pd.DataFrame]]
+
+logger = logging.getLogger(__name__)
+
+
+class CotizacionesFrameCache:
+    """
+    Caché en proceso del frame compacto de cotizaciones (ver cotizacion_frame.build_frame).
+      - ttl: mientras el frame tenga menos de `ttl` segundos se sirve sin ir a la BD
+      - stale_while_revalidate: vencido el ttl se devuelve el frame anterior y se recarga
+        en segundo plano; sin él, la petición espera la recarga
+      - varias peticiones en frío comparten una única descarga
+      - invalidate(): descarta el frame; una descarga que ya estaba en curso no lo repone
+    El DataFrame devuelto es compartido: los consumidores no deben modificarlo en sitio.
+    """
+    def __init__(self, load: LoadFrame, columns: Iterable[str], ttl: float = 60, stale_while_revalidate: bool = False):
+        self._load = load
+        self.columns = projection(columns)
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self._df: Optional[pd.DataFrame] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._inflight: Optional[asyncio.Future] = None
+
+    def covers(self, columns: Iterable[str]) -> bool:
+        return set(projection(columns)) <= set(self.columns)
+
+    def _is_fresh(self) -> bool:
+        return self._df is not None and (time.monotonic() - self._loaded_at) < self.ttl
+
+    async def get(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Frame cacheado (solo `columns` + id si se indican)."""
+        if not self._is_fresh():
+            while True:
+                task = self._refresh_task()
+                if self._df is not None and self.stale_while_revalidate:
+                    break
+                # shield: si un cliente cancela, la descarga compartida sigue para los demás
+                await asyncio.shield(task)
+                # si se invalidó mientras se esperaba, esa descarga no cuenta: se lanza otra
+                if self._df is not None:
+                    break
+        df = self._df
+        return df if columns is None else df[list(projection(columns))]
+
+    def invalidate(self) -> None:
+        """Fuerza una descarga nueva en la próxima lectura."""
+        self._generation += 1
+        self._df = None
+        self._inflight = None
+
+    def _refresh_task(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        task = self._inflight
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self._refresh(self._generation))
+            task.add_done_callback(self._log_failure)
+            self._inflight = task
+        return task
+
+    async def _refresh(self, generation: int) -> None:
+        df = await self._load()
+        if generation == self._generation:
+            self._df = df
+            self._loaded_at = time.monotonic()
+
+    @staticmethod
+    def _log_failure(task: asyncio.Future) -> None:
+        # En modo stale nadie espera la recarga: el error solo queda en el log
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Recarga de cotizaciones falló: %s", task.exception())
@@ -1,67 +1,107 @@
 # services/cotizacion_dashboard.py
 import pandas as pd
-import asyncio, math, bisect
+import math, bisect
 import pytz
 from datetime import datetime
-from typing import List, Dict, Any
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_KEY
+from typing import List, Dict, Any, Optional, Callable, Iterable
+from config import SCAN_CONCURRENCY, COTIZ_FRAME_TTL, COTIZ_FRAME_SWR
+from services.range_scanner import scan_ranges
+from services.cotizacion_rollup import MONTHLY_ROLLUP
+from services.cotizacion_cache import CotizacionesFrameCache
+from services.supabase_registry import get_supabase_client, get_async_postgrest
+from services.cotizacion_frame import (
+    ALL_COLUMNS, CACHED_COLUMNS, SUMMARY_COLUMNS, TOP_ESTILO_COLUMNS, TOP_DISTRITO_COLUMNS,
+    build_frame, labels, projection,
+)
 
 class CotizacionDashboard:
+    # Frame compartido entre instancias (todo el proceso); se crea con la primera lectura
+    _frames: Optional[CotizacionesFrameCache] = None
+
     def __init__(self):
-        # Creamos un cliente fresco en cada instancia (sin cache)
-        self.client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        self.client.postgrest.session.headers.update({
-            "Cache-Control": "no-cache"
-        })
+        # Cliente compartido (ya envía Cache-Control: no-cache); la caché propia es _frames
+        self.client = get_supabase_client()
+
+    @property
+    def aclient(self):
+        """PostgREST async del event loop en curso."""
+        return get_async_postgrest()
 
     # ---------- Helpers internos ----------
-    async def _df(self, chunk_size: int = 2000) -> pd.DataFrame:
-        """Descarga TODAS las cotizaciones y normaliza columnas clave."""
-        all_rows = []
-        page = 0
-        while True:
-            start = page * chunk_size
-            end = start + chunk_size - 1
-            resp = await asyncio.to_thread(
-                lambda: (self.client.table("cotizaciones")
-                         .select("id,fecha_hora,created_at,precio_final,area_m2,estilo,distrito")
-                         .order("id", desc=False)
-                         .range(start, end)
-                         .execute())
+    async def _count(self, build: Callable = lambda q: q) -> int:
+        resp = await build(self.aclient.table("cotizaciones").select("id", count="exact", head=True)).execute()
+        return resp.count or 0
+
+    async def _scan(
+        self,
+        columns: str,
+        build: Callable = lambda q: q,
+        order: str = "id",
+        desc: bool = False,
+        limit: Optional[int] = None,
+        page_size: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        """
+        Todas las filas que cumplen `build` (filtros): conteo exacto y rangos en paralelo.
+        page_size no debe superar el max-rows de PostgREST (1000 en Supabase) o cada rango llega recortado.
+        """
+        total = await self._count(build)
+        if limit is not None:
+            total = min(total, limit)
+
+        async def fetch(start: int, end: int):
+            if limit is not None:
+                end = min(end, limit - 1)
+            q = build(self.aclient.table("cotizaciones").select(columns)).order(order, desc=desc)
+            if order != "id":
+                q = q.order("id")
+            return (await q.range(start, end).execute()).data or []
+
+        rows = await scan_ranges(fetch, total, page_size=page_size, concurrency=SCAN_CONCURRENCY)
+        return rows[:limit] if limit is not None else rows
+
+    def frame_cache(self) -> Optional[CotizacionesFrameCache]:
+        """Caché del frame compartido (None si COTIZ_FRAME_TTL <= 0)."""
+        if COTIZ_FRAME_TTL <= 0:
+            return None
+        if CotizacionDashboard._frames is None:
+            CotizacionDashboard._frames = CotizacionesFrameCache(
+                lambda: self._load_frame(CACHED_COLUMNS), CACHED_COLUMNS,
+                ttl=COTIZ_FRAME_TTL, stale_while_revalidate=COTIZ_FRAME_SWR,
             )
-            chunk = resp.data or []
-            all_rows.extend(chunk)
-            if len(chunk) < chunk_size:
-                break
-            page += 1
+        return CotizacionDashboard._frames
 
-        df = pd.DataFrame(all_rows)
-        required = ["id", "fecha_hora", "created_at", "precio_final", "area_m2", "estilo", "distrito"]
-        for c in required:
-            if c not in df.columns:
-                df[c] = None
+    def invalidate_cache(self) -> None:
+        """Descarta el frame compartido y el rollup mensual (p. ej. tras una carga masiva)."""
+        if CotizacionDashboard._frames is not None:
+            CotizacionDashboard._frames.invalidate()
+        MONTHLY_ROLLUP.invalidate()
 
-        # Convertir a tz-aware
-        for col in ["fecha_hora", "created_at"]:
-            df[col] = pd.to_datetime(df[col], errors="coerce", utc=True)
+    async def _load_frame(self, columns: Iterable[str]) -> pd.DataFrame:
+        """Descarga TODAS las cotizaciones, solo con `columns` (+ id), en el frame compacto."""
+        cols = projection(columns)
+        all_rows = await self._scan(",".join(cols))
+        return build_frame(all_rows, cols)
 
-        # Normalizar numéricos
-        df["precio_final"] = pd.to_numeric(df["precio_final"], errors="coerce")
-        df["area_m2"] = pd.to_numeric(df["area_m2"], errors="coerce")
-        return df
+    async def _df(self, columns: Iterable[str] = ALL_COLUMNS) -> pd.DataFrame:
+        """Frame de cotizaciones con `columns`: del frame compartido si lo cubre, si no se descarga."""
+        cache = self.frame_cache()
+        if cache is not None and cache.covers(columns):
+            return await cache.get(columns)
+        return await self._load_frame(columns)
 
 
     # ---------- Métricas sin RPC/Views ----------
     async def summary(self) -> Dict[str, Any]:
         """Métricas globales de cotizaciones."""
-        df = await self._df()
+        df = await self._df(SUMMARY_COLUMNS)
         if df.empty:
             return {"total_cotizaciones": 0, "suma_precio": 0, "ticket_promedio": 0, "m2_promedio": 0}
         n = len(df)
         suma = df["precio_final"].fillna(0).sum()
         ticket = suma / n if n else 0
-        m2_prom = df["area_m2"].dropna().mean() if n else 0
+        # area_m2 es float32: la media se acumula en float64
+        m2_prom = df["area_m2"].dropna().astype("float64").mean() if n else 0
         return {
             "total_cotizaciones": int(n),
             "suma_precio": float(suma),
@@ -70,8 +110,20 @@ class CotizacionDashboard:
         }
     
 
+    async def _month_rows(self, start_utc: str, end_utc: Optional[str], after_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """id, fecha_hora y precio_final con fecha_hora en [start_utc, end_utc) e id > after_id."""
+        def build(q):
+            q = q.gte("fecha_hora", start_utc)
+            if end_utc:
+                q = q.lt("fecha_hora", end_utc)
+            if after_id is not None:
+                q = q.gt("id", after_id)
+            return q
+
+        return await self._scan("id,fecha_hora,precio_final", build)
+
     async def get_cotizaciones_month(self, year: int, month: int, tz: str = "America/Lima") -> Dict[str, Any]:
-        """Cuenta y suma del mes (definido en hora local)."""
+        """Cuenta y suma del mes (definido en hora local), leyendo todas las filas del mes."""
         lima = pytz.timezone(tz)
         start_local = lima.localize(datetime(year, month, 1))
         if month == 12:
@@ -82,17 +134,8 @@ class CotizacionDashboard:
         start_utc = start_local.astimezone(pytz.UTC).isoformat()
         end_utc = end_local.astimezone(pytz.UTC).isoformat()
 
-        # Trae ids (para count exacto) y precio_final (para suma)
-        # Nota: count="exact" devuelve el conteo total aunque la página de datos sea limitada.
-        resp = await asyncio.to_thread(
-            lambda: (self.client.table("cotizaciones")
-                     .select("id,precio_final", count="exact")
-                     .gte("fecha_hora", start_utc)
-                     .lt("fecha_hora", end_utc)
-                     .execute())
-        )
-        total = resp.count or 0
-        data = resp.data or []
+        # Se recorren todas las páginas: una sola respuesta queda recortada por el max-rows de PostgREST
+        data = await self._month_rows(start_utc, end_utc)
         suma = 0.0
         for r in data:
             try:
@@ -102,58 +145,37 @@ class CotizacionDashboard:
                 suma += float(v)
             except Exception:
                 pass
-        return {"x": f"{year}-{month:02d}", "total": int(total), "suma_precio": float(suma)}
+        return {"x": f"{year}-{month:02d}", "total": len(data), "suma_precio": float(suma)}
 
 
     async def series_monthly(self, months_back: int = 12, tz: str = "America/Lima") -> List[Dict[str, Any]]:
-        """Construye serie de `months_back` meses hacia atrás (en hora local), usando el método mensual."""
-        now_local = datetime.now(pytz.timezone(tz))
-        serie: List[Dict[str, Any]] = []
-
-        for i in range(months_back):
-            y = now_local.year if now_local.month - i > 0 else now_local.year - 1
-            m = ((now_local.month - i - 1) % 12) + 1
-            item = await self.get_cotizaciones_month(y, m, tz)
-            serie.append(item)
-
-        return sorted(serie, key=lambda r: r["x"])
+        """Serie de `months_back` meses hacia atrás (en hora local) desde el rollup mensual en proceso."""
+        return await MONTHLY_ROLLUP.series(self._month_rows, months_back, tz)
 
 
     async def top_estilo(self, limit: int = 5) -> List[Dict[str, Any]]:
-        df = await self._df()
-        if df.empty:
-            return []
-        g = (
-            df.assign(estilo=df["estilo"].fillna("—"))
-              .groupby("estilo")
-              .agg(total=("id","count"),
-                   suma_precio=("precio_final", lambda x: pd.to_numeric(x, errors="coerce").fillna(0).sum()),
-                   promedio=("precio_final", lambda x: pd.to_numeric(x, errors="coerce").dropna().mean() or 0))
-              .reset_index()
-              .sort_values("suma_precio", ascending=False)
-              .head(limit)
-        )
-        return [
-            {"label": r["estilo"], "total": int(r["total"]), "suma_precio": float(r["suma_precio"]), "promedio": float(r["promedio"] or 0)}
-            for _, r in g.iterrows()
-        ]
+        return self._top(await self._df(TOP_ESTILO_COLUMNS), "estilo", limit)
 
     async def top_distrito(self, limit: int = 5) -> List[Dict[str, Any]]:
-        df = await self._df()
+        return self._top(await self._df(TOP_DISTRITO_COLUMNS), "distrito", limit)
+
+    @staticmethod
+    def _top(df: pd.DataFrame, column: str, limit: int) -> List[Dict[str, Any]]:
+        """Top `limit` etiquetas de `column` por suma de precio_final (agrupando sobre la categórica)."""
         if df.empty:
             return []
         g = (
-            df.assign(distrito=df["distrito"].fillna("—"))
-              .groupby("distrito")
-              .agg(total=("id","count"),
-                   suma_precio=("precio_final", lambda x: pd.to_numeric(x, errors="coerce").fillna(0).sum()),
-                   promedio=("precio_final", lambda x: pd.to_numeric(x, errors="coerce").dropna().mean() or 0))
+            df.assign(**{column: labels(df[column])})
+              .groupby(column, observed=True)
+              .agg(total=("id", "count"),
+                   suma_precio=("precio_final", "sum"),
+                   promedio=("precio_final", "mean"))
               .reset_index()
               .sort_values("suma_precio", ascending=False)
               .head(limit)
         )
         return [
-            {"label": r["distrito"], "total": int(r["total"]), "suma_precio": float(r["suma_precio"]), "promedio": float(r["promedio"] or 0)}
+            {"label": r[column], "total": int(r["total"]), "suma_precio": float(r["suma_precio"]), "promedio": float(0 if pd.isna(r["promedio"]) else r["promedio"])}
             for _, r in g.iterrows()
         ]
     
@@ -168,42 +190,27 @@ class CotizacionDashboard:
         if f == c: return float(s[f])
         return float(s[f] * (c - k) + s[c] * (k - f))
 
-    def _load_areas_sync(self, limit: int = 5000, page_size: int = 1000) -> List[float]:
+    async def _load_areas(self, limit: int = 5000, page_size: int = 1000) -> List[float]:
         """
-        Carga 'area_m2' paginando via PostgREST (sin SQL crudo).
+        Carga 'area_m2' > 0 (lo más reciente primero) vía PostgREST, sin SQL crudo.
         Lee como máx. 'limit' filas para no demorar.
         """
+        rows = await self._scan(
+            "id,area_m2", lambda q: q.gt("area_m2", 0),
+            order="fecha_hora", desc=True, limit=limit, page_size=page_size,
+        )
         values: List[float] = []
-        offset = 0
-        while len(values) < limit:
-            start = offset
-            end = min(offset + page_size - 1, limit - 1)
-            # Solo la columna necesaria + filtro básico
-            resp = (
-                self.client.table("cotizaciones")
-                .select("area_m2")
-                .gt("area_m2", 0)             # > 0
-                .order("fecha_hora", desc=True)  # para traer lo más reciente primero
-                .range(start, end)
-                .execute()
-            )
-            rows = resp.data or []
-            for r in rows:
-                v = r.get("area_m2")
-                if v is not None:
-                    try:
-                        fv = float(v)
-                        if fv > 0:
-                            values.append(fv)
-                    except Exception:
-                        continue
-            # Si vino menos que el page_size, no hay más
-            if len(rows) < (end - start + 1):
-                break
-            offset += page_size
-        # recorta a 'limit' por si acaso
-        return values[:limit]
-    
+        for r in rows:
+            v = r.get("area_m2")
+            if v is not None:
+                try:
+                    fv = float(v)
+                    if fv > 0:
+                        values.append(fv)
+                except Exception:
+                    continue
+        return values
+
     async def histogram(self, bin: int = 5, clip: bool = True, limit: int = 5000) -> Dict[str, Any]:
         """
         Histograma calculado en Python.
@@ -213,8 +220,7 @@ class CotizacionDashboard:
         """
         if bin <= 0: bin = 5
 
-        # Supabase client es sync → correr en thread
-        values = await asyncio.to_thread(self._load_areas_sync, limit, 1000)
+        values = await self._load_areas(limit, 1000)
         if not values:
             return {"bins": [], "mean": 0.0, "median": 0.0, "count": 0}
 
@@ -0,0 +1,64 @@
+# services/cotizacion_frame.py
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+import pandas as pd
+
+# Tipos compactos por columna de cotizaciones:
+#   - estilo/distrito: pocas etiquetas repetidas -> category (códigos int8/int16 + tabla de etiquetas)
+#   - area_m2: float32 sobra para m² (7 dígitos significativos)
+#   - precio_final: float64, porque las sumas de montos con céntimos no caben en float32
+#   - fecha_hora/created_at: int64 con epoch en ns (UTC); NaT queda como el mínimo de int64,
+#     que pd.to_datetime(col, utc=True) vuelve a leer como NaT
+CATEGORY_COLUMNS = ("estilo", "distrito")
+FLOAT32_COLUMNS = ("area_m2",)
+FLOAT64_COLUMNS = ("precio_final",)
+EPOCH_COLUMNS = ("fecha_hora", "created_at")
+ALL_COLUMNS = ("id",) + EPOCH_COLUMNS + FLOAT64_COLUMNS + FLOAT32_COLUMNS + CATEGORY_COLUMNS
+
+# Columnas que necesita cada cálculo (además de id, que siempre se pide para paginar)
+SUMMARY_COLUMNS = ("precio_final", "area_m2")
+TOP_ESTILO_COLUMNS = ("estilo", "precio_final")
+TOP_DISTRITO_COLUMNS = ("distrito", "precio_final")
+# Lo que guarda el frame compartido en caché: la unión de las columnas de esos cálculos
+CACHED_COLUMNS = tuple(dict.fromkeys(SUMMARY_COLUMNS + TOP_ESTILO_COLUMNS + TOP_DISTRITO_COLUMNS))
+
+
+def projection(columns: Iterable[str]) -> Tuple[str, ...]:
+    """id + las columnas pedidas, sin repetir y en el orden de ALL_COLUMNS."""
+    wanted = set(columns) | {"id"}
+    unknown = wanted - set(ALL_COLUMNS)
+    if unknown:
+        raise ValueError(f"Columnas de cotizaciones desconocidas: {sorted(unknown)}")
+    return tuple(c for c in ALL_COLUMNS if c in wanted)
+
+
+def build_frame(rows: List[Dict[str, Any]], columns: Iterable[str] = ALL_COLUMNS) -> pd.DataFrame:
+    """DataFrame columnar con tipos compactos para las columnas proyectadas."""
+    cols = projection(columns)
+    raw = pd.DataFrame(rows).reindex(columns=list(cols))
+    out: Dict[str, Any] = {}
+    for c in cols:
+        s = raw[c]
+        if c == "id":
+            out[c] = pd.to_numeric(s, errors="coerce").fillna(-1).astype("int64")
+        elif c in EPOCH_COLUMNS:
+            out[c] = pd.to_datetime(s, errors="coerce", utc=True, format="ISO8601").to_numpy("datetime64[ns]").view("int64")
+        elif c in FLOAT64_COLUMNS:
+            out[c] = pd.to_numeric(s, errors="coerce").astype("float64")
+        elif c in FLOAT32_COLUMNS:
+            out[c] = pd.to_numeric(s, errors="coerce").astype("float32")
+        else:
+            out[c] = s.astype("category")
+    return pd.DataFrame(out, index=pd.RangeIndex(len(raw)))
+
+
+def labels(s: pd.Series, missing: str = "—") -> pd.Series:
+    """Categórica con los nulos como `missing` (sin pasar a object)."""
+    if missing not in s.cat.categories:
+        s = s.cat.add_categories([missing])
+    return s.fillna(missing)
+
+
+def epoch_to_datetime(s: pd.Series) -> pd.Series:
+    """Columna epoch (ns) -> datetime64 UTC, con NaT donde faltaba la fecha."""
+    return pd.Series(pd.to_datetime(s.to_numpy(dtype=np.int64), utc=True), index=s.index, name=s.name)
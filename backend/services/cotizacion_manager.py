@@ -4,15 +4,21 @@ import pandas as pd
 import pytz
 import asyncio
 from datetime import datetime
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_KEY
+from config import SCAN_CONCURRENCY
+from services.range_scanner import scan_ranges
+from services.supabase_registry import get_supabase_client, get_async_postgrest
 
 class CotizacionesManager:
     def __init__(self):
-        self.client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.client = get_supabase_client()
 
         # Metodos adicionales para la tabla Cotizaciones serán añadidos aquí.
 
+    @property
+    def aclient(self):
+        """PostgREST async del event loop en curso."""
+        return get_async_postgrest()
+
     async def get_cotizaciones_page(
         self,
         page: int = 1,
@@ -26,18 +32,15 @@ class CotizacionesManager:
         to_idx = from_idx + size - 1
 
         # Conteo
-        base = self.client.table(table).select("id", count="exact", head=True)
+        base = self.aclient.table(table).select("id", count="exact", head=True)
         if q and q.strip():
             like = f"%{q.strip()}%"
-            base = self.client.table(table).select("id", count="exact", head=True).or_(
+            base = self.aclient.table(table).select("id", count="exact", head=True).or_(
                 f"nombre.ilike.{like},telefono.ilike.{like},correo.ilike.{like},"
                 f"proyecto.ilike.{like},estilo.ilike.{like},distrito.ilike.{like}"
             )
-        count_res = base.execute()
-        total = count_res.count or 0
-
         # Datos
-        sel = self.client.table(table).select(
+        sel = self.aclient.table(table).select(
             "id,created_at,fecha_hora,nombre,telefono,correo,proyecto,estilo,espacios,"
             "area_m2,habitaciones,tiempo,distrito,diseno,mobiliario,acabados,precio_final"
         )
@@ -56,29 +59,29 @@ class CotizacionesManager:
             sort_key = "fecha_hora"
 
         sel = sel.order(sort_key, desc=(sort_dir != "asc")).range(from_idx, to_idx)
-        data = sel.execute().data or []
-        return total, data
+        # Conteo y datos en paralelo (antes se ejecutaban en serie y bloqueando el event loop)
+        count_res, data_res = await asyncio.gather(base.execute(), sel.execute())
+        return count_res.count or 0, data_res.data or []
 
     async def get_all_cotizaciones(self, chunk_size: int = 1000) -> List[Dict[str, Any]]:
         """
-        Trae TODOS los registros de cotizaciones por páginas, sin vistas ni RPC.
+        Trae TODOS los registros de cotizaciones: un conteo exacto y luego rangos en paralelo.
         OJO: si la tabla crece mucho, considera mover agregaciones al SQL.
         """
-        page = 1
-        all_rows: list[dict] = []
-        while True:
-            total, data = await self.get_cotizaciones_page(page=page, size=chunk_size)
-            if not data:
-                break
+        count_res = await self.aclient.table("cotizaciones").select("id", count="exact", head=True).execute()
 
-            all_rows.extend(data)
+        async def fetch(start: int, end: int):
+            return (await (self.aclient.table("cotizaciones")
+                           .select(
+                               "id,created_at,fecha_hora,nombre,telefono,correo,proyecto,estilo,espacios,"
+                               "area_m2,habitaciones,tiempo,distrito,diseno,mobiliario,acabados,precio_final"
+                           )
+                           .order("fecha_hora", desc=True)
+                           .order("id")
+                           .range(start, end)
+                           .execute())).data or []
 
-            # Detén cuando alcanzamos el total real informado por Supabase
-            if len(all_rows) >= (total or 0):
-                break
-
-            page += 1
-        return all_rows
+        return await scan_ranges(fetch, count_res.count or 0, page_size=chunk_size, concurrency=SCAN_CONCURRENCY)
 
 
     async def list_paginated(
@@ -98,13 +101,11 @@ class CotizacionesManager:
     # ---------- TESTS (últimos registros) ----------
     async def last5_raw(self) -> List[Dict[str, Any]]:
         """Obtiene los últimos 5 registros sin formatear"""
-        resp = await asyncio.to_thread(
-            lambda: (self.client.table("cotizaciones")
-                     .select("created_at,fecha_hora,nombre,telefono")
-                     .order("fecha_hora", desc=True)
-                     .limit(5)
-                     .execute())
-        )
+        resp = await (self.aclient.table("cotizaciones")
+                      .select("created_at,fecha_hora,nombre,telefono")
+                      .order("fecha_hora", desc=True)
+                      .limit(5)
+                      .execute())
         return resp.data or []
 
     async def last5_formatted(self, tz: str = "America/Lima") -> List[Dict[str, Any]]:
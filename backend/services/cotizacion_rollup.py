@@ -0,0 +1,112 @@
+# services/cotizacion_rollup.py
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import pandas as pd
+import pytz
+from config import COTIZ_ROLLUP_REFRESH, COTIZ_ROLLUP_CURRENT_TTL
+
+# fetch(start_utc, end_utc | None, after_id | None) -> filas con id, fecha_hora y precio_final
+FetchRows = Callable[[str, Optional[str], Optional[int]], Awaitable[List[Dict[str, Any]]]]
+
+
+def month_window(months_back: int, tz: str, now: Optional[datetime] = None) -> List[pd.Period]:
+    """Los `months_back` meses (en hora local) que terminan en el mes actual, del más antiguo al actual."""
+    now_local = (now or datetime.now(pytz.UTC)).astimezone(pytz.timezone(tz))
+    current = pd.Period(year=now_local.year, month=now_local.month, freq="M")
+    return [current - i for i in range(months_back - 1, -1, -1)]
+
+
+def month_start_utc(period: pd.Period, tz: str) -> str:
+    start_local = pytz.timezone(tz).localize(datetime(period.year, period.month, 1))
+    return start_local.astimezone(pytz.UTC).isoformat()
+
+
+def aggregate_by_month(rows: List[Dict[str, Any]], tz: str) -> Dict[str, Tuple[int, float]]:
+    """{'YYYY-MM': (conteo, suma de precio_final)} agrupando fecha_hora en hora local."""
+    if not rows:
+        return {}
+    df = pd.DataFrame(rows)
+    month = (
+        pd.to_datetime(df["fecha_hora"], errors="coerce", utc=True, format="ISO8601")
+          .dt.tz_convert(tz)
+          .dt.strftime("%Y-%m")
+    )
+    precio = pd.to_numeric(df.get("precio_final"), errors="coerce")
+    g = pd.DataFrame({"x": month, "precio": precio}).groupby("x").agg(
+        total=("precio", "size"), suma=("precio", "sum")
+    )
+    return {x: (int(r.total), float(r.suma)) for x, r in g.iterrows()}
+
+
+class MonthlyRollup:
+    """
+    Rollup mensual de cotizaciones (conteo y suma de precio_final) por (tz, 'YYYY-MM').
+      - meses cerrados: se calculan una vez con un solo recorrido y quedan inmutables
+        (una cotización cargada después con fecha de un mes cerrado no se refleja)
+      - mes en curso: se suman solo las filas con id > último id visto, como mucho cada
+        `refresh_interval` segundos, y se recalcula entero cada `current_ttl` segundos
+    Con todo en caché, cualquier ventana de `months_back` se responde desde memoria.
+    """
+    def __init__(self, refresh_interval: float = 30, current_ttl: float = 300):
+        self.refresh_interval = refresh_interval
+        self.current_ttl = current_ttl
+        self._closed: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._current: Dict[str, Dict[str, Any]] = {}
+
+    def invalidate(self) -> None:
+        self._closed.clear()
+        self._current.clear()
+
+    async def series(self, fetch: FetchRows, months_back: int = 12, tz: str = "America/Lima") -> List[Dict[str, Any]]:
+        months = month_window(months_back, tz)
+        current = months[-1]
+        missing = [p for p in months[:-1] if (tz, str(p)) not in self._closed]
+        if missing:
+            await self._load_closed(fetch, missing[0], missing[-1] + 1, tz)
+        state = await self._refresh_current(fetch, current, tz)
+
+        serie = []
+        for p in months[:-1]:
+            total, suma = self._closed[(tz, str(p))]
+            serie.append({"x": str(p), "total": total, "suma_precio": suma})
+        serie.append({"x": str(current), "total": state["total"], "suma_precio": state["suma"]})
+        return serie
+
+    async def _load_closed(self, fetch: FetchRows, first: pd.Period, stop: pd.Period, tz: str) -> None:
+        """Un solo recorrido para los meses [first, stop)."""
+        rows = await fetch(month_start_utc(first, tz), month_start_utc(stop, tz), None)
+        by_month = aggregate_by_month(rows, tz)
+        p = first
+        while p < stop:
+            self._closed[(tz, str(p))] = by_month.get(str(p), (0, 0.0))
+            p += 1
+
+    async def _refresh_current(self, fetch: FetchRows, current: pd.Period, tz: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        state = self._current.get(tz)
+        start_utc, end_utc = month_start_utc(current, tz), month_start_utc(current + 1, tz)
+
+        if state is None or state["month"] != str(current) or now - state["loaded_at"] >= self.current_ttl:
+            rows = await fetch(start_utc, end_utc, None)
+            total, suma = aggregate_by_month(rows, tz).get(str(current), (0, 0.0))
+            state = {
+                "month": str(current), "total": total, "suma": suma,
+                "last_id": max((r["id"] for r in rows if r.get("id") is not None), default=0),
+                "loaded_at": now, "checked_at": now,
+            }
+            self._current[tz] = state
+        elif now - state["checked_at"] >= self.refresh_interval:
+            rows = await fetch(start_utc, end_utc, state["last_id"])
+            # Se vuelve a filtrar tras el await: dos refrescos simultáneos no suman dos veces
+            new_rows = [r for r in rows if r.get("id") is not None and r["id"] > state["last_id"]]
+            if new_rows:
+                total, suma = aggregate_by_month(new_rows, tz).get(str(current), (0, 0.0))
+                state["total"] += total
+                state["suma"] += suma
+                state["last_id"] = max(r["id"] for r in new_rows)
+            state["checked_at"] = now
+        return state
+
+
+MONTHLY_ROLLUP = MonthlyRollup(refresh_interval=COTIZ_ROLLUP_REFRESH, current_ttl=COTIZ_ROLLUP_CURRENT_TTL)
@@ -1,27 +1,89 @@
 # services/dashboard_manager.py
 
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from config import DASHBOARD_STREAMING, DASHBOARD_STREAM_PAGE_SIZE, DASHBOARD_STREAM_CONCURRENCY
 from services.database_module import DataProcessor
 from services.database_manager import SupabaseManager
+from services.dashboard_stream import STREAMING_SECTIONS, stream_dashboard_sections
+
+# Secciones de /dashboard/bundle (mismo nombre que su endpoint individual) -> cálculo sobre el DataFrame
+BUNDLE_SECTIONS = {
+    "metrics": "_metrics_summary",
+    "distribution": "_distribution_data",
+    "followup": "_followup_analysis",
+    "appointment-hours": "_appointment_hours",
+    "project-duration": "_project_duration_distribution",
+    "new-this-month": "_new_clients_this_month",
+    "response-times": "_response_times",
+    "qualification-distribution": "_clients_by_qualification",
+}
 
 class DashboardManager:
-    def __init__(self, supabase_manager: SupabaseManager):
+    """
+    Métricas del dashboard de clientes. Por defecto se calculan sobre el snapshot compartido;
+    con streaming=True (DASHBOARD_STREAMING=1) las secciones agregables se calculan página a
+    página con memoria acotada.
+    """
+    def __init__(self, supabase_manager: SupabaseManager, streaming: bool = DASHBOARD_STREAMING):
         self.manager = supabase_manager
-    
+        self.streaming = streaming
+
     async def _get_dataframe(self) -> pd.DataFrame:
-        data = await self.manager.get_clients_page(page=1, size=1000)
-        df = pd.DataFrame(DataProcessor.transform_data(data))
-        df = DataProcessor.parse_dates(df)
-        df = DataProcessor.add_derived_columns(df)
-        return df
+        # transform_data ya aplica parse de fechas y columnas derivadas; el snapshot es compartido (solo lectura)
+        return await self.manager.get_clients_dataframe()
+
+    async def get_bundle(self, sections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Un solo DataFrame (o una sola pasada en streaming) para todas las secciones pedidas."""
+        names = list(sections or BUNDLE_SECTIONS)
+        if self.streaming and all(name in STREAMING_SECTIONS for name in names):
+            return await stream_dashboard_sections(
+                self.manager, names,
+                page_size=DASHBOARD_STREAM_PAGE_SIZE,
+                concurrency=DASHBOARD_STREAM_CONCURRENCY,
+            )
+        df = await self._get_dataframe()
+        return {name: getattr(self, BUNDLE_SECTIONS[name])(df) for name in names}
+
+    async def _section(self, name: str) -> Any:
+        return (await self.get_bundle([name]))[name]
 
     async def get_metrics_summary(self) -> Dict[str, int]:
-        data = await self.manager.get_clients_page(page=1, size=1000)
-        df = pd.DataFrame(DataProcessor.transform_data(data))
-        df = DataProcessor.parse_dates(df)
-        df = DataProcessor.add_derived_columns(df)
+        return await self._section("metrics")
+
+    async def get_distribution_data(self) -> Dict[str, Any]:
+        return await self._section("distribution")
+
+    async def get_filtered_metrics(self, filters: Dict[str, Any]) -> Dict[str, int]:
+        df = await self._get_dataframe()
+        filtered_df = DataProcessor.filter_data(df, filters)
+        return DataProcessor.get_client_counts(filtered_df)
+
+    async def get_followup_analysis(self) -> Dict[str, int]:
+        return await self._section("followup")
+
+    async def get_clients_by_qualification(self) -> Dict[str, Any]:
+        return await self._section("qualification-distribution")
+
+    async def get_appointment_hours(self) -> Dict[int, int]:
+        return await self._section("appointment-hours")
+
+    async def get_project_duration_distribution(self) -> Dict[str, int]:
+        return await self._section("project-duration")
+
+    async def get_custom_cross(self, col1: str, col2: str) -> Dict[str, Dict[str, int]]:
+        df = await self._get_dataframe()
+        return DataProcessor.get_cross_distribution(df, col1=col1, col2=col2)
+
+    async def get_new_clients_this_month(self) -> int:
+        return await self._section("new-this-month")
+
+    async def get_response_times(self) -> Dict[str, float]:
+        return await self._section("response-times")
 
+    # ---------- Cálculos sobre un DataFrame ya derivado ----------
+    @staticmethod
+    def _metrics_summary(df: pd.DataFrame) -> Dict[str, int]:
         return {
         "total_clientes": int(len(df)),
         "con_cita": int(df["tiene_cita"].sum()),
@@ -31,13 +93,8 @@ class DashboardManager:
         "seguimiento": int((df["seguimiento"] == "Seguimiento").sum()),
         }
 
-
-    async def get_distribution_data(self) -> Dict[str, Any]:
-        data = await self.manager.get_clients_page(page=1, size=1000)
-        df = pd.DataFrame(DataProcessor.transform_data(data))
-        df = DataProcessor.parse_dates(df)
-        df = DataProcessor.add_derived_columns(df)
-
+    @staticmethod
+    def _distribution_data(df: pd.DataFrame) -> Dict[str, Any]:
         return {
             "por_origen": DataProcessor.get_distribution(df, column="origen"),
             "por_mes": DataProcessor.get_distribution(df, column="mes"),
@@ -46,63 +103,49 @@ class DashboardManager:
             "categoria_vs_estilo": DataProcessor.cross_distribution(df, row="categoria", col="estilo")
         }
 
-    async def get_filtered_metrics(self, filters: Dict[str, Any]) -> Dict[str, int]:
-        data = await self.manager.get_clients_page(page=1, size=1000)
-        df = pd.DataFrame(DataProcessor.transform_data(data))
-        df = DataProcessor.parse_dates(df)
-        df = DataProcessor.add_derived_columns(df)
-
-        filtered_df = DataProcessor.filter_data(df, filters)
-        return DataProcessor.get_client_counts(filtered_df)
-
-    async def get_followup_analysis(self) -> Dict[str, int]:
-        df = await self._get_dataframe()
+    @staticmethod
+    def _followup_analysis(df: pd.DataFrame) -> Dict[str, int]:
         return DataProcessor.get_followup_success(df)
-    
-    async def get_clients_by_qualification(self) -> Dict[str, Any]:
-        df = await self._get_dataframe()
+
+    @staticmethod
+    def _clients_by_qualification(df: pd.DataFrame) -> Dict[str, Any]:
         return DataProcessor.get_clients_by_qualification(df)
 
-    async def get_appointment_hours(self) -> Dict[int, int]:
-        df = await self._get_dataframe()
+    @staticmethod
+    def _appointment_hours(df: pd.DataFrame) -> List[Dict[str, int]]:
         return DataProcessor.get_appointment_hours_distribution(df)
 
-    async def get_project_duration_distribution(self) -> Dict[str, int]:
-        df = await self._get_dataframe()
+    @staticmethod
+    def _project_duration_distribution(df: pd.DataFrame) -> Dict[str, int]:
         return DataProcessor.get_project_duration_distribution(df)
 
-    async def get_custom_cross(self, col1: str, col2: str) -> Dict[str, Dict[str, int]]:
-        df = await self._get_dataframe()
-        return DataProcessor.get_cross_distribution(df, col1=col1, col2=col2)
-
-    async def get_new_clients_this_month(self) -> int:
-        df = await self._get_dataframe()
+    @staticmethod
+    def _new_clients_this_month(df: pd.DataFrame) -> int:
         if df.empty or 'primera_interaccion' not in df.columns:
             return 0
 
         # Cómputo de mes en zona horaria Lima (sin cambiar tu pipeline global)
         # Si tus timestamps son UTC-naive, ajustamos -5h para "simular" Lima.
         # Si ya guardas en hora local, esto no dañará (solo desplaza si corresponde).
-        df = df.copy()
-        df['primera_interaccion_local'] = df['primera_interaccion'] - pd.Timedelta(hours=5)
+        primera_local = df['primera_interaccion'] - pd.Timedelta(hours=5)
 
         now_lima = pd.Timestamp.now(tz='America/Lima')
         mes = now_lima.month
         anio = now_lima.year
 
         mask = (
-            df['primera_interaccion_local'].dt.month.eq(mes) &
-            df['primera_interaccion_local'].dt.year.eq(anio)
+            primera_local.dt.month.eq(mes) &
+            primera_local.dt.year.eq(anio)
         )
         return int(mask.sum())
 
-    async def get_response_times(self) -> Dict[str, float]:
-        df = await self._get_dataframe()
+    @staticmethod
+    def _response_times(df: pd.DataFrame) -> Dict[str, float]:
         if "primera_interaccion" in df and "ultima_interaccion" in df:
-            df["tiempo_respuesta_dias"] = (
+            tiempo_respuesta_dias = (
                 df["ultima_interaccion"] - df["primera_interaccion"]
             ).dt.total_seconds() / (60 * 60 * 24)
-            avg = round(df["tiempo_respuesta_dias"].mean(), 2)
-            mediana = round(df["tiempo_respuesta_dias"].median(), 2)
+            avg = round(tiempo_respuesta_dias.mean(), 2)
+            mediana = round(tiempo_respuesta_dias.median(), 2)
             return {"promedio_dias": avg, "mediana_dias": mediana}
-        return {}
\ No newline at end of file
+        return {}
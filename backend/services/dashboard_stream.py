@@ -0,0 +1,214 @@
+# services/dashboard_stream.py
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List
+import pandas as pd
+from services.database_module import DataProcessor
+from services.database_manager import SupabaseManager
+from services.range_scanner import iter_ranges
+
+
+# ---------- Acumuladores parciales (se alimentan página a página) ----------
+class SumAccumulator:
+    """Suma de una máscara booleana por página (conteos)."""
+    def __init__(self, mask):
+        self.mask = mask
+        self.total = 0
+
+    def update(self, df: pd.DataFrame) -> None:
+        self.total += int(self.mask(df).sum())
+
+
+class DistributionAccumulator:
+    """value_counts() de una columna sumado entre páginas."""
+    def __init__(self, column: str, transform=None):
+        self.column = column
+        self.transform = transform
+        self.counts: Counter = Counter()
+
+    def update(self, df: pd.DataFrame) -> None:
+        if self.column not in df.columns:
+            return
+        values = df[self.column] if self.transform is None else self.transform(df[self.column])
+        self.counts.update(values.value_counts().to_dict())
+
+    def result(self, sort_keys: bool = False) -> Dict[Any, int]:
+        items = sorted(self.counts.items()) if sort_keys else self.counts.most_common()
+        return {k: int(v) for k, v in items}
+
+
+class CrosstabAccumulator:
+    """pd.crosstab(row, col) acumulado; el resultado incluye ceros como el crosstab completo."""
+    def __init__(self, row: str, col: str):
+        self.row = row
+        self.col = col
+        self.pairs: Counter = Counter()
+        self.row_keys: set = set()
+        self.col_keys: set = set()
+
+    def update(self, df: pd.DataFrame) -> None:
+        if self.row not in df.columns or self.col not in df.columns:
+            return
+        both = df[[self.row, self.col]].dropna()
+        counts = both.groupby([self.row, self.col]).size()
+        for (r, c), n in counts.items():
+            self.pairs[(str(r), str(c))] += int(n)
+            self.row_keys.add(str(r))
+            self.col_keys.add(str(c))
+
+    def result(self) -> Dict[str, Dict[str, int]]:
+        return {
+            r: {c: self.pairs.get((r, c), 0) for c in sorted(self.col_keys)}
+            for r in sorted(self.row_keys)
+        }
+
+
+class MeanMedianAccumulator:
+    """
+    Media exacta (suma/conteo) y mediana sobre un histograma con `resolution` de ancho:
+    la memoria depende del rango de valores, no del número de filas.
+    """
+    def __init__(self, resolution: float = 0.01):
+        self.resolution = resolution
+        self.total = 0.0
+        self.count = 0
+        self.buckets: Counter = Counter()
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if values.empty:
+            return
+        self.total += float(values.sum())
+        self.count += int(len(values))
+        self.buckets.update((values / self.resolution).round().astype("int64").value_counts().to_dict())
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else float("nan")
+
+    def median(self) -> float:
+        if not self.count:
+            return float("nan")
+        ordered = sorted(self.buckets.items())
+        lower_rank, upper_rank = (self.count - 1) // 2, self.count // 2
+        lower = upper = None
+        seen = 0
+        for bucket, n in ordered:
+            if lower is None and seen + n > lower_rank:
+                lower = bucket
+            if seen + n > upper_rank:
+                upper = bucket
+                break
+            seen += n
+        return (lower + upper) / 2 * self.resolution
+
+
+# ---------- Lector paginado ----------
+async def iter_client_frames(
+    manager: SupabaseManager,
+    page_size: int = 1000,
+    concurrency: int = 4,
+    table: str = "clients_pravi",
+) -> AsyncIterator[pd.DataFrame]:
+    """
+    Recorre toda la tabla en rangos de `page_size` con como máximo `concurrency` peticiones
+    en vuelo y entrega cada página ya transformada en cuanto llega (sin orden garantizado).
+    """
+    total = await manager.get_total_count(table)
+    pages = iter_ranges(
+        lambda start, end: manager.get_clients_range(start, end, table),
+        total,
+        page_size=page_size,
+        concurrency=concurrency,
+    )
+    async for _, rows in pages:
+        if rows:
+            yield DataProcessor.transform_data(rows)
+
+
+# ---------- Secciones del dashboard en modo streaming ----------
+class _SectionAccumulators:
+    def __init__(self, sections: List[str]):
+        self.sections = sections
+        now_lima = pd.Timestamp.now(tz="America/Lima")
+        self.mes, self.anio = now_lima.month, now_lima.year
+        self.total = SumAccumulator(lambda df: pd.Series(True, index=df.index))
+        self.con_cita = SumAccumulator(lambda df: df["tiene_cita"])
+        self.con_estilo = SumAccumulator(lambda df: df["estilo"].notna())
+        self.calificados = SumAccumulator(lambda df: df["calificacion"].notna())
+        self.seguimiento = SumAccumulator(lambda df: df["seguimiento"] == "Seguimiento")
+        self.no_followup = SumAccumulator(lambda df: (df["tiene_cita"] == False) & (df["seguimiento"] == "Seguimiento"))
+        self.por_origen = DistributionAccumulator("origen")
+        self.por_mes = DistributionAccumulator("mes")
+        self.calificacion = DistributionAccumulator("calificacion")
+        # claves float como en el DataFrame completo (la columna lleva NaN cuando falta la fecha)
+        self.hora_contacto = DistributionAccumulator("hora_contacto", lambda s: ((s - 5) % 24).dropna().astype(float))
+        self.categoria_vs_estilo = CrosstabAccumulator("categoria", "estilo")
+        self.hora_cita = DistributionAccumulator("hora_cita", lambda s: ((s - 5) % 24).dropna().astype(int))
+        self.tiempo_meses = DistributionAccumulator("tiempo_meses", lambda s: s.dropna().astype(float))
+        self.nuevos_mes = SumAccumulator(self._new_this_month_mask)
+        self.respuesta = MeanMedianAccumulator(resolution=0.01)
+
+    def _new_this_month_mask(self, df: pd.DataFrame) -> pd.Series:
+        if "primera_interaccion" not in df.columns:
+            return pd.Series(False, index=df.index)
+        local = df["primera_interaccion"] - pd.Timedelta(hours=5)
+        return local.dt.month.eq(self.mes) & local.dt.year.eq(self.anio)
+
+    def update(self, df: pd.DataFrame) -> None:
+        for acc in (self.total, self.con_cita, self.con_estilo, self.calificados, self.seguimiento,
+                    self.no_followup, self.nuevos_mes, self.por_origen, self.por_mes, self.calificacion,
+                    self.hora_contacto, self.categoria_vs_estilo, self.tiempo_meses):
+            acc.update(df)
+        self.hora_cita.update(df[df["tiene_cita"] == True])
+        self.respuesta.update(
+            (df["ultima_interaccion"] - df["primera_interaccion"]).dt.total_seconds() / (60 * 60 * 24)
+        )
+
+    def result(self) -> Dict[str, Any]:
+        con_cita = self.con_cita.total
+        builders = {
+            "metrics": lambda: {
+                "total_clientes": self.total.total,
+                "con_cita": con_cita,
+                "sin_cita": self.total.total - con_cita,
+                "con_estilo": self.con_estilo.total,
+                "calificados": self.calificados.total,
+                "seguimiento": self.seguimiento.total,
+            },
+            "distribution": lambda: {
+                "por_origen": self.por_origen.result(),
+                "por_mes": self.por_mes.result(),
+                "calificacion": self.calificacion.result(),
+                "hora_contacto": self.hora_contacto.result(sort_keys=True),
+                "categoria_vs_estilo": self.categoria_vs_estilo.result(),
+            },
+            "followup": lambda: {"followup_success": con_cita, "no_followup": self.no_followup.total},
+            "appointment-hours": lambda: (
+                [{"hour": h, "count": self.hora_cita.counts.get(h, 0)} for h in range(24)] if con_cita else []
+            ),
+            "project-duration": lambda: self.tiempo_meses.result(sort_keys=True),
+            "new-this-month": lambda: self.nuevos_mes.total,
+            "response-times": lambda: {
+                "promedio_dias": round(self.respuesta.mean(), 2),
+                "mediana_dias": round(self.respuesta.median(), 2),
+            },
+        }
+        return {name: builders[name]() for name in self.sections}
+
+
+STREAMING_SECTIONS = {
+    "metrics", "distribution", "followup", "appointment-hours",
+    "project-duration", "new-this-month", "response-times",
+}
+
+
+async def stream_dashboard_sections(
+    manager: SupabaseManager,
+    sections: List[str],
+    page_size: int = 1000,
+    concurrency: int = 4,
+) -> Dict[str, Any]:
+    """Calcula `sections` en una pasada por páginas, sin materializar la tabla completa."""
+    accumulators = _SectionAccumulators(sections)
+    async for frame in iter_client_frames(manager, page_size=page_size, concurrency=concurrency):
+        accumulators.update(frame)
+    return accumulators.result()
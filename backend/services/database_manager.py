@@ -1,11 +1,15 @@
 import os
 import json
 import time
-import asyncio
 from typing import List, Dict, Any, Optional, Callable, cast
 from concurrent.futures import ThreadPoolExecutor
-from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY
+import pandas as pd
+from supabase import Client
+from postgrest import AsyncPostgrestClient
+from config import CLIENTS_SNAPSHOT_TTL, CLIENTS_SNAPSHOT_FULL_TTL, SCAN_CONCURRENCY
+from services.clients_snapshot import ClientsSnapshot
+from services.range_scanner import scan_ranges
+from services.supabase_registry import get_supabase_client, get_async_postgrest
 import logging
 
 class SupabaseManager:
@@ -15,19 +19,22 @@ class SupabaseManager:
       - get_clients_page
       - get_client_by_phone
       - transform_data
-    No mantiene estado ni timers.
+    El único estado es el ClientsSnapshot compartido por tabla (ver get_clients_dataframe).
     """
+    _snapshots: Dict[str, ClientsSnapshot] = {}
+
     def __init__(self, url: Optional[str] = None, key: Optional[str] = None):
-        supabase_url = url if url is not None else SUPABASE_URL
-        supabase_key = key if key is not None else SUPABASE_KEY
-        if supabase_url is None or supabase_key is None:
-            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be provided and not None.")
-        self.client: Client = create_client(supabase_url, supabase_key)
+        # Cliente compartido por (url, key): crear managers por petición ya no abre conexiones nuevas
+        self.client: Client = get_supabase_client(url, key)
+        self._url, self._key = url, key
+
+    @property
+    def aclient(self) -> AsyncPostgrestClient:
+        """PostgREST async del event loop en curso (las consultas se esperan sin hilos)."""
+        return get_async_postgrest(self._url, self._key)
 
     async def get_total_count(self, table: str = "clients_pravi") -> int:
-        resp = await asyncio.to_thread(
-            lambda: self.client.table(table).select("id", count="exact").execute()
-        )
+        resp = await self.aclient.table(table).select("id", count="exact", head=True).execute()
         return resp.count or 0
 
     async def get_clients_page(
@@ -35,61 +42,66 @@ class SupabaseManager:
         table: str = "clients_pravi"
     ) -> List[Dict[str, Any]]:
         start, end = (page-1)*size, page*size-1
-        resp = await asyncio.to_thread(
-            lambda: self.client.table(table)
+        resp = await (self.aclient.table(table)
                               .select("*")
                               .order("ultima_interaccion", desc=True)
                               .range(start, end)
-                              .execute()
-        )
+                              .execute())
         return self.transform_data(resp.data or [])
 
+    async def get_clients_range(
+        self, start: int, end: int,
+        table: str = "clients_pravi",
+        order_by: str = "id",
+        desc: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Filas [start, end]; se desempata por id para que los rangos no se solapen."""
+        q = self.aclient.table(table).select("*").order(order_by, desc=desc)
+        if order_by != "id":
+            q = q.order("id")
+        resp = await q.range(start, end).execute()
+        return resp.data or []
+
     async def get_client_by_phone(
         self, phone: str,
         table: str = "clients_pravi",
         phone_col: str = "telefono"
     ) -> Optional[Dict[str, Any]]:
-        resp = await asyncio.to_thread(
-            lambda: self.client.table(table)
+        resp = await (self.aclient.table(table)
                               .select("*")
                               .eq(phone_col, phone)
-                              .execute()
-        )
+                              .execute())
         return (resp.data or [None])[0]
 
     async def get_all_clients(self, table: str = "clients_pravi") -> List[Dict[str, Any]]:
-        page_size = 1000
-        start = 0
-        out: List[Dict[str, Any]] = []
-        while True:
-            end = start + page_size -1
-            resp = await asyncio.to_thread(
-                lambda: self.client.table(table)
-                    .select("*")
-                    .order("ultima_interaccion", desc=True)
-                    .range(start, end)
-                    .execute()
-            )
-            chunk = resp.data or []
-            out.extend(chunk)
-            if len(chunk) < page_size:
-                break
-            start += page_size
-        return out
+        """Toda la tabla (ultima_interaccion desc): conteo exacto y luego rangos en paralelo."""
+        total = await self.get_total_count(table)
+        return await scan_ranges(
+            lambda start, end: self.get_clients_range(start, end, table, order_by="ultima_interaccion", desc=True),
+            total,
+            page_size=1000,
+            concurrency=SCAN_CONCURRENCY,
+        )
 
     async def get_all_clients_allpages(self, table: str = "clients_pravi") -> List[Dict[str, Any]]:
+        return await self.get_all_clients(table)
+
+    async def get_clients_since(self, since: str, table: str = "clients_pravi") -> List[Dict[str, Any]]:
+        """
+        Filas con ultima_interaccion >= since (gte: una actualización con la misma marca
+        de tiempo no se pierde; el snapshot deduplica por id).
+        """
         page_size = 1000
         start = 0
         out: List[Dict[str, Any]] = []
         while True:
             end = start + page_size - 1
-            resp = await asyncio.to_thread(
-                lambda: self.client.table(table)
+            resp = await (self.aclient.table(table)
                     .select("*")
+                    .gte("ultima_interaccion", since)
                     .order("ultima_interaccion", desc=True)
                     .range(start, end)
-                    .execute()
-            )
+                    .execute())
             chunk = resp.data or []
             out.extend(chunk)
             if len(chunk) < page_size:
@@ -97,14 +109,66 @@ class SupabaseManager:
             start += page_size
         return out
 
+    def clients_snapshot(self, table: str = "clients_pravi") -> ClientsSnapshot:
+        """Snapshot compartido por todas las instancias del proceso para `table`."""
+        snapshot = SupabaseManager._snapshots.get(table)
+        if snapshot is None:
+            snapshot = ClientsSnapshot(
+                fetch_all=lambda: self.get_all_clients(table),
+                fetch_since=lambda since: self.get_clients_since(since, table),
+                ttl=CLIENTS_SNAPSHOT_TTL,
+                full_ttl=CLIENTS_SNAPSHOT_FULL_TTL,
+            )
+            SupabaseManager._snapshots[table] = snapshot
+        return snapshot
+
+    async def get_clients_dataframe(self, table: str = "clients_pravi") -> pd.DataFrame:
+        """
+        DataFrame transformado (DataProcessor.transform_data) de toda la tabla, servido
+        desde el snapshot. Es de solo lectura: copiar antes de modificar.
+        """
+        return await self.clients_snapshot(table).get()
+
+    async def get_clients_by_ids(self, ids: List[Any], table: str = "clients_pravi") -> List[Dict[str, Any]]:
+        """Filas con id en `ids`, devueltas en el mismo orden que `ids`."""
+        if not ids:
+            return []
+        resp = await (self.aclient.table(table)
+                              .select("*")
+                              .in_("id", ids)
+                              .execute())
+        by_id = {row.get("id"): row for row in resp.data or []}
+        return [by_id[i] for i in ids if i in by_id]
+
+    async def get_clients_by_derived_labels(
+        self,
+        page: int = 1,
+        size: int = 20,
+        seguimiento: Optional[str] = None,
+        calificacion: Optional[str] = None,
+        calificacion_nivel: Optional[int] = None,
+        table: str = "clients_pravi",
+    ) -> Dict[str, Any]:
+        """
+        Paginación por etiquetas derivadas: el índice del snapshot resuelve los ids de la
+        página y solo esas filas se piden a la BD.
+        """
+        index = await self.clients_snapshot(table).get_index()
+        ids, total = index.page(
+            (page - 1) * size, size,
+            seguimiento=seguimiento, calificacion=calificacion, calificacion_nivel=calificacion_nivel,
+        )
+        return {
+            "data": await self.get_clients_by_ids(ids, table),
+            "total": total,
+        }
+
     #MODIFICAR PARA QUE USE FILTROS DE PRAVI
     async def get_clients_by_estile(self, estilo: str, table: str = "clients_pravi") -> List[Dict[str, Any]]:
-        resp = await asyncio.to_thread(
-            lambda: self.client.table(table)
+        resp = await (self.aclient.table(table)
                               .select("*")
                               .eq("estilo", estilo)
-                              .execute()
-        )
+                              .execute())
         return resp.data or []
 
     # Nueva función para paginación con filtros
@@ -121,7 +185,7 @@ class SupabaseManager:
         filtros = filtros or {}
         
         # Construir consulta base con count
-        query = self.client.table(table).select("*", count="exact")
+        query = self.aclient.table(table).select("*", count="exact")
         
         # Aplicar filtros en la consulta
         query = self._apply_filters_to_query(query, filtros)
@@ -131,7 +195,7 @@ class SupabaseManager:
         query = query.order("ultima_interaccion", desc=True).range(start, end)
         
         # Ejecutar consulta
-        resp = await asyncio.to_thread(lambda: query.execute())
+        resp = await query.execute()
         
         return {
             "data": self.transform_data(resp.data or []),
@@ -150,13 +214,13 @@ class SupabaseManager:
         filtros = filtros or {}
         
         # Construir consulta solo para contar (más eficiente)
-        query = self.client.table(table).select("id", count="exact")
+        query = self.aclient.table(table).select("id", count="exact")
         
         # Aplicar filtros
         query = self._apply_filters_to_query(query, filtros)
         
         # Ejecutar consulta
-        resp = await asyncio.to_thread(lambda: query.execute())
+        resp = await query.execute()
         
         return resp.count or 0
     
@@ -1,8 +1,71 @@
+import re
 import pandas as pd
 import numpy as np
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
+MESES_ES = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+]
+
+# Columnas de clients_pravi que conserva transform_data y su valor si la clave no viene
+CLIENT_COLUMN_DEFAULTS: Dict[str, Any] = {
+    "id": None,
+    "primera_interaccion": '',
+    "ultima_interaccion": '',
+    "telefono": '',
+    "nombre": '',
+    "categoria": '',
+    "estilo": '',
+    "presupuesto": None,
+    "toma_decision": '',
+    "tiempo": '',
+    "tiempo_meses": None,
+    "planos": '',
+    "cita": '',
+    "calificacion": '',
+    "resumen": '',
+    "correo": '',
+    "seguimiento": 'NO',
+    "ultimo_seguimiento": None,
+    "tipo_cliente": '',
+}
+
+NO_CLIENTE_KEYWORDS = ['proveedor', 'consulta de trabajo', 'mensaje raro']  # puedes ampliar
+
+QUALIFICATION_LABELS = [
+    "5: Cliente Calificado",
+    "4: Cliente Pre-Calificado",
+    "3: Cliente Potencial",
+    "2: Cliente Interesado",
+    "1: Cliente Frío",
+]
+NO_QUALIFICATION_LABEL = "0: Sin avance"
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    # Columna ausente = todo nulo (equivale a row.get(name) -> None)
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _has_value(s: pd.Series) -> pd.Series:
+    # pd.notna(v) and v != ""
+    return s.notna() & (s != "")
+
+
+def _truthy(s: pd.Series) -> pd.Series:
+    # bool(v) con los nulos como falsy: NaN (clave ausente en la fila) sería True con astype(bool)
+    return s.notna() & s.astype(bool)
+
+
+def _text_or_empty(s: pd.Series) -> pd.Series:
+    # str(v or '').lower(): los valores falsy (None, NaN, '', 0, False) pasan a ''
+    return s.where(_truthy(s), '').astype(str).str.lower()
+
+
 class DataProcessor:
     @staticmethod
     def parse_dates(df: pd.DataFrame) -> pd.DataFrame:
@@ -16,17 +79,11 @@ class DataProcessor:
         """
         Enriquecer el DataFrame con columnas derivadas útiles para navegación, análisis y visualización.
         """
-        meses_es = [
-            "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
-            "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
-        ]
         # Datos derivados de la primera interacción
         if 'primera_interaccion' in df.columns:
             df['hora_contacto'] = df['primera_interaccion'].dt.hour
             df['mes_num'] = df['primera_interaccion'].dt.month
-            df['mes'] = df['mes_num'].apply(
-                lambda x: meses_es[int(x) - 1] if pd.notna(x) and int(x) in range(1, 13) else "Desconocido"
-            )
+            df['mes'] = df['mes_num'].map(dict(enumerate(MESES_ES, start=1))).fillna("Desconocido")
             df['año'] = df['primera_interaccion'].dt.year
         # Datos derivados de citas
         if 'cita' in df.columns:
@@ -37,55 +94,36 @@ class DataProcessor:
             df['tiempo_meses'] = pd.to_numeric(df['tiempo_meses'], errors='coerce')
         # Calificación personalizada (si no existe)
         if 'calificacion' in df.columns:
-            df['calificacion'] = df.apply(DataProcessor._calculate_qualification, axis=1)
+            df['calificacion'] = DataProcessor._calculate_qualification(df)
         return df
 
     @staticmethod
-    def _calculate_qualification(row: pd.Series) -> str:
-        # 5: Si tiene cita programada (cita no NaN)
-        if pd.notna(row.get("cita")):
-            return "5: Cliente Calificado"
-        # 4: Si ya cargó planos
-        if bool(row.get("planos")):
-            return "4: Cliente Pre-Calificado"
-        # 3: Si indicó un tiempo definido
-        if pd.notna(row.get("tiempo")) and row.get("tiempo") != "":
-            return "3: Cliente Potencial"
-        # 2: Si tiene estilo, presupuesto, toma de decisión o categoría asignada
-        if any(pd.notna(row.get(col)) and row.get(col) != "" for col in ["estilo", "presupuesto", "toma_decision", "categoria"]):
-            return "2: Cliente Interesado"
-        # 1: Si por lo menos tiene categoría
-        if pd.notna(row.get("categoria")) and row.get("categoria") != "":
-            return "1: Cliente Frío"
-        # 0: Sin ningún avance
-        return "0: Sin avance"
+    def _calculate_qualification(df: pd.DataFrame) -> np.ndarray:
+        """
+        Calificación por columnas (la primera condición que se cumple gana):
+          5: tiene cita | 4: cargó planos | 3: tiempo definido |
+          2: estilo, presupuesto, toma de decisión o categoría | 1: categoría | 0: sin avance
+        """
+        conditions = [
+            _column(df, "cita").notna(),
+            _truthy(_column(df, "planos")),
+            _has_value(_column(df, "tiempo")),
+            np.logical_or.reduce([
+                _has_value(_column(df, col)) for col in ["estilo", "presupuesto", "toma_decision", "categoria"]
+            ]),
+            _has_value(_column(df, "categoria")),
+        ]
+        return np.select(conditions, QUALIFICATION_LABELS, default=NO_QUALIFICATION_LABEL).astype(object)
 
     @staticmethod
     def transform_data(supabase_data: List[Dict[str, Any]]) -> pd.DataFrame:
-        transformed_data = []
-        for item in supabase_data:
-                transformed_data.append({
-                    "id": item.get("id"),
-                    "primera_interaccion": item.get('primera_interaccion', ''),
-                    "ultima_interaccion": item.get('ultima_interaccion', ''),
-                    "telefono": item.get('telefono', ''),
-                    "nombre": item.get('nombre', ''),
-                    "categoria": item.get('categoria', ''),
-                    "estilo": item.get('estilo', ''),
-                    "presupuesto": item.get('presupuesto', None),
-                    "toma_decision": item.get('toma_decision', ''),
-                    "tiempo": item.get('tiempo', ''),
-                    "tiempo_meses": item.get("tiempo_meses", None),
-                    "planos": item.get('planos', ''),
-                    "cita": item.get('cita', ''),
-                    "calificacion": item.get('calificacion', ''),
-                    "resumen": item.get('resumen', ''),
-                    "correo": item.get('correo', ''),
-                    "seguimiento": item.get('seguimiento', 'NO'),
-                    "ultimo_seguimiento": item.get('ultimo_seguimiento', None),  # añadir si falta
-                    "tipo_cliente": item.get('tipo_cliente', ''),
-                })
-        df = pd.DataFrame(transformed_data)
+        # Construcción columnar: solo las columnas conocidas y, si falta una columna entera, su default.
+        # Una clave ausente en algunas filas (PostgREST siempre envía todas) queda como nulo.
+        raw = pd.DataFrame(supabase_data)
+        df = raw.reindex(columns=list(CLIENT_COLUMN_DEFAULTS))
+        for col, default in CLIENT_COLUMN_DEFAULTS.items():
+            if col not in raw.columns:
+                df[col] = default
         # Convertir campos de fecha si vienen en texto
         for col in ['primera_interaccion', 'ultima_interaccion', 'cita', 'ultimo_seguimiento']:
             if col in df.columns:
@@ -242,31 +280,30 @@ class DataProcessor:
 
     @staticmethod
     def limpiar_seguimiento(df: pd.DataFrame) -> pd.DataFrame:
-        no_cliente_keywords = ['proveedor', 'consulta de trabajo', 'mensaje raro']  # puedes ampliar
-
-        def es_no_cliente(row):
-            combined = ''.join([
-                str(row.get('categoria') or '').lower(),
-                str(row.get('estilo') or '').lower(),
-                str(row.get('resumen') or '').lower()
-            ])
-            return any(k in combined for k in no_cliente_keywords)
-
-        df['es_no_cliente'] = df.apply(es_no_cliente, axis=1)
+        # No cliente: alguna palabra clave en categoria+estilo+resumen (concatenados, en minúsculas)
+        combined = (
+            _text_or_empty(_column(df, 'categoria'))
+            + _text_or_empty(_column(df, 'estilo'))
+            + _text_or_empty(_column(df, 'resumen'))
+        )
+        pattern = '|'.join(re.escape(k) for k in NO_CLIENTE_KEYWORDS)
+        df['es_no_cliente'] = combined.str.contains(pattern, regex=True).astype(bool)
 
         ahora = datetime.utcnow()
-
-        def actualizar_seguimiento(row):
-            if row['es_no_cliente']:
-                return 'No Cliente'
-            if row['tipo_cliente'] == "Con Cita":
-                return 'Agendado'
-            if row['seguimiento'] == 'SI' and pd.notnull(row['ultimo_seguimiento']):
-                if (ahora - row['ultimo_seguimiento']) <= timedelta(days=30):
-                    return 'Seguimiento'
-            return 'No Cliente'
-
-        df['seguimiento'] = df.apply(actualizar_seguimiento, axis=1)
+        ultimo = _column(df, 'ultimo_seguimiento')
+        if not pd.api.types.is_datetime64_any_dtype(ultimo):
+            ultimo = pd.to_datetime(ultimo, errors='coerce')
+        reciente = ultimo.notna() & ((ahora - ultimo) <= timedelta(days=30))
+
+        df['seguimiento'] = np.select(
+            [
+                df['es_no_cliente'],
+                _column(df, 'tipo_cliente') == "Con Cita",
+                (_column(df, 'seguimiento') == 'SI') & reciente,
+            ],
+            ['No Cliente', 'Agendado', 'Seguimiento'],
+            default='No Cliente',
+        ).astype(object)
 
         return df
 
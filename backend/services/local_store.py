@@ -0,0 +1,72 @@
+# services/local_store.py
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from config import LOCAL_STORE_PATH
+
+
+class LocalStore:
+    """
+    SQLite local del proceso para estado que debe sobrevivir a un reinicio (cola de jobs de
+    media, índices de idempotencia...). WAL + synchronous=NORMAL: cada escritura es una
+    transacción corta (<1 ms), así que se hace directo desde el event loop.
+    Una conexión compartida protegida por un lock (sqlite3 no admite uso concurrente).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+
+    def script(self, sql: str) -> None:
+        """DDL idempotente (CREATE TABLE IF NOT EXISTS ...)."""
+        with self._lock:
+            self._conn.executescript(sql)
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Escritura; devuelve las filas afectadas (0 en un INSERT OR IGNORE que ya existía)."""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[LocalStore] = None
+_store_lock = threading.Lock()
+
+
+def get_local_store() -> LocalStore:
+    """LocalStore del proceso en LOCAL_STORE_PATH; se abre en el primer uso."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LocalStore(LOCAL_STORE_PATH)
+    return _store
@@ -0,0 +1,162 @@
+# services/media_index.py
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from services.local_store import LocalStore
+
+# session_id -> {media_id: (message_id, mensaje)} de lo que ya está en n8n_chat_pravi
+ScanSession = Callable[[str], Awaitable[Dict[str, Tuple[Any, Dict[str, Any]]]]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inbound_media (
+    session_id TEXT NOT NULL,
+    media_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    message_id INTEGER,
+    message TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (session_id, media_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS inbound_media_sessions (
+    session_id TEXT PRIMARY KEY,
+    indexed_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class InboundMediaIndex:
+    """
+    Índice de idempotencia de la media entrante por (session_id, media_id), en SQLite
+    (inbound_media) con un LRU de `capacity` entradas delante:
+      - claim(): INSERT atómico de una entrada 'pending'; si ya existe se devuelve la entrada,
+        así un duplicado que llega mientras el primero sigue en curso también se rechaza
+      - complete() la pasa a 'done' con el mensaje guardado; release() la borra si falló
+      - una 'pending' con más de `pending_ttl` s (proceso caído a mitad) se puede reclamar
+      - ensure_session(): la primera vez que aparece una sesión se recorre su historial una
+        sola vez (scan_session) para indexar la media guardada antes de que existiera el índice
+    Entrada: {"status", "owner", "message_id", "message"}.
+    """
+    def __init__(
+        self,
+        store: Callable[[], LocalStore],
+        scan_session: ScanSession,
+        capacity: int = 10000,
+        pending_ttl: float = 900,
+    ):
+        self._store_factory = store
+        self._store: Optional[LocalStore] = None
+        self._scan_session = scan_session
+        self.capacity = capacity
+        self.pending_ttl = pending_ttl
+        # Solo entradas 'done', que ya no cambian
+        self._done: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._indexed: Set[str] = set()
+        self._indexing: Dict[str, asyncio.Future] = {}
+
+    @property
+    def store(self) -> LocalStore:
+        if self._store is None:
+            self._store = self._store_factory()
+            self._store.script(SCHEMA)
+        return self._store
+
+    def _remember(self, key: Tuple[str, str], entry: Dict[str, Any]) -> None:
+        if entry["status"] != "done":
+            return
+        self._done[key] = entry
+        self._done.move_to_end(key)
+        while len(self._done) > self.capacity:
+            self._done.popitem(last=False)
+
+    def lookup(self, session_id: str, media_id: str) -> Optional[Dict[str, Any]]:
+        key = (session_id, media_id)
+        entry = self._done.get(key)
+        if entry is not None:
+            self._done.move_to_end(key)
+            return entry
+        row = self.store.query_one(
+            "SELECT status, owner, message_id, message FROM inbound_media WHERE session_id = ? AND media_id = ?",
+            key,
+        )
+        if row is None:
+            return None
+        entry = {**row, "message": json.loads(row["message"]) if row["message"] else None}
+        self._remember(key, entry)
+        return entry
+
+    def claim(self, session_id: str, media_id: str, owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """None si la media queda a cargo de quien llama; si no, la entrada que ya existía."""
+        key = (session_id, media_id)
+        if key in self._done:
+            return self.lookup(session_id, media_id)
+        now = time.time()
+        claimed = self.store.execute(
+            "INSERT INTO inbound_media (session_id, media_id, status, owner, updated_at) VALUES (?, ?, 'pending', ?, ?) "
+            "ON CONFLICT (session_id, media_id) DO UPDATE SET owner = excluded.owner, updated_at = excluded.updated_at "
+            "WHERE inbound_media.status = 'pending' AND inbound_media.updated_at < ?",
+            (session_id, media_id, owner, now, now - self.pending_ttl),
+        )
+        if claimed:
+            return None
+        return self.lookup(session_id, media_id)
+
+    def complete(self, session_id: str, media_id: str, message_id: Any, message: Dict[str, Any]) -> None:
+        self.store.execute(
+            "INSERT INTO inbound_media (session_id, media_id, status, message_id, message, updated_at) "
+            "VALUES (?, ?, 'done', ?, ?, ?) ON CONFLICT (session_id, media_id) DO UPDATE SET "
+            "status = 'done', message_id = excluded.message_id, message = excluded.message, updated_at = excluded.updated_at",
+            (session_id, media_id, message_id, json.dumps(message, default=str), time.time()),
+        )
+        self._remember((session_id, media_id), {"status": "done", "owner": None, "message_id": message_id, "message": message})
+
+    def release(self, session_id: str, media_id: str, owner: Optional[str] = None) -> None:
+        """Libera una entrada 'pending' (la de `owner`, si se indica) para que un reintento la procese."""
+        sql = "DELETE FROM inbound_media WHERE session_id = ? AND media_id = ? AND status = 'pending'"
+        params: Tuple[Any, ...] = (session_id, media_id)
+        if owner is not None:
+            sql += " AND owner = ?"
+            params += (owner,)
+        self.store.execute(sql, params)
+
+    async def ensure_session(self, session_id: str) -> None:
+        if session_id in self._indexed:
+            return
+        if self.store.query_one("SELECT 1 FROM inbound_media_sessions WHERE session_id = ?", (session_id,)):
+            self._indexed.add(session_id)
+            return
+        task = self._indexing.get(session_id)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.get_running_loop().create_task(self._index_session(session_id))
+            self._indexing[session_id] = task
+        # shield: si un cliente cancela, el recorrido compartido sigue para los demás
+        await asyncio.shield(task)
+
+    async def _index_session(self, session_id: str) -> None:
+        try:
+            found = await self._scan_session(session_id)
+            now = time.time()
+            rows = [
+                (session_id, media_id, message_id, json.dumps(message, default=str), now)
+                for media_id, (message_id, message) in found.items()
+            ]
+            self.store.executemany(
+                "INSERT INTO inbound_media (session_id, media_id, status, message_id, message, updated_at) "
+                "VALUES (?, ?, 'done', ?, ?, ?) ON CONFLICT (session_id, media_id) DO UPDATE SET "
+                "status = 'done', message_id = excluded.message_id, message = excluded.message, updated_at = excluded.updated_at",
+                rows,
+            )
+            self.store.execute(
+                "INSERT OR IGNORE INTO inbound_media_sessions (session_id, indexed_at) VALUES (?, ?)", (session_id, now)
+            )
+            self._indexed.add(session_id)
+        except Exception as e:
+            # Como antes: si no se puede leer el historial se sigue sin bloquear la media entrante
+            logger.warning("No se pudo indexar la media de la sesión %s: %s", session_id, e)
+        finally:
+            self._indexing.pop(session_id, None)
@@ -0,0 +1,155 @@
+# services/media_jobs.py
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from services.local_store import LocalStore
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+# (job_id, payload) de un job que terminó en failed
+JobFailed = Callable[[str, Dict[str, Any]], None]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_jobs_status ON media_jobs (status, created_at);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class MediaJobQueue:
+    """
+    Cola de media entrante: `concurrency` workers asyncio y un diario en SQLite (media_jobs).
+      - submit(): guarda el job como queued y lo encola; quien llama responde al momento con el id
+      - al arrancar se retoman los jobs queued/running del diario (reinicio a mitad de un job)
+      - error con status < 500 (HTTPException 4xx): failed; otro error: se reintenta hasta
+        `max_attempts` veces, esperando retry_delay * intento; on_failed(job_id, payload) al fallar
+    El handler debe ser reentrante: un job retomado puede haber llegado a guardar el mensaje.
+    """
+    def __init__(
+        self,
+        store: Callable[[], LocalStore],
+        handler: JobHandler,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        retry_delay: float = 5,
+        on_failed: Optional[JobFailed] = None,
+    ):
+        self._store_factory = store
+        self._store: Optional[LocalStore] = None
+        self._handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._on_failed = on_failed
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[str]"] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def store(self) -> LocalStore:
+        if self._store is None:
+            self._store = self._store_factory()
+            self._store.script(SCHEMA)
+        return self._store
+
+    async def start(self) -> None:
+        """Arranca los workers en el event loop en curso y retoma lo pendiente del diario."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._work()) for _ in range(self.concurrency)]
+        pending = self.store.query(
+            "SELECT id FROM media_jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+        )
+        for row in pending:
+            self._queue.put_nowait(row["id"])
+        if pending:
+            logger.info("Retomando %d jobs de media pendientes", len(pending))
+
+    async def stop(self) -> None:
+        """Detiene los workers; lo que estaba en curso queda 'running' y se retoma al arrancar."""
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def submit(self, payload: Dict[str, Any], job_id: Optional[str] = None) -> Dict[str, Any]:
+        await self.start()
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self.store.execute(
+            "INSERT INTO media_jobs (id, payload, status, attempts, created_at, updated_at) VALUES (?, ?, 'queued', 0, ?, ?)",
+            (job_id, json.dumps(payload), now, now),
+        )
+        self._queue.put_nowait(job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self.store.query_one("SELECT * FROM media_jobs WHERE id = ?", (job_id,))
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        rows = self.store.query("SELECT status, COUNT(*) AS n FROM media_jobs GROUP BY status")
+        return {r["status"]: r["n"] for r in rows}
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        self.store.execute(f"UPDATE media_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.exception("Job de media %s: error inesperado: %s", job_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        row = self.store.query_one("SELECT payload, status, attempts FROM media_jobs WHERE id = ?", (job_id,))
+        if row is None or row["status"] in ("done", "failed"):
+            return
+        attempts = row["attempts"] + 1
+        self._update(job_id, status="running", attempts=attempts)
+        payload = json.loads(row["payload"])
+        try:
+            result = await self._handler(payload)
+        except Exception as e:
+            status_code = getattr(e, "status_code", 500)
+            error = str(getattr(e, "detail", None) or e)
+            if status_code < 500 or attempts >= self.max_attempts:
+                self._update(job_id, status="failed", error=error)
+                logger.warning("Job de media %s falló (%s intentos): %s", job_id, attempts, error)
+                if self._on_failed is not None:
+                    self._on_failed(job_id, payload)
+            else:
+                self._update(job_id, status="queued", error=error)
+                asyncio.get_running_loop().call_later(self.retry_delay * attempts, self._queue.put_nowait, job_id)
+            return
+        self._update(job_id, status="done", result=json.dumps(result, default=str), error=None)
@@ -0,0 +1,127 @@
+# services/media_registry.py
+import hashlib
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from services.local_store import LocalStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_storage (
+    digest TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS media_whatsapp (
+    digest TEXT NOT NULL,
+    phone_number_id TEXT NOT NULL,
+    media_id TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (digest, phone_number_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS media_converted (
+    source_digest TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    filename TEXT NOT NULL,
+    mime TEXT NOT NULL,
+    used_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS media_converted_used ON media_converted (used_at);
+"""
+
+
+def media_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class MediaRegistry:
+    """
+    Registro de media por contenido (SHA-256), en el SQLite local:
+      - media_storage: digest -> URL pública en Storage (cualquier sesión la puede reutilizar)
+      - media_whatsapp: digest + número -> media_id de la Graph API, válido `whatsapp_ttl` s
+        (Meta borra la media subida a los 30 días)
+      - media_converted: audio ya convertido a MP3 por digest del original; guarda el
+        resultado (notas de voz, pocos cientos de KB) y solo las `converted_entries` más usadas
+    """
+    def __init__(
+        self,
+        store: Callable[[], LocalStore],
+        whatsapp_ttl: float = 29 * 24 * 3600,
+        converted_entries: int = 200,
+    ):
+        self._store_factory = store
+        self._store: Optional[LocalStore] = None
+        self.whatsapp_ttl = whatsapp_ttl
+        self.converted_entries = converted_entries
+        self._counts = {"storage_hits": 0, "whatsapp_hits": 0, "converted_hits": 0}
+
+    @property
+    def store(self) -> LocalStore:
+        if self._store is None:
+            self._store = self._store_factory()
+            self._store.script(SCHEMA)
+        return self._store
+
+    def storage_url(self, digest: str) -> Optional[str]:
+        row = self.store.query_one("SELECT url FROM media_storage WHERE digest = ?", (digest,))
+        if row is None:
+            return None
+        self._counts["storage_hits"] += 1
+        return row["url"]
+
+    def remember_storage(self, digest: str, url: str, size: int) -> None:
+        self.store.execute(
+            "INSERT OR REPLACE INTO media_storage (digest, url, size, updated_at) VALUES (?, ?, ?, ?)",
+            (digest, url, size, time.time()),
+        )
+
+    def whatsapp_media_id(self, digest: str, phone_number_id: str) -> Optional[str]:
+        row = self.store.query_one(
+            "SELECT media_id FROM media_whatsapp WHERE digest = ? AND phone_number_id = ? AND expires_at > ?",
+            (digest, phone_number_id, time.time()),
+        )
+        if row is None:
+            return None
+        self._counts["whatsapp_hits"] += 1
+        return row["media_id"]
+
+    def remember_whatsapp(self, digest: str, phone_number_id: str, media_id: str) -> None:
+        self.store.execute(
+            "INSERT OR REPLACE INTO media_whatsapp (digest, phone_number_id, media_id, expires_at) VALUES (?, ?, ?, ?)",
+            (digest, phone_number_id, media_id, time.time() + self.whatsapp_ttl),
+        )
+
+    def forget_whatsapp(self, digest: str, phone_number_id: str) -> None:
+        """Media_id que Meta rechazó antes de tiempo: la próxima vez se vuelve a subir."""
+        self.store.execute(
+            "DELETE FROM media_whatsapp WHERE digest = ? AND phone_number_id = ?", (digest, phone_number_id)
+        )
+
+    def converted(self, source_digest: str) -> Optional[Tuple[bytes, str, str]]:
+        row = self.store.query_one(
+            "SELECT content, filename, mime FROM media_converted WHERE source_digest = ?", (source_digest,)
+        )
+        if row is None:
+            return None
+        self.store.execute("UPDATE media_converted SET used_at = ? WHERE source_digest = ?", (time.time(), source_digest))
+        self._counts["converted_hits"] += 1
+        return bytes(row["content"]), row["filename"], row["mime"]
+
+    def remember_converted(self, source_digest: str, content: bytes, filename: str, mime: str) -> None:
+        self.store.execute(
+            "INSERT OR REPLACE INTO media_converted (source_digest, content, filename, mime, used_at) VALUES (?, ?, ?, ?, ?)",
+            (source_digest, content, filename, mime, time.time()),
+        )
+        self.store.execute(
+            "DELETE FROM media_converted WHERE source_digest NOT IN "
+            "(SELECT source_digest FROM media_converted ORDER BY used_at DESC LIMIT ?)",
+            (self.converted_entries,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        counts = self.store.query_one(
+            "SELECT (SELECT COUNT(*) FROM media_storage) AS storage, "
+            "(SELECT COUNT(*) FROM media_whatsapp WHERE expires_at > ?) AS whatsapp, "
+            "(SELECT COUNT(*) FROM media_converted) AS converted",
+            (time.time(),),
+        )
+        return {**counts, **self._counts}
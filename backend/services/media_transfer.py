@@ -0,0 +1,208 @@
+# services/media_transfer.py
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import quote
+import httpx
+from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_HTTP_TIMEOUT, MEDIA_MEMORY_BUDGET, MEDIA_CHUNK_SIZE
+from services.whatsapp_client import WhatsAppClient
+
+logger = logging.getLogger(__name__)
+
+
+class TransferStats:
+    """Bytes, duración y throughput de una descarga o subida de media (y SHA-256 de lo descargado)."""
+    def __init__(self, stage: str, size: int, seconds: float, spilled: bool = False, digest: Optional[str] = None):
+        self.stage = stage
+        self.bytes = size
+        self.seconds = seconds
+        self.spilled = spilled
+        self.digest = digest
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "bytes": self.bytes,
+            "ms": round(self.seconds * 1000, 1),
+            "mb_per_s": round(self.mb_per_s, 2),
+            "spilled_to_disk": self.spilled,
+        }
+
+
+class TransferMetrics:
+    """Acumulado por etapa (download/upload) para /metrics/media-transfers."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stats: TransferStats) -> None:
+        with self._lock:
+            s = self._stages.setdefault(stats.stage, {"transfers": 0, "bytes": 0, "seconds": 0.0, "spilled": 0})
+            s["transfers"] += 1
+            s["bytes"] += stats.bytes
+            s["seconds"] += stats.seconds
+            s["spilled"] += int(stats.spilled)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                stage: {
+                    "transfers": int(s["transfers"]),
+                    "bytes": int(s["bytes"]),
+                    "spilled_to_disk": int(s["spilled"]),
+                    "avg_mb_per_s": round(s["bytes"] / 1e6 / s["seconds"], 2) if s["seconds"] else 0.0,
+                }
+                for stage, s in self._stages.items()
+            }
+
+
+TRANSFER_METRICS = TransferMetrics()
+
+
+def new_spool(memory_budget: int = MEDIA_MEMORY_BUDGET) -> "tempfile.SpooledTemporaryFile[bytes]":
+    """Archivo temporal en memoria hasta `memory_budget` bytes; a partir de ahí, en disco."""
+    return tempfile.SpooledTemporaryFile(max_size=memory_budget, mode="w+b")
+
+
+def _spilled(spool: "tempfile.SpooledTemporaryFile[bytes]") -> bool:
+    return bool(getattr(spool, "_rolled", False))
+
+
+class _HashingSink:
+    """Escribe en el spool y va calculando el SHA-256, sin una segunda pasada por el archivo."""
+    def __init__(self, sink):
+        self.sink = sink
+        self.sha256 = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> int:
+        self.sha256.update(chunk)
+        return self.sink.write(chunk)
+
+
+async def download_to_spool(
+    client: WhatsAppClient,
+    media_url: str,
+    memory_budget: int = MEDIA_MEMORY_BUDGET,
+    chunk_size: int = MEDIA_CHUNK_SIZE,
+) -> Tuple["tempfile.SpooledTemporaryFile[bytes]", TransferStats]:
+    """Descarga de la Graph API por trozos; el llamador cierra el spool."""
+    spool = new_spool(memory_budget)
+    sink = _HashingSink(spool)
+    started = time.perf_counter()
+    try:
+        size = await client.download_to(media_url, sink, chunk_size)
+    except BaseException:
+        spool.close()
+        raise
+    stats = TransferStats("download", size, time.perf_counter() - started, _spilled(spool), sink.sha256.hexdigest())
+    TRANSFER_METRICS.record(stats)
+    return spool, stats
+
+
+class SpoolReader:
+    """
+    Lectura con posición propia sobre un archivo compartido: la subida a Storage y la subida
+    a la Graph API leen el mismo spool a la vez sin pisarse (cada read() hace seek antes).
+    """
+    def __init__(self, spool):
+        self._spool = spool
+        self._size = spool.seek(0, 2)
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._size - self._pos
+        self._spool.seek(self._pos)
+        chunk = self._spool.read(size)
+        self._pos += len(chunk)
+        return chunk
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = {0: 0, 1: self._pos, 2: self._size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+async def _read_chunks(spool, chunk_size: int) -> AsyncIterator[bytes]:
+    reader = SpoolReader(spool)
+    while True:
+        chunk = reader.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class StorageUploader:
+    """
+    Subida a Supabase Storage por la API REST (POST /storage/v1/object/{bucket}/{path}) con el
+    cuerpo en streaming desde un spool, en vez de storage3 con el archivo entero en bytes.
+    """
+    def __init__(self, url: str, key: str, timeout: float = 120, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._http = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/storage/v1/",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            timeout=timeout,
+            transport=transport,
+        )
+
+    async def upload(
+        self,
+        bucket: str,
+        path: str,
+        spool,
+        size: int,
+        content_type: str,
+        cache_control: str = "3600",
+        upsert: bool = True,
+        chunk_size: int = MEDIA_CHUNK_SIZE,
+    ) -> TransferStats:
+        started = time.perf_counter()
+        response = await self._http.post(
+            f"object/{bucket}/{quote(path)}",
+            content=_read_chunks(spool, chunk_size),
+            headers={
+                "Content-Type": content_type,
+                "Content-Length": str(size),
+                "Cache-Control": f"max-age={cache_control}",
+                "x-upsert": "true" if upsert else "false",
+            },
+        )
+        if response.is_error:
+            raise Exception(f"{response.status_code} {response.text}")
+        stats = TransferStats("upload", size, time.perf_counter() - started, _spilled(spool))
+        TRANSFER_METRICS.record(stats)
+        return stats
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+# Las conexiones de httpx.AsyncClient pertenecen a un event loop: un cliente por loop
+_uploaders: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], StorageUploader]]" = weakref.WeakKeyDictionary()
+
+
+def get_storage_uploader(url: Optional[str] = None, key: Optional[str] = None) -> StorageUploader:
+    url, key = url or SUPABASE_URL, key or SUPABASE_KEY
+    uploaders = _uploaders.setdefault(asyncio.get_running_loop(), {})
+    uploader = uploaders.get((url, key))
+    if uploader is None:
+        uploader = StorageUploader(url, key, timeout=SUPABASE_HTTP_TIMEOUT)
+        uploaders[(url, key)] = uploader
+    return uploader
+
+
+async def close_storage_uploaders() -> None:
+    """Cierra los clientes del event loop en curso (apagado de la app)."""
+    for uploader in _uploaders.pop(asyncio.get_running_loop(), {}).values():
+        await uploader.aclose()
@@ -0,0 +1,78 @@
+# services/message_batcher.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+InsertRows = Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBatcher:
+    """
+    Write-behind de inserciones en n8n_chat_pravi: las filas que llegan dentro de `window` s
+    (o hasta `max_rows`) se insertan juntas en una sola petición.
+      - cada submit() espera su propia fila insertada (con id); si la inserción falla, todos
+        los de ese lote reciben la excepción
+      - PostgREST devuelve las filas en el orden del insert, así se reparten por posición
+      - flush() inserta lo pendiente sin esperar la ventana (apagado de la app)
+    Con window=0 está desactivado y persist_message inserta directo.
+    """
+    def __init__(self, insert_rows: InsertRows, window: float = 0.0, max_rows: int = 100):
+        self._insert_rows = insert_rows
+        self.window = window
+        self.max_rows = max_rows
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Lo pendiente de otro event loop ya no se puede resolver
+            self._loop, self._pending, self._timer, self._flushing = loop, [], None, set()
+        future = loop.create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._flush(batch))
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        try:
+            inserted = await self._insert_rows([row for row, _ in batch])
+            if len(inserted) != len(batch):
+                raise RuntimeError(f"Se insertaron {len(inserted)} de {len(batch)} mensajes")
+        except Exception as e:
+            logger.warning("No se pudo insertar un lote de %d mensajes: %s", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        # Si quien llamó se canceló, su fila igual queda guardada
+        for (_, future), row in zip(batch, inserted):
+            if not future.done():
+                future.set_result(row)
+
+    async def flush(self) -> None:
+        if self._loop is not asyncio.get_running_loop():
+            return
+        self._start_flush()
+        if self._flushing:
+            await asyncio.gather(*list(self._flushing), return_exceptions=True)
@@ -0,0 +1,101 @@
+# services/range_scanner.py
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+FetchRange = Callable[[int, int], Awaitable[List[Dict[str, Any]]]]
+
+logger = logging.getLogger(__name__)
+
+
+async def fetch_range_with_retry(
+    fetch_range: FetchRange, start: int, end: int,
+    retries: int = 2, backoff: float = 0.2,
+) -> List[Dict[str, Any]]:
+    """Pide el rango [start, end]; reintenta con espera exponencial si falla."""
+    attempt = 0
+    while True:
+        try:
+            return await fetch_range(start, end)
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            logger.warning("Rango %s-%s falló (%s), reintento %s/%s", start, end, e, attempt + 1, retries)
+            await asyncio.sleep(backoff * (2 ** attempt))
+            attempt += 1
+
+
+async def iter_ranges(
+    fetch_range: FetchRange,
+    total: int,
+    page_size: int = 1000,
+    concurrency: int = 4,
+    retries: int = 2,
+    backoff: float = 0.2,
+) -> AsyncIterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Recorre [0, total) en rangos de `page_size` con como máximo `concurrency` peticiones en vuelo.
+    Entrega (índice_de_página, filas) en cuanto llega cada página, sin orden garantizado.
+    Si la última página llega llena (se insertaron filas tras el conteo), sigue pidiendo hasta
+    recibir una incompleta.
+    """
+    next_page = 0
+    last_page = (total - 1) // page_size if total > 0 else 0
+    pending: Dict[asyncio.Future, int] = {}
+
+    def launch(page: int) -> None:
+        start = page * page_size
+        task = asyncio.ensure_future(
+            fetch_range_with_retry(fetch_range, start, start + page_size - 1, retries, backoff)
+        )
+        pending[task] = page
+
+    while next_page <= last_page and len(pending) < concurrency:
+        launch(next_page)
+        next_page += 1
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                page = pending.pop(task)
+                rows = task.result()
+                if page == last_page and len(rows) >= page_size:
+                    last_page += 1
+                if next_page <= last_page:
+                    launch(next_page)
+                    next_page += 1
+                yield page, rows
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def scan_ranges(
+    fetch_range: FetchRange,
+    total: int,
+    page_size: int = 1000,
+    concurrency: int = 4,
+    retries: int = 2,
+    backoff: float = 0.2,
+    dedupe_key: Optional[str] = "id",
+) -> List[Dict[str, Any]]:
+    """
+    Igual que iter_ranges pero reensambla las páginas en orden. Con `dedupe_key`, una fila que
+    se desplazó de página durante el recorrido se devuelve una sola vez.
+    """
+    pages: Dict[int, List[Dict[str, Any]]] = {}
+    async for page, rows in iter_ranges(fetch_range, total, page_size, concurrency, retries, backoff):
+        pages[page] = rows
+
+    out: List[Dict[str, Any]] = []
+    seen = set()
+    for page in sorted(pages):
+        for row in pages[page]:
+            if dedupe_key is not None:
+                key = row.get(dedupe_key)
+                if key is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+            out.append(row)
+    return out
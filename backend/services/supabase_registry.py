@@ -0,0 +1,303 @@
+# services/supabase_registry.py
+import asyncio
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+import httpx
+from postgrest import AsyncPostgrestClient
+from supabase import create_client, Client
+from config import (
+    SUPABASE_URL, SUPABASE_KEY,
+    SUPABASE_POOL_MAX_CONNECTIONS, SUPABASE_POOL_MAX_KEEPALIVE, SUPABASE_POOL_KEEPALIVE_EXPIRY,
+    SUPABASE_HTTP2, SUPABASE_HTTP_TIMEOUT,
+)
+
+
+def _limits(max_connections: int, max_keepalive: int, keepalive_expiry: float) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+
+
+class PoolMetrics:
+    """Contadores del pool HTTP (seguros entre hilos)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.requests = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquired(self, wait: float) -> None:
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.requests += 1
+            if wait > 0.001:
+                self.waited += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def released(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "requests": self.requests,
+                "waited": self.waited,
+                "wait_avg_ms": round(self.wait_total / self.requests * 1000, 3) if self.requests else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Cuerpo de la respuesta que devuelve el cupo del pool al cerrarse."""
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """
+    HTTPTransport con `max_connections` cupos: una petición espera cupo antes de salir
+    (ese tiempo es el wait del pool) y lo devuelve cuando se cierra la respuesta.
+    """
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry: float, http2: bool):
+        self._transport = httpx.HTTPTransport(
+            http2=http2, limits=_limits(max_connections, max_keepalive, keepalive_expiry),
+        )
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.max_connections = max_connections
+        self.metrics = PoolMetrics()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        self._slots.acquire()
+        self.metrics.acquired(time.perf_counter() - start)
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self._slots.release()
+                self.metrics.released()
+
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def connections(self) -> Dict[str, int]:
+        """Conexiones abiertas en el pool (httpcore no lo expone de forma pública)."""
+        try:
+            conns = list(self._transport._pool.connections)
+        except AttributeError:
+            return {"open": 0, "idle": 0}
+        return {"open": len(conns), "idle": sum(1 for c in conns if c.is_idle())}
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class AsyncInstrumentedTransport(httpx.AsyncBaseTransport):
+    """Versión async de InstrumentedTransport: los cupos son un asyncio.Semaphore del event loop."""
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry: float, http2: bool):
+        self._transport = httpx.AsyncHTTPTransport(
+            http2=http2, limits=_limits(max_connections, max_keepalive, keepalive_expiry),
+        )
+        self._slots = asyncio.Semaphore(max_connections)
+        self.max_connections = max_connections
+        self.metrics = PoolMetrics()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        await self._slots.acquire()
+        self.metrics.acquired(time.perf_counter() - start)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._slots.release()
+                self.metrics.released()
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def connections(self) -> Dict[str, int]:
+        try:
+            conns = list(self._transport._pool.connections)
+        except AttributeError:
+            return {"open": 0, "idle": 0}
+        return {"open": len(conns), "idle": sum(1 for c in conns if c.is_idle())}
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class SupabaseRegistry:
+    """
+    Un Client de Supabase por (url, key) para todo el proceso, en vez de create_client por petición.
+    PostgREST usa una sesión httpx con pool ajustado e instrumentado (ver pool_metrics).
+    El cliente sync de httpx es seguro entre hilos, así que se comparte también con asyncio.to_thread.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, str], Client] = {}
+        self._transports: Dict[Tuple[str, str], InstrumentedTransport] = {}
+        # Las conexiones de httpx.AsyncClient pertenecen a un event loop: un cliente por loop
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], AsyncPostgrestClient]]" = weakref.WeakKeyDictionary()
+        self._async_transports: Dict[str, AsyncInstrumentedTransport] = {}
+
+    @staticmethod
+    def _resolve(url: Optional[str], key: Optional[str]) -> Tuple[str, str]:
+        url = url if url is not None else SUPABASE_URL
+        key = key if key is not None else SUPABASE_KEY
+        if url is None or key is None:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be provided and not None.")
+        return url, key
+
+    def get(self, url: Optional[str] = None, key: Optional[str] = None) -> Client:
+        url, key = self._resolve(url, key)
+        client = self._clients.get((url, key))
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get((url, key))
+            if client is None:
+                client = self._build(url, key)
+                self._clients[(url, key)] = client
+            return client
+
+    def _build(self, url: str, key: str) -> Client:
+        client = create_client(url, key)
+        transport = InstrumentedTransport(*self._pool_settings())
+        # No se pasa httpx_client en ClientOptions: postgrest y storage le cambiarían el base_url
+        # mutuamente. Se reemplaza solo la sesión de PostgREST, con los mismos headers.
+        # Cache-Control: no-cache para que ningún proxy intermedio sirva lecturas viejas.
+        default = client.postgrest.session
+        client.postgrest.session = httpx.Client(
+            base_url=default.base_url,
+            headers={**default.headers, "Cache-Control": "no-cache"},
+            timeout=SUPABASE_HTTP_TIMEOUT,
+            transport=transport,
+            follow_redirects=True,
+        )
+        default.close()
+        self._transports[(url, key)] = transport
+        return client
+
+    def get_async(self, url: Optional[str] = None, key: Optional[str] = None) -> AsyncPostgrestClient:
+        """
+        PostgREST async (httpx.AsyncClient) para el event loop en curso: las consultas se
+        esperan con `await ...execute()` sin ocupar hilos del executor.
+        """
+        url, key = self._resolve(url, key)
+        loop = asyncio.get_running_loop()
+        clients = self._async.setdefault(loop, {})
+        client = clients.get((url, key))
+        if client is None:
+            transport = AsyncInstrumentedTransport(*self._pool_settings())
+            session = httpx.AsyncClient(
+                timeout=SUPABASE_HTTP_TIMEOUT, transport=transport, follow_redirects=True,
+            )
+            client = AsyncPostgrestClient(
+                f"{url.rstrip('/')}/rest/v1",
+                headers={"apiKey": key, "Authorization": f"Bearer {key}", "Cache-Control": "no-cache"},
+                http_client=session,
+            )
+            clients[(url, key)] = client
+            self._async_transports[url] = transport
+        return client
+
+    @staticmethod
+    def _pool_settings() -> Tuple[int, int, float, bool]:
+        return (
+            SUPABASE_POOL_MAX_CONNECTIONS, SUPABASE_POOL_MAX_KEEPALIVE,
+            SUPABASE_POOL_KEEPALIVE_EXPIRY, SUPABASE_HTTP2,
+        )
+
+    def pool_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Por URL (y ' async' para el pool async): cupos, en uso, conexiones abiertas/ociosas y esperas."""
+        pools = [(url, t) for (url, _), t in list(self._transports.items())]
+        pools += [(f"{url} async", t) for url, t in list(self._async_transports.items())]
+        out = {}
+        for name, transport in pools:
+            out[name] = {
+                "max_connections": transport.max_connections,
+                **transport.metrics.snapshot(),
+                **transport.connections(),
+            }
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients.values():
+                client.postgrest.session.close()
+            self._clients.clear()
+            self._transports.clear()
+            # los clientes async mueren con su event loop (sus conexiones no se pueden cerrar desde aquí)
+            self._async.clear()
+            self._async_transports.clear()
+
+
+REGISTRY = SupabaseRegistry()
+
+
+def get_supabase_client(url: Optional[str] = None, key: Optional[str] = None) -> Client:
+    return REGISTRY.get(url, key)
+
+
+def get_async_postgrest(url: Optional[str] = None, key: Optional[str] = None) -> AsyncPostgrestClient:
+    return REGISTRY.get_async(url, key)
@@ -0,0 +1,149 @@
+# services/transcoder.py
+import asyncio
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+# MP3 mono 44.1 kHz 128k, como se convertía antes; entrada y salida por pipes
+MP3_ARGS = ["-vn", "-ar", "44100", "-ac", "1", "-b:a", "128k", "-f", "mp3"]
+
+
+class TranscodeError(Exception):
+    """FFmpeg terminó con error o superó el timeout."""
+
+
+class TranscodeTimeout(TranscodeError):
+    """FFmpeg superó el timeout y se mató el proceso."""
+
+
+class TranscoderBusy(Exception):
+    """Todos los cupos y la cola están ocupados: quien llama debe reintentar más tarde."""
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _needs_seekable_input(data: bytes) -> bool:
+    # MP4/M4A (p. ej. notas de voz de iPhone) con el índice 'moov' al final no se leen por pipe
+    return data[4:8] == b"ftyp"
+
+
+class AudioTranscoder:
+    """
+    Conversión de audio con FFmpeg fuera del event loop (asyncio.create_subprocess_exec):
+      - como mucho `concurrency` procesos a la vez y `max_queue` esperando; con todo ocupado
+        transcode() lanza TranscoderBusy en vez de acumular audios en memoria
+      - el audio entra por stdin y sale por stdout, sin archivos temporales; solo un MP4 que
+        FFmpeg no pueda leer por pipe se reintenta desde un temporal
+      - cada conversión tiene `timeout` s; si se pasa, el proceso se mata
+    stats(): cola, en curso y latencia p50/p95 de las últimas `window` conversiones.
+    """
+    def __init__(
+        self,
+        command: Sequence[str] = ("ffmpeg",),
+        concurrency: int = 2,
+        max_queue: int = 16,
+        timeout: float = 60,
+        window: int = 500,
+    ):
+        self.command = list(command)
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running = 0
+        self._waiting = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._counts = {"completed": 0, "failed": 0, "timeouts": 0, "rejected": 0}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._slots = loop, asyncio.Semaphore(self.concurrency)
+            self._running = self._waiting = 0
+        return self._slots
+
+    async def transcode(self, data: bytes, output_args: Sequence[str] = MP3_ARGS) -> bytes:
+        slots = self._semaphore()
+        if self._running + self._waiting >= self.concurrency + self.max_queue:
+            self._counts["rejected"] += 1
+            raise TranscoderBusy(f"{self._waiting} conversiones en cola")
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        started = time.perf_counter()
+        try:
+            try:
+                output = await self._run(["-i", "pipe:0"], data, output_args)
+            except TranscodeTimeout:
+                raise  # reintentar desde archivo duplicaría el tiempo que ya se agotó
+            except TranscodeError:
+                if not _needs_seekable_input(data):
+                    raise
+                output = await self._run_from_file(data, output_args)
+        except TranscodeTimeout:
+            self._counts["timeouts"] += 1
+            raise
+        except TranscodeError:
+            self._counts["failed"] += 1
+            raise
+        except BaseException:
+            self._counts["failed"] += 1
+            raise
+        finally:
+            self._running -= 1
+            slots.release()
+        self._counts["completed"] += 1
+        self._latencies.append(time.perf_counter() - started)
+        return output
+
+    async def _run(self, input_args: List[str], data: Optional[bytes], output_args: Sequence[str]) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            *self.command, "-hide_banner", "-loglevel", "error", "-y", *input_args, *output_args, "pipe:1",
+            stdin=asyncio.subprocess.PIPE if data is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(data), self.timeout)
+        except asyncio.TimeoutError:
+            raise TranscodeTimeout(f"timeout tras {self.timeout:g}s")
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        if process.returncode != 0:
+            detail = stderr.decode("utf-8", "replace").strip().splitlines()
+            raise TranscodeError(detail[-1] if detail else f"ffmpeg terminó con código {process.returncode}")
+        return stdout
+
+    async def _run_from_file(self, data: bytes, output_args: Sequence[str]) -> bytes:
+        with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as source:
+            source.write(data)
+        try:
+            return await self._run(["-i", source.name], None, output_args)
+        finally:
+            os.remove(source.name)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self._latencies)
+        p50, p95 = _percentile(latencies, 0.5), _percentile(latencies, 0.95)
+        return {
+            "running": self._running,
+            "queued": self._waiting,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            **self._counts,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
@@ -0,0 +1,196 @@
+# services/whatsapp_client.py
+import asyncio
+import json
+import logging
+import random
+import weakref
+from typing import Any, BinaryIO, Collection, Dict, Optional, Tuple, Union
+import httpx
+from config import (
+    WHATSAPP_TIMEOUT, WHATSAPP_MEDIA_TIMEOUT, WHATSAPP_MAX_RETRIES,
+    WHATSAPP_MAX_BACKOFF, WHATSAPP_MAX_CONNECTIONS,
+)
+
+DEFAULT_GRAPH_URL = "https://graph.facebook.com/v20.0"
+# 429: límite de la Graph API; 5xx: fallo transitorio de Meta
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Un envío con 5xx pudo haber llegado al cliente: solo se reintenta si Meta lo rechazó por límite
+SEND_RETRY_STATUS = {429}
+
+logger = logging.getLogger(__name__)
+
+
+class WhatsAppError(Exception):
+    """Respuesta de error de la Graph API (el texto es 'status cuerpo', como antes)."""
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"{status_code} {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Segundos que pide esperar la Graph API: Retry-After, o el mayor
+    estimated_time_to_regain_access (minutos) de X-Business-Use-Case-Usage.
+    """
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    usage = response.headers.get("X-Business-Use-Case-Usage")
+    if usage:
+        try:
+            entries = [e for items in json.loads(usage).values() for e in items]
+            minutes = max((e.get("estimated_time_to_regain_access") or 0) for e in entries)
+            return minutes * 60.0 if minutes else None
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return None
+
+
+class WhatsAppClient:
+    """
+    Cliente async de la Graph API de WhatsApp sobre un httpx.AsyncClient con pool y keep-alive.
+      - timeout: mensajes y consultas; media_timeout: subida y descarga de archivos
+      - 429/5xx y fallos de conexión se reintentan hasta `max_retries` veces, con backoff
+        exponencial (con jitter) o lo que indiquen Retry-After / X-Business-Use-Case-Usage;
+        si eso supera `max_backoff` se devuelve el error en vez de bloquear la petición
+      - send_message solo reintenta 429 y fallos de conexión: un 5xx pudo llegar al cliente
+    """
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str],
+        timeout: float = 30,
+        media_timeout: float = 120,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        max_connections: int = 20,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 10))
+        self.media_timeout = httpx.Timeout(media_timeout, connect=min(timeout, 10))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60,
+            ),
+            transport=transport,
+        )
+
+    def _delay(self, attempt: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def request(
+        self, method: str, url: str, stream: bool = False, retry_statuses: Collection[int] = RETRY_STATUS, **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Petición con reintentos; `url` relativa a la versión de la API o absoluta.
+        stream=True devuelve la respuesta sin leer el cuerpo (el llamador la cierra).
+        retry_statuses: códigos que se reintentan (los fallos de conexión se reintentan siempre).
+        """
+        attempt = 0
+        while True:
+            try:
+                response = await self._http.send(self._http.build_request(method, url, **kwargs), stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # La petición no llegó a Meta: reintentar no duplica envíos
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+            else:
+                if response.status_code not in retry_statuses or attempt >= self.max_retries:
+                    return response
+                delay = retry_after(response)
+                if delay is None:
+                    delay = self._delay(attempt)
+                elif delay > self.max_backoff:
+                    return response
+                await response.aclose()
+                logger.info("Graph API %s en %s %s; reintento en %.2fs", response.status_code, method, url, delay)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _json(self, method: str, url: str, **kwargs: Any) -> Dict[str, Any]:
+        response = await self.request(method, url, **kwargs)
+        if response.is_error:
+            raise WhatsAppError(response.status_code, response.text)
+        return response.json()
+
+    async def send_message(self, phone_number_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # No idempotente: un 5xx después de aceptar el mensaje duplicaría el envío al reintentar
+        return await self._json("POST", f"{phone_number_id}/messages", json=payload, retry_statuses=SEND_RETRY_STATUS)
+
+    async def upload_media(self, phone_number_id: str, content: Union[bytes, BinaryIO], filename: str, mime_type: str) -> Dict[str, Any]:
+        """`content` puede ser un archivo: httpx lo envía por trozos (y lo relee si hay reintento)."""
+        return await self._json(
+            "POST", f"{phone_number_id}/media",
+            data={"messaging_product": "whatsapp"},
+            files={"file": (filename, content, mime_type)},
+            timeout=self.media_timeout,
+        )
+
+    async def media_info(self, media_id: str) -> Dict[str, Any]:
+        """URL temporal (y metadatos) de un archivo recibido."""
+        return await self._json("GET", media_id)
+
+    async def download(self, media_url: str) -> bytes:
+        response = await self.request("GET", media_url, timeout=self.media_timeout)
+        if response.is_error:
+            raise WhatsAppError(response.status_code, response.text)
+        return response.content
+
+    async def download_to(self, media_url: str, sink: BinaryIO, chunk_size: int = 256 * 1024) -> int:
+        """Descarga por trozos a `sink` sin tener el archivo entero en memoria; devuelve los bytes."""
+        response = await self.request("GET", media_url, stream=True, timeout=self.media_timeout)
+        try:
+            if response.is_error:
+                await response.aread()
+                raise WhatsAppError(response.status_code, response.text)
+            total = 0
+            async for chunk in response.aiter_bytes(chunk_size):
+                sink.write(chunk)
+                total += len(chunk)
+            return total
+        finally:
+            await response.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+# Las conexiones de httpx.AsyncClient pertenecen a un event loop: un cliente por loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, Optional[str]], WhatsAppClient]]" = weakref.WeakKeyDictionary()
+
+
+def get_whatsapp_client(base_url: Optional[str] = None, token: Optional[str] = None) -> WhatsAppClient:
+    """Cliente compartido por (base_url, token) para el event loop en curso."""
+    base_url = base_url or DEFAULT_GRAPH_URL
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get((base_url, token))
+    if client is None:
+        client = WhatsAppClient(
+            base_url, token,
+            timeout=WHATSAPP_TIMEOUT, media_timeout=WHATSAPP_MEDIA_TIMEOUT,
+            max_retries=WHATSAPP_MAX_RETRIES, max_backoff=WHATSAPP_MAX_BACKOFF,
+            max_connections=WHATSAPP_MAX_CONNECTIONS,
+        )
+        clients[(base_url, token)] = client
+    return client
+
+
+async def close_whatsapp_clients() -> None:
+    """Cierra los clientes del event loop en curso (apagado de la app)."""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+from services.bot_status import BotStatusCache
+
+
+class FakeActivationTable:
+    def __init__(self, rows):
+        self.rows = dict(rows)
+        self.fetches = []
+        self.inserts = []
+        self.fail_inserts = False
+
+    async def fetch_many(self, session_ids):
+        self.fetches.append(list(session_ids))
+        await asyncio.sleep(0)
+        return {s: self.rows[s] for s in session_ids if s in self.rows}
+
+    async def insert_default(self, session_id):
+        self.inserts.append(session_id)
+        await asyncio.sleep(0.01)
+        if self.fail_inserts:
+            raise RuntimeError("supabase caído")
+        self.rows.setdefault(session_id, True)
+
+
+class BotStatusCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.table = FakeActivationTable({"a": False, "b": True})
+        self.cache = BotStatusCache(self.table.fetch_many, self.table.insert_default, ttl=60)
+
+    def test_bulk_read_is_one_query_and_then_served_from_memory(self):
+        async def scenario():
+            first = await self.cache.get_many(["a", "b", "c", "a"])
+            second = await self.cache.get_many(["b", "c"])
+            return first, second, await self.cache.get("a")
+
+        first, second, single = asyncio.run(scenario())
+        self.assertEqual(first, {"a": False, "b": True, "c": True})
+        self.assertEqual(second, {"b": True, "c": True})
+        self.assertFalse(single)
+        self.assertEqual(self.table.fetches, [["a", "b", "c"]])
+        # get_many no crea filas para las sesiones sin estado
+        self.assertEqual(self.table.inserts, [])
+
+    def test_missing_row_is_created_once_under_concurrency(self):
+        async def scenario():
+            return await asyncio.gather(*(self.cache.get("nuevo") for _ in range(10)))
+
+        self.assertTrue(all(asyncio.run(scenario())))
+        self.assertEqual(self.table.inserts, ["nuevo"])
+        asyncio.run(self.cache.get("nuevo"))
+        self.assertEqual(self.table.inserts, ["nuevo"])
+
+    def test_failed_insert_defaults_to_active_and_is_retried(self):
+        self.table.fail_inserts = True
+        self.assertTrue(asyncio.run(self.cache.get("nuevo")))
+        self.table.fail_inserts = False
+        self.assertTrue(asyncio.run(self.cache.get("nuevo")))
+        self.assertEqual(self.table.inserts, ["nuevo", "nuevo"])
+
+    def test_store_is_write_through_and_ttl_expires_entries(self):
+        self.cache.store("a", True)
+        self.assertTrue(asyncio.run(self.cache.get("a")))
+        self.assertEqual(self.table.fetches, [])
+
+        self.cache.ttl = 0
+        self.cache.store("a", True)
+        self.assertFalse(asyncio.run(self.cache.get("a")))
+        self.assertEqual(self.table.fetches, [["a"]])
+
+    def test_store_during_slow_fetch_is_not_overwritten(self):
+        gate = None
+
+        async def slow_fetch(session_ids):
+            await gate.wait()
+            return {"b": True}  # lo que había en la tabla antes del cambio del asesor
+
+        self.cache = BotStatusCache(slow_fetch, self.table.insert_default, ttl=60)
+
+        async def scenario():
+            nonlocal gate
+            gate = asyncio.Event()
+            reading = asyncio.ensure_future(self.cache.get_many(["b", "c"]))
+            await asyncio.sleep(0)
+            self.cache.store("b", False)  # POST /chat/bot-status mientras se lee
+            gate.set()
+            await reading
+            return await self.cache.get_many(["b", "c"])
+
+        self.assertEqual(asyncio.run(scenario()), {"b": False, "c": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_graph import FakeGraph
+from routes.chats import router
+from services import chat_manager
+from services.broadcast import TokenBucket, fan_out
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_allows_a_burst_then_paces_at_the_rate(self):
+        bucket = TokenBucket(rate=100, burst=10)
+        waits = [bucket.reserve() for _ in range(30)]
+        self.assertEqual(waits[:10], [0.0] * 10)
+        self.assertAlmostEqual(waits[-1], 0.2, delta=0.02)
+
+    def test_fan_out_keeps_order_and_reports_failures(self):
+        in_flight, peak = 0, 0
+
+        async def send(n):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if n == 3:
+                raise Exception("número inválido")
+            return {"status": "sent", "n": n}
+
+        results = asyncio.run(fan_out(range(8), send, TokenBucket(rate=1000, burst=8), concurrency=3))
+        self.assertEqual([r.get("n") for r in results], [0, 1, 2, None, 4, 5, 6, 7])
+        self.assertEqual(results[3], {"status": "failed", "error": "número inválido"})
+        self.assertEqual(peak, 3)
+
+
+class BroadcastRouteTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = FakeGraph(latency=0.02).start()
+        self.addCleanup(self.graph.stop)
+        self.inserts = []
+
+        def insert(rows):
+            self.inserts.append(rows)
+
+            async def execute():
+                return SimpleNamespace(data=[{**row, "id": i + 1} for i, row in enumerate(rows)])
+
+            return SimpleNamespace(execute=execute)
+
+        fake_supabase = SimpleNamespace(aclient=SimpleNamespace(table=lambda name: SimpleNamespace(insert=insert)))
+
+        async def statuses(ids):
+            return [{"session_id": s, "is_active": s == "bot"} for s in ids]
+
+        for target, value in (
+            ("supabase", fake_supabase),
+            ("get_bot_statuses", AsyncMock(side_effect=statuses)),
+            ("BROADCAST_LIMITER", TokenBucket(rate=50, burst=5)),
+            ("BROADCAST_CONCURRENCY", 10),
+            ("WHATSAPP_API_URL", self.graph.url),
+            ("WHATSAPP_ACCESS_TOKEN", "dummy-token"),
+        ):
+            patcher = patch.object(chat_manager, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(os.environ, {"WHATSAPP_PHONE_NUMBER_ID": "123"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = FastAPI()
+        app.include_router(router)
+        self.client = TestClient(app)
+
+    def test_broadcast_persists_once_and_paces_sends(self):
+        session_ids = [f"519{i:05d}" for i in range(40)] + ["bot", "51900000"]
+        started = time.perf_counter()
+        response = self.client.post("/chat/broadcast", json={"session_ids": session_ids, "message": "Nuevo catálogo"})
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["total"], body["sent"], body["skipped"], body["failed"]), (41, 40, 1, 0))
+        self.assertEqual(len(self.inserts), 1)
+        self.assertEqual(len(self.inserts[0]), 40)
+        self.assertEqual(body["results"][0]["message_id"], 1)
+        self.assertEqual(body["results"][40], {"session_id": "bot", "status": "skipped", "detail": "El bot está activo"})
+        # 40 envíos a 50/s con ráfaga de 5: al menos ~0.7 s, pero en paralelo y no 40 x latencia
+        self.assertGreaterEqual(elapsed, 0.65)
+        self.assertLess(elapsed, 2.0)
+        self.assertEqual(sorted(m["to"] for m in self.graph.sent), sorted(session_ids[:40]))
+        self.assertEqual(self.graph.sent[0]["text"], {"body": "Nuevo catálogo"})
+
+    def test_media_broadcast_reports_per_recipient_failures(self):
+        self.graph.fail_next = [(400, {})]
+        response = self.client.post("/chat/broadcast", json={
+            "session_ids": ["51911111", "51922222"],
+            "message": "Ficha técnica",
+            "media": {"url": "https://cdn/ficha.pdf", "kind": "document", "name": "ficha.pdf"},
+        })
+
+        body = response.json()
+        self.assertEqual((body["sent"], body["failed"]), (1, 1))
+        failed = next(r for r in body["results"] if r["status"] == "failed")
+        self.assertIn("400", failed["error"])
+        self.assertEqual(
+            self.graph.sent[0]["document"],
+            {"link": "https://cdn/ficha.pdf", "caption": "Ficha técnica", "filename": "ficha.pdf"},
+        )
+        self.assertEqual(self.inserts[0][0]["message"]["mediaUrl"], "https://cdn/ficha.pdf")
+
+    def test_rejects_empty_or_oversized_broadcasts(self):
+        self.assertEqual(self.client.post("/chat/broadcast", json={"session_ids": [], "message": "x"}).status_code, 400)
+        self.assertEqual(self.client.post("/chat/broadcast", json={"session_ids": ["519"]}).status_code, 400)
+        with patch.object(chat_manager, "BROADCAST_MAX_RECIPIENTS", 2):
+            response = self.client.post("/chat/broadcast", json={"session_ids": ["1", "2", "3"], "message": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import os
+import unittest
+from unittest.mock import AsyncMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes.chats import router
+from services import chat_manager
+from services.chat_events import ChatEventBus, event_key
+from services.chat_pagination import decode_cursor, encode_cursor, time_ns
+
+# Por delante del reloj: las filas de prueba siempre quedan después del primer sondeo
+START = pd.Timestamp.now(tz="UTC") + pd.Timedelta(hours=1)
+
+
+def message(i, session="A", seconds=None):
+    t = START + pd.Timedelta(seconds=seconds if seconds is not None else i)
+    return {"id": i, "session_id": session, "time": t.isoformat(), "message": {"type": "human", "content": f"m{i}"}}
+
+
+class FakeTail:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+
+    async def since(self, since):
+        self.calls.append(since)
+        return [r for r in self.rows if time_ns(r["time"]) >= time_ns(since)]
+
+
+class ChatEventBusTests(unittest.TestCase):
+    def test_publish_fans_out_per_session_and_dedupes_by_id(self):
+        async def scenario():
+            bus = ChatEventBus(FakeTail().since, poll_interval=60)
+            a, everyone = bus.subscribe(["A"]), bus.subscribe()
+            self.assertEqual(bus.publish([message(1, "A"), message(2, "B"), message(1, "A")]), 2)
+            got_a = [a.queue.get_nowait()["data"]["id"] for _ in range(a.queue.qsize())]
+            got_all = [everyone.queue.get_nowait()["data"]["id"] for _ in range(everyone.queue.qsize())]
+            bus.unsubscribe(a)
+            bus.unsubscribe(everyone)
+            return got_a, got_all
+
+        self.assertEqual(asyncio.run(scenario()), ([1], [1, 2]))
+
+    def test_poll_is_shared_and_only_it_advances_the_watermark(self):
+        async def scenario():
+            tail = FakeTail()
+            bus = ChatEventBus(tail.since, poll_interval=60)
+            await bus.poll_once()
+            # Fila propia con reloj adelantado: no debe tapar la fila de n8n anterior
+            bus.publish([message(10, seconds=50)])
+            tail.rows = [message(3, seconds=5), message(4, seconds=5)]
+            await bus.poll_once()
+            return tail, bus
+
+        tail, bus = asyncio.run(scenario())
+        self.assertEqual(len(tail.calls), 2)
+        self.assertEqual(tail.calls[1], tail.calls[0])
+        self.assertEqual(len(bus), 3)
+
+    def test_replay_from_cursor_inside_buffer_and_none_outside(self):
+        async def scenario():
+            bus = ChatEventBus(FakeTail().since, buffer_size=5)
+            await bus.poll_once()
+            bus.publish([message(i, "A" if i % 2 else "B") for i in range(1, 9)])
+            return bus
+
+        bus = asyncio.run(scenario())
+        rows = bus.replay(event_key(message(5)), ["A"])
+        self.assertEqual([r["id"] for r in rows], [7])
+        self.assertEqual([r["id"] for r in bus.replay(event_key(message(5)))], [6, 7, 8])
+        self.assertIsNone(bus.replay(event_key(message(2))))
+
+
+class ChatWebSocketTests(unittest.TestCase):
+    def setUp(self):
+        self.tail = FakeTail()
+        patcher = patch.object(chat_manager, "CHAT_EVENTS", ChatEventBus(self.tail.since, poll_interval=0.01))
+        self.bus = patcher.start()
+        self.addCleanup(patcher.stop)
+        app = FastAPI()
+        app.include_router(router)
+        self.client = TestClient(app)
+
+    def test_streams_subscribed_sessions_and_resumes_from_cursor(self):
+        with self.client.websocket_connect("/chat/ws?session_ids=A") as ws:
+            self.tail.rows.extend([message(1, "B"), message(2, "A")])
+            first = ws.receive_json()
+            self.assertEqual(first["data"]["id"], 2)
+            self.assertEqual(decode_cursor(first["cursor"]), event_key(message(2)))
+
+            ws.send_json({"action": "subscribe", "session_ids": ["B"]})
+            ws.send_json({"action": "ping"})
+            self.tail.rows.append(message(3, "A"))
+            self.assertEqual(ws.receive_json()["data"]["id"], 3)
+
+        self.tail.rows.extend([message(4, "B"), message(5, "A")])
+        with self.client.websocket_connect(f"/chat/ws?session_ids=A&cursor={first['cursor']}") as ws:
+            self.assertEqual([ws.receive_json()["data"]["id"] for _ in range(2)], [3, 5])
+
+    def test_invalid_cursor_closes_the_socket(self):
+        with self.assertRaises(Exception):
+            with self.client.websocket_connect("/chat/ws?cursor=nope") as ws:
+                ws.receive_json()
+
+
+class ChatUpdatesTests(unittest.TestCase):
+    def setUp(self):
+        self.tail = FakeTail()
+        patcher = patch.object(chat_manager, "CHAT_EVENTS", ChatEventBus(self.tail.since, poll_interval=60))
+        self.bus = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = AsyncMock(return_value=[message(99)])
+        patcher = patch.object(chat_manager, "_fetch_messages_after", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_polls_share_one_query_and_start_from_the_tip(self):
+        async def scenario():
+            return await asyncio.gather(*(chat_manager.get_new_messages_since(limit=10) for _ in range(20)))
+
+        results = asyncio.run(scenario())
+        self.assertEqual(len(self.tail.calls), 1)
+        self.assertTrue(all(r["data"] == [] and r["next_since"] for r in results))
+        self.assertEqual(asyncio.run(chat_manager.get_new_messages_since()), [])
+
+    def test_cursor_pages_are_limited_filtered_and_tie_safe(self):
+        start = asyncio.run(chat_manager.get_new_messages_since(limit=10))["next_since"]
+        # Tres filas por segundo: los cortes de página caen entre filas con el mismo time
+        self.tail.rows = [message(i, "A" if i % 5 else "B", seconds=1 + i // 3) for i in range(1, 31)]
+        self.bus._polled_at = 0.0
+
+        async def drain(cursor):
+            seen = []
+            while True:
+                page = await chat_manager.get_new_messages_since(limit=4, session_ids=["A"], cursor=cursor)
+                if not page["data"]:
+                    return seen, page["next_since"]
+                self.assertLessEqual(len(page["data"]), 4)
+                seen += [r["id"] for r in page["data"]]
+                cursor = page["next_since"]
+
+        seen, last = asyncio.run(drain(start))
+        self.assertEqual(seen, [i for i in range(1, 31) if i % 5])
+        self.assertEqual(decode_cursor(last), event_key(message(29, seconds=1 + 29 // 3)))
+        self.db.assert_not_awaited()
+
+    def test_cursor_older_than_the_buffer_goes_to_the_database(self):
+        old = encode_cursor(time_ns((START - pd.Timedelta(hours=2)).isoformat()), 1)
+        page = asyncio.run(chat_manager.get_new_messages_since(limit=5, session_ids=["A"], cursor=old))
+        self.assertEqual([r["id"] for r in page["data"]], [99])
+        self.db.assert_awaited_once_with(decode_cursor(old), ["A"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
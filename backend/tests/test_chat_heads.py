@@ -0,0 +1,116 @@
+import asyncio
+import random
+import unittest
+
+from services.chat_heads import ConversationHeads
+from services.chat_pagination import decode_cursor, encode_cursor
+
+
+def make_messages(n, sessions=40, seed=3):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(1, n + 1):
+        rows.append({
+            "id": i,
+            "session_id": f"519{rnd.randrange(sessions):08d}",
+            "time": f"2025-03-{rnd.randint(1, 28):02d}T{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:00",
+            "message": {"type": "human", "content": f"mensaje {i}"},
+        })
+    return rows
+
+
+def legacy_heads(rows):
+    """get_active_conversations previo: todo el histórico por time desc, primera fila por sesión."""
+    sessions = {}
+    for row in sorted(rows, key=lambda r: (r["time"], r["id"]), reverse=True):
+        sessions.setdefault(row["session_id"], row)
+    return list(sessions.values())
+
+
+class FakeChatTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.by_ids_calls = []
+        self.since_calls = []
+
+    async def index(self):
+        return [{k: r[k] for k in ("id", "session_id", "time")} for r in self.rows]
+
+    async def by_ids(self, ids):
+        self.by_ids_calls.append(len(ids))
+        wanted = set(ids)
+        return [r for r in self.rows if r["id"] in wanted]
+
+    async def since(self, since):
+        self.since_calls.append(since)
+        return [r for r in self.rows if r["time"] >= since]
+
+
+class ConversationHeadsTests(unittest.TestCase):
+    def setUp(self):
+        self.table = FakeChatTable(make_messages(2000))
+        self.heads = ConversationHeads(self.table.index, self.table.by_ids, self.table.since, refresh_interval=0)
+
+    def test_seed_matches_legacy_and_fetches_only_head_rows(self):
+        asyncio.run(self.heads.ensure_fresh())
+        rows, last = self.heads.page()
+        self.assertEqual(rows, legacy_heads(self.table.rows))
+        self.assertIsNone(last)
+        self.assertEqual(self.table.by_ids_calls, [len(rows)])
+
+    def test_cursor_pages_cover_every_session_once(self):
+        asyncio.run(self.heads.ensure_fresh())
+        seen, cursor = [], None
+        while True:
+            after = decode_cursor(cursor)
+            rows, last = self.heads.page(7, (-after[0], -after[1]) if after else None)
+            seen.extend(rows)
+            if last is None:
+                break
+            cursor = encode_cursor(-last[0], -last[1])
+        self.assertEqual(seen, legacy_heads(self.table.rows))
+
+    def test_writes_and_tail_move_sessions_to_the_top(self):
+        asyncio.run(self.heads.ensure_fresh())
+        old_last = self.heads.page()[0][-1]
+        seeded_high = max(r["time"] for r in self.table.rows)
+
+        # write-through (persist_message)
+        mine = {"id": 5001, "session_id": old_last["session_id"], "time": "2025-04-01T10:00:00", "message": {}}
+        self.heads.record(mine)
+        self.assertEqual(self.heads.page(1)[0], [mine])
+
+        # fila del bot escrita directo en la tabla: llega por la lectura incremental
+        bot = {"id": 5002, "session_id": "51900000999", "time": "2025-04-01T10:05:00", "message": {}}
+        self.table.rows.extend([mine, bot])
+        asyncio.run(self.heads.ensure_fresh())
+        # la marca sale de lo leído de la tabla, no de la fila propia
+        self.assertEqual(self.table.since_calls, [seeded_high])
+        self.assertEqual(self.heads.page(2)[0], [bot, mine])
+        self.assertEqual(len(self.heads), len(legacy_heads(self.table.rows)))
+
+        # una fila más vieja de una sesión no desplaza su cabeza
+        self.heads.record({"id": 5003, "session_id": bot["session_id"], "time": "2025-01-01T00:00:00"})
+        self.assertEqual(self.heads.page(1)[0], [bot])
+
+    def test_local_write_does_not_hide_earlier_n8n_rows(self):
+        asyncio.run(self.heads.ensure_fresh())
+        session_ids = [r["session_id"] for r in self.heads.page()[0]]
+
+        # fila propia con el reloj local adelantado
+        mine = {"id": 6001, "session_id": session_ids[0], "time": "2025-04-01T12:00:00", "message": {}}
+        self.heads.record(mine)
+        self.table.rows.append(mine)
+        # n8n escribe después, pero con una hora anterior a la de nuestra fila
+        bot = {"id": 6002, "session_id": session_ids[-1], "time": "2025-04-01T11:59:00", "message": {}}
+        self.table.rows.append(bot)
+
+        asyncio.run(self.heads.ensure_fresh())
+        self.assertEqual(self.heads.page(2)[0], [mine, bot])
+
+        asyncio.run(self.heads.ensure_fresh())
+        self.assertEqual(self.table.since_calls[-1], "2025-04-01T12:00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
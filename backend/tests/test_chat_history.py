@@ -0,0 +1,91 @@
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+
+from fastapi import HTTPException
+
+from benchmarks.fake_postgrest import FakePostgrest
+from services import chat_manager
+from services.database_manager import SupabaseManager
+
+SESSION = "51999999999"
+
+
+def make_history(n):
+    """Mensajes de SESSION (y de otra sesión intercalada); cada 3 comparten marca de tiempo."""
+    rows = []
+    for i in range(1, n + 1):
+        rows.append({
+            "id": i,
+            "session_id": SESSION if i % 4 else "51888888888",
+            "time": f"2025-03-01T10:{(i // 3) // 60:02d}:{(i // 3) % 60:02d}+00:00",
+            "message": {
+                "type": "human",
+                "content": f"mensaje {i}",
+                "media": {"kind": "image", "url": f"https://cdn/{i}.jpg", "whatsapp_media_id": f"wa-{i}"},
+                "tool_calls": [],
+                "response_metadata": {"tokens": i},
+            },
+        })
+    return rows
+
+
+class ChatHistoryPaginationTests(unittest.TestCase):
+    def setUp(self):
+        self.rows = make_history(300)
+        self.session_rows = sorted(
+            (r for r in self.rows if r["session_id"] == SESSION), key=lambda r: (r["time"], r["id"]),
+        )
+        self.server = FakePostgrest({"n8n_chat_pravi": self.rows}).start()
+        self.addCleanup(self.server.stop)
+        patcher = patch.object(chat_manager, "supabase", SupabaseManager(self.server.url, "dummy"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, **kwargs):
+        return asyncio.run(chat_manager.get_conversations_messages(SESSION, **kwargs))
+
+    def test_without_params_returns_full_history(self):
+        self.assertEqual(self.fetch(), self.session_rows)
+
+    def test_backward_pages_cover_history_without_gaps_or_repeats(self):
+        page = self.fetch(limit=20)
+        self.assertEqual(page["data"], self.session_rows[-20:])
+        collected = page["data"]
+        while page["before_cursor"]:
+            page = self.fetch(limit=20, before=page["before_cursor"])
+            collected = page["data"] + collected
+        self.assertEqual(collected, self.session_rows)
+
+    def test_after_cursor_returns_only_newer_messages(self):
+        page = self.fetch(limit=50)
+        middle = self.fetch(limit=20, before=page["before_cursor"])
+        newer = self.fetch(limit=50, after=middle["after_cursor"])
+        self.assertEqual(newer["data"], page["data"])
+        self.assertIsNone(newer["before_cursor"])
+
+        idle = self.fetch(limit=50, after=page["after_cursor"])
+        self.assertEqual(idle["data"], [])
+        self.assertEqual(idle["after_cursor"], page["after_cursor"])
+
+    def test_slim_view_drops_heavy_message_fields(self):
+        row = self.fetch(limit=1, view="slim")["data"][0]
+        self.assertEqual(row["id"], self.session_rows[-1]["id"])
+        self.assertEqual(set(row["message"]), {"type", "content", "media"})
+        self.assertEqual(set(row["message"]["media"]), {"kind", "url"})
+
+    def test_invalid_or_conflicting_cursors_are_rejected(self):
+        with self.assertRaises(HTTPException):
+            self.fetch(limit=10, before="no-es-un-cursor")
+        cursor = self.fetch(limit=10)["before_cursor"]
+        with self.assertRaises(HTTPException):
+            self.fetch(limit=10, before=cursor, after=cursor)
+
+
+if __name__ == "__main__":
+    unittest.main()
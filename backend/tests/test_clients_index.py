@@ -0,0 +1,51 @@
+import unittest
+
+from services.clients_index import DerivedLabelIndex
+from services.clients_snapshot import ClientsSnapshot
+from services.database_module import DataProcessor
+from tests.test_derivation_parity import make_clients
+
+
+class DerivedLabelIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.df = ClientsSnapshot._sort(DataProcessor.transform_data(make_clients(1500, seed=11)))
+        self.index = DerivedLabelIndex()
+        self.index.rebuild(self.df)
+
+    def expected_ids(self, df, filters):
+        return DataProcessor.filter_data(df, filters)["id"].tolist()
+
+    def assert_pages_match(self, df, **filters):
+        expected = self.expected_ids(df, filters)
+        ids, total = self.index.page(20, 20, **filters)
+        self.assertEqual(total, len(expected))
+        self.assertEqual(ids, expected[20:40])
+
+    def test_single_label_pages_follow_table_order(self):
+        self.assert_pages_match(self.df, seguimiento="No Cliente")
+        self.assert_pages_match(self.df, calificacion="2: Cliente Interesado")
+        self.assert_pages_match(self.df, calificacion_nivel=5)
+
+    def test_combined_labels_intersect(self):
+        self.assert_pages_match(self.df, seguimiento="Seguimiento", calificacion_nivel=2)
+        self.assert_pages_match(self.df, seguimiento="no cliente", calificacion="5: Cliente Calificado")
+
+    def test_upsert_moves_changed_clients(self):
+        changed = make_clients(3, seed=99)
+        for i, row in enumerate(changed):
+            row.update({"id": i + 1, "ultima_interaccion": "2099-01-01T00:00:00+00:00", "cita": None,
+                        "planos": "", "tiempo": "", "estilo": "", "presupuesto": None,
+                        "toma_decision": "", "categoria": ""})
+        delta_df = DataProcessor.transform_data(changed)
+        self.index.upsert(delta_df)
+        merged = ClientsSnapshot._merge(self.df, delta_df)
+
+        ids, total = self.index.page(0, 3, calificacion_nivel=0)
+        self.assertEqual(ids, [1, 2, 3])
+        self.assertEqual(total, len(self.expected_ids(merged, {"calificacion_nivel": 0})))
+        self.assertEqual(len(self.index), len(merged))
+        self.assert_pages_match(merged, calificacion="5: Cliente Calificado")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+from services.clients_snapshot import ClientsSnapshot
+
+
+def make_row(id_, ultima, nombre="Cliente"):
+    return {
+        "id": id_,
+        "primera_interaccion": "2025-01-01T10:00:00+00:00",
+        "ultima_interaccion": ultima,
+        "nombre": nombre,
+        "categoria": "Casa",
+        "seguimiento": "NO",
+        "tipo_cliente": "",
+    }
+
+
+class FakeSource:
+    def __init__(self, rows):
+        self.rows = rows
+        self.full_calls = 0
+        self.since_calls = []
+
+    async def fetch_all(self):
+        self.full_calls += 1
+        await asyncio.sleep(0.01)
+        return list(self.rows)
+
+    async def fetch_since(self, since):
+        self.since_calls.append(since)
+        return [r for r in self.rows if r["ultima_interaccion"] >= "2025-02-01T00:00:00+00:00"]
+
+
+class ClientsSnapshotTests(unittest.TestCase):
+    def test_concurrent_cold_misses_share_one_fetch(self):
+        source = FakeSource([make_row(1, "2025-01-05T00:00:00+00:00")])
+        snapshot = ClientsSnapshot(source.fetch_all, source.fetch_since, ttl=60, full_ttl=900)
+
+        async def run():
+            return await asyncio.gather(*(snapshot.get() for _ in range(10)))
+
+        frames = asyncio.run(run())
+        self.assertEqual(source.full_calls, 1)
+        self.assertTrue(all(f is frames[0] for f in frames))
+        self.assertEqual(len(frames[0]), 1)
+
+    def test_expired_snapshot_refreshes_incrementally(self):
+        source = FakeSource([
+            make_row(1, "2025-01-05T00:00:00+00:00", "Ana"),
+            make_row(2, "2025-01-03T00:00:00+00:00", "Luis"),
+        ])
+        snapshot = ClientsSnapshot(source.fetch_all, source.fetch_since, ttl=0, full_ttl=900)
+
+        async def run():
+            await snapshot.get()
+            source.rows = [
+                make_row(1, "2025-01-05T00:00:00+00:00", "Ana"),
+                make_row(2, "2025-02-10T00:00:00+00:00", "Luis actualizado"),
+                make_row(3, "2025-02-11T00:00:00+00:00", "Nuevo"),
+            ]
+            return await snapshot.get()
+
+        df = asyncio.run(run())
+        self.assertEqual(source.full_calls, 1)
+        self.assertEqual(len(source.since_calls), 1)
+        self.assertTrue(source.since_calls[0].startswith("2025-01-05T00:00:00"))
+        self.assertEqual(df["id"].tolist(), [3, 2, 1])
+        self.assertEqual(df.loc[df["id"] == 2, "nombre"].iloc[0], "Luis actualizado")
+
+    def test_invalidate_forces_full_reload(self):
+        source = FakeSource([make_row(1, "2025-01-05T00:00:00+00:00")])
+        snapshot = ClientsSnapshot(source.fetch_all, source.fetch_since, ttl=60, full_ttl=900)
+
+        async def run():
+            await snapshot.get()
+            snapshot.invalidate()
+            await snapshot.get()
+
+        asyncio.run(run())
+        self.assertEqual(source.full_calls, 2)
+        self.assertEqual(source.since_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
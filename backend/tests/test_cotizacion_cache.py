@@ -0,0 +1,134 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes.cotizaciones import get_cotiz_dashboard, router as cotizaciones_router
+from services.cotizacion_cache import CotizacionesFrameCache
+from services.cotizacion_dashboard import CotizacionDashboard
+from services.cotizacion_frame import CACHED_COLUMNS, build_frame
+from tests.test_cotizacion_frame import make_cotizaciones
+
+
+class SlowLoader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+        self.release = None
+
+    async def load(self):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        await asyncio.sleep(0)
+        return build_frame(list(self.rows), CACHED_COLUMNS)
+
+
+class FrameCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.loader = SlowLoader(make_cotizaciones(50))
+
+    def test_concurrent_cold_reads_share_one_load_and_fresh_reads_skip_it(self):
+        cache = CotizacionesFrameCache(self.loader.load, CACHED_COLUMNS, ttl=60)
+
+        async def run():
+            frames = await asyncio.gather(*(cache.get(("estilo", "precio_final")) for _ in range(5)))
+            await cache.get()
+            return frames
+
+        frames = asyncio.run(run())
+        self.assertEqual(self.loader.calls, 1)
+        self.assertEqual(list(frames[0].columns), ["id", "precio_final", "estilo"])
+
+    def test_stale_while_revalidate_returns_old_frame_and_reloads_in_background(self):
+        cache = CotizacionesFrameCache(self.loader.load, CACHED_COLUMNS, ttl=0, stale_while_revalidate=True)
+
+        async def run():
+            first = await cache.get()
+            self.loader.rows.extend(make_cotizaciones(60)[50:])
+            self.loader.release = asyncio.Event()
+            stale = await cache.get()  # no espera la recarga
+            self.loader.release.set()
+            await cache._inflight
+            return first, stale, cache._df
+
+        first, stale, refreshed = asyncio.run(run())
+        self.assertEqual((len(first), len(stale), len(refreshed)), (50, 50, 60))
+        self.assertEqual(self.loader.calls, 2)
+
+    def test_invalidate_discards_frame_and_in_flight_load(self):
+        cache = CotizacionesFrameCache(self.loader.load, CACHED_COLUMNS, ttl=60)
+
+        async def run():
+            self.loader.release = asyncio.Event()
+            waiting = asyncio.ensure_future(cache.get())
+            await asyncio.sleep(0)
+            cache.invalidate()  # la descarga en curso no debe reponer el frame
+            self.loader.rows.extend(make_cotizaciones(60)[50:])
+            self.loader.release.set()
+            return await waiting
+
+        df = asyncio.run(run())
+        self.assertEqual(len(df), 60)
+        self.assertEqual(self.loader.calls, 2)
+
+
+class DashboardSharedFrameTests(unittest.TestCase):
+    def setUp(self):
+        CotizacionDashboard._frames = None
+        self.addCleanup(setattr, CotizacionDashboard, "_frames", None)
+        self.rows = make_cotizaciones(300)
+        self.selects = []
+
+    def _dashboard(self):
+        dash = CotizacionDashboard.__new__(CotizacionDashboard)
+
+        async def fake_scan(columns, *args, **kwargs):
+            self.selects.append(columns)
+            keep = columns.split(",")
+            return [{c: r.get(c) for c in keep} for r in self.rows]
+
+        dash._scan = fake_scan
+        return dash
+
+    @patch("services.cotizacion_dashboard.COTIZ_FRAME_TTL", 60)
+    def test_summary_and_tops_share_one_download_until_invalidated(self):
+        dash = self._dashboard()
+
+        async def run():
+            await dash.summary()
+            await dash.top_estilo()
+            await dash.top_distrito()
+            dash.invalidate_cache()
+            await self._dashboard().summary()  # otra instancia usa el mismo frame
+
+        asyncio.run(run())
+        self.assertEqual(self.selects, ["id,precio_final,area_m2,estilo,distrito"] * 2)
+
+    def test_invalidate_endpoint_requires_internal_token(self):
+        dash = MagicMock()
+        app = FastAPI()
+        app.include_router(cotizaciones_router)
+        app.dependency_overrides[get_cotiz_dashboard] = lambda: dash
+        client = TestClient(app)
+
+        with patch.dict(os.environ, {"INTERNAL_MEDIA_TOKEN": "test-token"}):
+            denied = client.post("/cotizaciones/cache/invalidate")
+            wrong = client.post("/cotizaciones/cache/invalidate", headers={"X-Internal-Token": "otro"})
+            self.assertEqual((denied.status_code, wrong.status_code), (401, 401))
+            dash.invalidate_cache.assert_not_called()
+
+            ok = client.post("/cotizaciones/cache/invalidate", headers={"X-Internal-Token": "test-token"})
+        self.assertEqual(ok.json(), {"ok": True})
+        dash.invalidate_cache.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import unittest
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+import random
+from unittest.mock import patch
+
+import pandas as pd
+
+from services.cotizacion_dashboard import CotizacionDashboard
+from services.cotizacion_frame import build_frame, epoch_to_datetime
+
+ESTILOS = ["Moderno", "Minimalista", "Rústico", "Industrial", "Clásico", None]
+DISTRITOS = ["Miraflores", "San Isidro", "Surco", "La Molina", "Barranco", "Lince", None]
+
+
+def make_cotizaciones(n, seed=7):
+    """Cotizaciones sintéticas con nulos en todas las columnas opcionales."""
+    rnd = random.Random(seed)
+    start = pd.Timestamp("2024-01-01", tz="UTC")
+    rows = []
+    for i in range(1, n + 1):
+        fecha = start + pd.Timedelta(minutes=rnd.randint(0, 60 * 24 * 600))
+        rows.append({
+            "id": i,
+            "fecha_hora": fecha.isoformat() if rnd.random() > 0.02 else None,
+            "created_at": (fecha + pd.Timedelta(seconds=30)).isoformat(),
+            "precio_final": round(rnd.uniform(800, 250_000), 2) if rnd.random() > 0.1 else None,
+            "area_m2": round(rnd.uniform(4, 400), 1) if rnd.random() > 0.15 else None,
+            "estilo": rnd.choice(ESTILOS),
+            "distrito": rnd.choice(DISTRITOS),
+        })
+    return rows
+
+
+def legacy_frame(rows):
+    """_df previo: object para etiquetas, float64 y datetime64 para el resto."""
+    df = pd.DataFrame(rows)
+    for col in ["fecha_hora", "created_at"]:
+        df[col] = pd.to_datetime(df[col], errors="coerce", utc=True)
+    df["precio_final"] = pd.to_numeric(df["precio_final"], errors="coerce")
+    df["area_m2"] = pd.to_numeric(df["area_m2"], errors="coerce")
+    return df
+
+
+def legacy_top(df, column, limit):
+    g = (
+        df.assign(**{column: df[column].fillna("—")})
+          .groupby(column)
+          .agg(total=("id", "count"),
+               suma_precio=("precio_final", lambda x: pd.to_numeric(x, errors="coerce").fillna(0).sum()),
+               promedio=("precio_final", lambda x: pd.to_numeric(x, errors="coerce").dropna().mean() or 0))
+          .reset_index()
+          .sort_values("suma_precio", ascending=False)
+          .head(limit)
+    )
+    return [
+        {"label": r[column], "total": int(r["total"]), "suma_precio": float(r["suma_precio"]), "promedio": float(r["promedio"] or 0)}
+        for _, r in g.iterrows()
+    ]
+
+
+class CompactFrameTests(unittest.TestCase):
+    def setUp(self):
+        self.rows = make_cotizaciones(2000)
+        self.dash = CotizacionDashboard.__new__(CotizacionDashboard)
+        self.selects = []
+
+        async def fake_scan(columns, *args, **kwargs):
+            self.selects.append(columns)
+            keep = columns.split(",")
+            return [{c: r.get(c) for c in keep} for r in self.rows]
+
+        self.dash._scan = fake_scan
+
+    def assertTopEqual(self, got, expected):
+        self.assertEqual([(r["label"], r["total"]) for r in got], [(r["label"], r["total"]) for r in expected])
+        for g, e in zip(got, expected):
+            self.assertAlmostEqual(g["suma_precio"], e["suma_precio"], places=4)
+            self.assertAlmostEqual(g["promedio"], e["promedio"], places=6)
+
+    def test_dtypes_and_timestamps_round_trip(self):
+        df = build_frame(self.rows)
+        self.assertEqual(str(df["estilo"].dtype), "category")
+        self.assertEqual(str(df["area_m2"].dtype), "float32")
+        self.assertEqual(str(df["precio_final"].dtype), "float64")
+        self.assertEqual(str(df["fecha_hora"].dtype), "int64")
+        legacy = legacy_frame(self.rows)
+        pd.testing.assert_series_equal(
+            epoch_to_datetime(df["fecha_hora"]), legacy["fecha_hora"], check_dtype=False
+        )
+
+    @patch("services.cotizacion_dashboard.COTIZ_FRAME_TTL", 0)  # sin frame compartido: cada endpoint proyecta lo suyo
+    def test_endpoints_project_columns_and_match_legacy(self):
+        legacy = legacy_frame(self.rows)
+        self.assertTopEqual(asyncio.run(self.dash.top_estilo(5)), legacy_top(legacy, "estilo", 5))
+        self.assertTopEqual(asyncio.run(self.dash.top_distrito(10)), legacy_top(legacy, "distrito", 10))
+
+        summary = asyncio.run(self.dash.summary())
+        self.assertEqual(summary["total_cotizaciones"], len(self.rows))
+        self.assertAlmostEqual(summary["suma_precio"], float(legacy["precio_final"].fillna(0).sum()), places=4)
+        self.assertAlmostEqual(summary["m2_promedio"], float(legacy["area_m2"].dropna().mean()), places=3)
+
+        self.assertEqual(self.selects, ["id,precio_final,estilo", "id,precio_final,distrito", "id,precio_final,area_m2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+import asyncio
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import pandas as pd
+import pytz
+
+from services.cotizacion_rollup import MonthlyRollup, month_start_utc
+
+
+class FakeMonthSource:
+    """Filas en memoria filtradas como _month_rows: [start, end) por fecha_hora e id > after_id."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def fetch(self, start_utc, end_utc, after_id):
+        self.calls.append((start_utc, end_utc, after_id))
+        start = pd.Timestamp(start_utc)
+        end = pd.Timestamp(end_utc) if end_utc else None
+        return [
+            r for r in self.rows
+            if pd.Timestamp(r["fecha_hora"]) >= start
+            and (end is None or pd.Timestamp(r["fecha_hora"]) < end)
+            and (after_id is None or r["id"] > after_id)
+        ]
+
+
+def _row(id_, local, precio, tz="America/Lima"):
+    when = pytz.timezone(tz).localize(local).astimezone(pytz.UTC).isoformat()
+    return {"id": id_, "fecha_hora": when, "precio_final": precio}
+
+
+NOW = datetime(2025, 3, 15, 12, tzinfo=pytz.UTC)
+
+
+class MonthlyRollupTests(unittest.TestCase):
+    def setUp(self):
+        self.source = FakeMonthSource([
+            _row(1, datetime(2025, 1, 1, 0, 30), 100),   # 1 ene hora Lima, 31 dic no
+            _row(2, datetime(2025, 1, 31, 23, 0), 50),
+            _row(3, datetime(2025, 2, 10), None),
+            _row(4, datetime(2025, 3, 2), 10),
+        ])
+        self.rollup = MonthlyRollup(refresh_interval=0, current_ttl=3600)
+
+    def _series(self, months_back=3):
+        with mock.patch("services.cotizacion_rollup.datetime") as dt:
+            dt.now.return_value = NOW
+            dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
+            return asyncio.run(self.rollup.series(self.source.fetch, months_back, "America/Lima"))
+
+    def test_series_groups_by_local_month(self):
+        serie = self._series()
+        self.assertEqual(
+            serie,
+            [
+                {"x": "2025-01", "total": 2, "suma_precio": 150.0},
+                {"x": "2025-02", "total": 1, "suma_precio": 0.0},
+                {"x": "2025-03", "total": 1, "suma_precio": 10.0},
+            ],
+        )
+
+    def test_closed_months_are_read_once_and_current_month_incrementally(self):
+        self._series()
+        self.source.rows.append(_row(5, datetime(2025, 3, 14), 5))
+        self.source.calls.clear()
+
+        serie = self._series()
+
+        # solo una lectura incremental del mes en curso, desde el último id visto
+        self.assertEqual(len(self.source.calls), 1)
+        self.assertEqual(self.source.calls[0][2], 4)
+        self.assertEqual(serie[-1], {"x": "2025-03", "total": 2, "suma_precio": 15.0})
+
+        # sin filas nuevas no se vuelve a sumar
+        self.assertEqual(self._series()[-1]["total"], 2)
+
+    def test_wider_window_only_loads_missing_months(self):
+        self._series(months_back=2)
+        self.source.calls.clear()
+        serie = self._series(months_back=3)
+        self.assertEqual(serie[0]["x"], "2025-01")
+        closed_reads = [c for c in self.source.calls if c[2] is None]
+        self.assertEqual(closed_reads, [(
+            month_start_utc(pd.Period("2025-01", freq="M"), "America/Lima"),
+            month_start_utc(pd.Period("2025-02", freq="M"), "America/Lima"),
+            None,
+        )])
+
+
+if __name__ == "__main__":
+    unittest.main()
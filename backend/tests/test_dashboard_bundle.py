@@ -0,0 +1,46 @@
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import dashboard as dashboard_routes
+from services.database_module import DataProcessor
+from tests.test_derivation_parity import make_clients
+
+
+class DashboardBundleRouteTests(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(dashboard_routes.router)
+        self.client = TestClient(app)
+        self.df = DataProcessor.transform_data(make_clients(300))
+
+    def test_bundle_loads_dataframe_once_for_all_sections(self):
+        calls = []
+
+        async def fake_get_dataframe():
+            calls.append(1)
+            return self.df
+
+        with patch.object(dashboard_routes.dashboard, "_get_dataframe", fake_get_dataframe):
+            response = self.client.get("/dashboard/bundle", params={"sections": "metrics,followup,new-this-month"})
+            single = self.client.get("/dashboard/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(sorted(body), ["followup", "metrics", "new-this-month"])
+        self.assertEqual(body["metrics"], single.json())
+        self.assertEqual(len(calls), 2)  # bundle + /metrics
+
+    def test_bundle_rejects_unknown_sections(self):
+        response = self.client.get("/dashboard/bundle", params={"sections": "metrics,nope"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import unittest
+
+import pandas as pd
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+from services.dashboard_manager import DashboardManager
+from services.dashboard_stream import STREAMING_SECTIONS, MeanMedianAccumulator
+from services.database_module import DataProcessor
+from tests.test_derivation_parity import make_clients
+
+
+class FakePagedManager:
+    def __init__(self, rows):
+        self.rows = rows
+        self.ranges = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_total_count(self, table="clients_pravi"):
+        return len(self.rows)
+
+    async def get_clients_range(self, start, end, table="clients_pravi", order_by="id"):
+        self.ranges.append((start, end))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return self.rows[start:end + 1]
+
+    async def get_clients_dataframe(self, table="clients_pravi"):
+        return DataProcessor.transform_data(self.rows)
+
+
+class DashboardStreamingTests(unittest.TestCase):
+    def test_streaming_sections_match_full_dataframe(self):
+        manager = FakePagedManager(make_clients(2500, seed=4))
+        sections = sorted(STREAMING_SECTIONS)
+
+        streamed = asyncio.run(DashboardManager(manager, streaming=True).get_bundle(sections))
+        full = asyncio.run(DashboardManager(manager, streaming=False).get_bundle(sections))
+
+        self.assertEqual(len(manager.ranges), 3)
+        self.assertLessEqual(manager.max_in_flight, 4)
+        for name in sections:
+            if name == "response-times":
+                self.assertEqual(streamed[name]["promedio_dias"], full[name]["promedio_dias"])
+                self.assertAlmostEqual(streamed[name]["mediana_dias"], full[name]["mediana_dias"], delta=0.01)
+            else:
+                self.assertEqual(streamed[name], full[name], name)
+
+    def test_non_streaming_sections_fall_back_to_dataframe(self):
+        manager = FakePagedManager(make_clients(50))
+        bundle = asyncio.run(DashboardManager(manager, streaming=True).get_bundle(["qualification-distribution"]))
+        self.assertEqual(manager.ranges, [])
+        self.assertIn("qualification-distribution", bundle)
+
+    def test_median_accumulator_handles_even_counts(self):
+        acc = MeanMedianAccumulator(resolution=0.01)
+        acc.update(pd.Series([1.0, 2.0]))
+        acc.update(pd.Series([3.0, 10.0]))
+        self.assertAlmostEqual(acc.median(), 2.5)
+        self.assertAlmostEqual(acc.mean(), 4.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from services.database_module import DataProcessor
+
+
+# ---------- Referencia fila a fila (implementación anterior) ----------
+def legacy_calculate_qualification(row: pd.Series) -> str:
+    if pd.notna(row.get("cita")):
+        return "5: Cliente Calificado"
+    if bool(row.get("planos")):
+        return "4: Cliente Pre-Calificado"
+    if pd.notna(row.get("tiempo")) and row.get("tiempo") != "":
+        return "3: Cliente Potencial"
+    if any(pd.notna(row.get(col)) and row.get(col) != "" for col in ["estilo", "presupuesto", "toma_decision", "categoria"]):
+        return "2: Cliente Interesado"
+    if pd.notna(row.get("categoria")) and row.get("categoria") != "":
+        return "1: Cliente Frío"
+    return "0: Sin avance"
+
+
+def legacy_limpiar_seguimiento(df: pd.DataFrame) -> pd.DataFrame:
+    no_cliente_keywords = ['proveedor', 'consulta de trabajo', 'mensaje raro']
+
+    def es_no_cliente(row):
+        combined = ''.join([
+            str(row.get('categoria') or '').lower(),
+            str(row.get('estilo') or '').lower(),
+            str(row.get('resumen') or '').lower()
+        ])
+        return any(k in combined for k in no_cliente_keywords)
+
+    df['es_no_cliente'] = df.apply(es_no_cliente, axis=1)
+    ahora = datetime.utcnow()
+
+    def actualizar_seguimiento(row):
+        if row['es_no_cliente']:
+            return 'No Cliente'
+        if row['tipo_cliente'] == "Con Cita":
+            return 'Agendado'
+        if row['seguimiento'] == 'SI' and pd.notnull(row['ultimo_seguimiento']):
+            if (ahora - row['ultimo_seguimiento']) <= timedelta(days=30):
+                return 'Seguimiento'
+        return 'No Cliente'
+
+    df['seguimiento'] = df.apply(actualizar_seguimiento, axis=1)
+    return df
+
+
+def legacy_transform_data(supabase_data):
+    keys = [
+        ("id", None), ("primera_interaccion", ''), ("ultima_interaccion", ''), ("telefono", ''),
+        ("nombre", ''), ("categoria", ''), ("estilo", ''), ("presupuesto", None), ("toma_decision", ''),
+        ("tiempo", ''), ("tiempo_meses", None), ("planos", ''), ("cita", ''), ("calificacion", ''),
+        ("resumen", ''), ("correo", ''), ("seguimiento", 'NO'), ("ultimo_seguimiento", None), ("tipo_cliente", ''),
+    ]
+    df = pd.DataFrame([{k: item.get(k, d) for k, d in keys} for item in supabase_data])
+    for col in ['primera_interaccion', 'ultima_interaccion', 'cita', 'ultimo_seguimiento']:
+        df[col] = pd.to_datetime(df[col], errors='coerce').dt.tz_localize(None)
+    df['seguimiento'] = df['seguimiento'].astype(str).str.strip()
+    df = legacy_limpiar_seguimiento(df)
+    meses_es = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+                "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+    df['hora_contacto'] = df['primera_interaccion'].dt.hour
+    df['mes_num'] = df['primera_interaccion'].dt.month
+    df['mes'] = df['mes_num'].apply(
+        lambda x: meses_es[int(x) - 1] if pd.notna(x) and int(x) in range(1, 13) else "Desconocido"
+    )
+    df['año'] = df['primera_interaccion'].dt.year
+    df['tiene_cita'] = ~df['cita'].isna()
+    df['hora_cita'] = df['cita'].dt.hour
+    df['tiempo_meses'] = pd.to_numeric(df['tiempo_meses'], errors='coerce')
+    df['calificacion'] = df.apply(legacy_calculate_qualification, axis=1)
+    return df
+
+
+# ---------- Generador de filas tipo clients_pravi ----------
+def make_clients(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def iso(dt):
+        return dt.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+    def pick(*options):
+        return rng.choice(options)
+
+    rows = []
+    for i in range(n):
+        # días enteros +/- 6h para no caer justo en el límite de 30 días
+        seg_age = timedelta(days=rng.randint(0, 60), hours=pick(6, -6))
+        rows.append({
+            "id": i + 1,
+            "primera_interaccion": pick(iso(now - timedelta(days=rng.randint(0, 400))), None),
+            "ultima_interaccion": iso(now - timedelta(hours=rng.randint(0, 5000))),
+            "telefono": f"519{rng.randint(10000000, 99999999)}",
+            "nombre": pick("Ana", "Luis", "", None),
+            "categoria": pick("Casa", "Departamento", "Proveedor de muebles", "", None),
+            "estilo": pick("Moderno", "Nórdico", "consulta de TRABAJO", "", None),
+            "presupuesto": pick(None, 15000, 32000.5, ""),
+            "toma_decision": pick("Inmediata", "", None),
+            "tiempo": pick("1 mes", "3 meses", "", None),
+            "tiempo_meses": pick(None, 1, 3, 6, "12"),
+            "planos": pick("https://x/planos.pdf", "", None, True, False),
+            "cita": pick(None, None, iso(now + timedelta(days=rng.randint(-30, 30)))),
+            "calificacion": pick("", None, "3"),
+            "resumen": pick("Quiere remodelar su cocina", "Mensaje raro sin contexto", "", None),
+            "correo": pick("a@b.com", "", None),
+            "seguimiento": pick("SI", "NO", " SI ", None),
+            "ultimo_seguimiento": pick(None, iso(now - seg_age)),
+            "tipo_cliente": pick("Con Cita", "Sin Cita", "", None),
+        })
+    return rows
+
+
+class DerivationParityTests(unittest.TestCase):
+    def assert_same_labels(self, rows):
+        expected = legacy_transform_data(rows)
+        actual = DataProcessor.transform_data(rows)
+        for col in ["seguimiento", "es_no_cliente", "calificacion", "mes", "tiene_cita"]:
+            self.assertEqual(actual[col].tolist(), expected[col].tolist(), col)
+
+    def test_generated_fixtures_match_rowwise_engine(self):
+        for seed in (1, 2, 3):
+            self.assert_same_labels(make_clients(2000, seed=seed))
+
+    def test_missing_optional_columns_use_defaults(self):
+        rows = [{"id": 1, "categoria": "Casa", "primera_interaccion": "2025-03-01T10:00:00+00:00"}]
+        actual = DataProcessor.transform_data(rows)
+        self.assertEqual(actual["seguimiento"].tolist(), ["No Cliente"])
+        self.assertEqual(actual["calificacion"].tolist(), ["2: Cliente Interesado"])
+        self.assertEqual(actual["mes"].tolist(), ["Marzo"])
+        self.assert_same_labels(rows)
+
+    def test_keys_missing_in_some_rows_are_treated_as_empty(self):
+        rows = [
+            {"id": 1, "calificacion": "x"},
+            {"id": 2, "planos": "u", "calificacion": "x", "categoria": "Proveedor", "resumen": "hola"},
+        ]
+        actual = DataProcessor.transform_data(rows)
+        self.assertEqual(actual["calificacion"].tolist(), ["0: Sin avance", "4: Cliente Pre-Calificado"])
+        self.assertEqual(actual["es_no_cliente"].tolist(), [False, True])
+        self.assert_same_labels(rows)
+
+    def test_keywords_match_across_concatenated_fields(self):
+        rows = make_clients(1)
+        rows[0].update({"categoria": "Prove", "estilo": "edor", "resumen": None})
+        self.assertTrue(DataProcessor.transform_data(rows)["es_no_cliente"].iloc[0])
+        self.assert_same_labels(rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
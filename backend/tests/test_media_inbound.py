@@ -1,7 +1,7 @@
 import os
 import unittest
 from types import SimpleNamespace
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
 os.environ.setdefault("SUPABASE_KEY", "dummy")
@@ -13,21 +13,9 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 from routes.chats import router
-
-
-class FakeResponse:
-    def __init__(self, *, json_data=None, status_code=200, content=b"", text=""):
-        self._json_data = json_data or {}
-        self.status_code = status_code
-        self.content = content
-        self.text = text
-
-    def raise_for_status(self):
-        if self.status_code >= 400:
-            raise Exception("http error")
-
-    def json(self):
-        return self._json_data
+from services import chat_manager
+from services.local_store import LocalStore
+from services.media_index import InboundMediaIndex
 
 
 class FakeTable:
@@ -41,13 +29,17 @@ class FakeTable:
     def eq(self, *args, **kwargs):
         return self
 
-    def execute(self):
+    async def execute(self):
         return SimpleNamespace(data=list(self.stored_messages))
 
     def insert(self, payload):
         self._inserted.append(payload)
         self.stored_messages.append(payload)
-        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[payload]))
+
+        async def execute():
+            return SimpleNamespace(data=[payload])
+
+        return SimpleNamespace(execute=execute)
 
 
 
@@ -58,6 +50,12 @@ class MediaInboundRouteTests(unittest.TestCase):
         self.client = TestClient(self.app)
         self.stored_messages = []
         self.fake_table = FakeTable(self.stored_messages)
+        store = LocalStore(":memory:")
+        self.addCleanup(store.close)
+        index = InboundMediaIndex(lambda: store, chat_manager._scan_inbound_media)
+        patcher = patch.object(chat_manager, "INBOUND_MEDIA", index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_inbound_media_requires_internal_token(self):
         response = self.client.post(
@@ -74,11 +72,11 @@ class MediaInboundRouteTests(unittest.TestCase):
         self.assertEqual(response.status_code, 401)
 
     @patch("services.chat_manager.supabase")
-    @patch("services.chat_manager.requests.get")
+    @patch("services.chat_manager.get_whatsapp_media_url", new_callable=AsyncMock)
     def test_inbound_media_returns_already_exists_when_duplicate(self, mock_get, mock_supabase):
         fake_client = SimpleNamespace(table=lambda name: self.fake_table)
-        mock_supabase.client = fake_client
-        mock_get.return_value = FakeResponse(json_data={"url": "https://example.com/file"}, content=b"abc")
+        mock_supabase.aclient = fake_client
+        mock_get.return_value = "https://example.com/file"
 
         self.fake_table.stored_messages.append({
             "id": 1,
@@ -100,6 +98,7 @@ class MediaInboundRouteTests(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["status"], "already_exists")
+        mock_get.assert_not_awaited()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+import os
+import unittest
+from unittest.mock import AsyncMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+os.environ.setdefault("INTERNAL_MEDIA_TOKEN", "test-token")
+
+import asyncio
+import tempfile
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes.chats import media_inbound_router
+from services import chat_manager
+from services.local_store import LocalStore
+from services.media_index import InboundMediaIndex
+from services.media_jobs import MediaJobQueue
+
+MESSAGE = {"type": "human", "media": {"whatsapp_media_id": "m1"}, "content": ""}
+
+
+class InboundMediaIndexTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "local.db")
+
+    def make_index(self, scan=None, **kwargs):
+        store = LocalStore(self.path)
+        self.addCleanup(store.close)
+        scan = scan or AsyncMock(return_value={})
+        return InboundMediaIndex(lambda: store, scan, **kwargs), scan
+
+    def test_claim_rejects_duplicates_until_released_or_completed(self):
+        index, _ = self.make_index()
+
+        self.assertIsNone(index.claim("519", "m1", owner="job-1"))
+        in_flight = index.claim("519", "m1", owner="job-2")
+        self.assertEqual((in_flight["status"], in_flight["owner"]), ("pending", "job-1"))
+
+        index.release("519", "m1", owner="job-2")  # no es suya: no la libera
+        self.assertIsNotNone(index.claim("519", "m1"))
+        index.release("519", "m1", owner="job-1")
+        self.assertIsNone(index.claim("519", "m1", owner="job-3"))
+
+        index.complete("519", "m1", 7, MESSAGE)
+        done = index.claim("519", "m1")
+        self.assertEqual((done["status"], done["message_id"], done["message"]), ("done", 7, MESSAGE))
+        index.release("519", "m1")  # una entrada done no se libera
+        self.assertEqual(index.lookup("519", "m1")["status"], "done")
+
+    def test_abandoned_pending_entry_can_be_reclaimed(self):
+        index, _ = self.make_index(pending_ttl=0.05)
+        self.assertIsNone(index.claim("519", "m1", owner="job-1"))
+        self.assertIsNotNone(index.claim("519", "m1", owner="job-2"))
+        time.sleep(0.06)
+        self.assertIsNone(index.claim("519", "m1", owner="job-2"))
+        self.assertEqual(index.lookup("519", "m1")["owner"], "job-2")
+
+    def test_session_history_is_scanned_once_and_survives_restart(self):
+        async def scan(session_id):
+            await asyncio.sleep(0.01)
+            return {"m1": (7, MESSAGE)}
+
+        index, scan_mock = self.make_index(AsyncMock(side_effect=scan), capacity=1)
+
+        async def main(index):
+            await asyncio.gather(*(index.ensure_session("519") for _ in range(5)))
+            await index.ensure_session("519")
+
+        asyncio.run(main(index))
+        self.assertEqual(scan_mock.await_count, 1)
+        self.assertEqual(index.lookup("519", "m1")["message_id"], 7)
+        index.complete("519", "m2", 8, MESSAGE)
+        self.assertEqual(len(index._done), 1)  # LRU acotado; el resto sigue en SQLite
+        self.assertEqual(index.lookup("519", "m1")["message_id"], 7)
+
+        restarted, rescan = self.make_index()
+        asyncio.run(main(restarted))
+        rescan.assert_not_awaited()
+        self.assertEqual(restarted.claim("519", "m2")["message_id"], 8)
+
+    def test_failed_scan_is_retried_on_next_delivery(self):
+        index, scan = self.make_index(AsyncMock(side_effect=[Exception("timeout"), {}]))
+        asyncio.run(index.ensure_session("519"))
+        asyncio.run(index.ensure_session("519"))
+        self.assertEqual(scan.await_count, 2)
+        self.assertIn("519", index._indexed)
+
+
+class DuplicateInboundMediaRouteTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = LocalStore(os.path.join(tmp.name, "local.db"))
+        self.addCleanup(store.close)
+        self.gate = None
+        self.processed = []
+
+        async def process(payload):
+            self.processed.append(payload["media_id"])
+            await self.gate.wait()
+            return {"success": True}
+
+        index = InboundMediaIndex(lambda: store, AsyncMock(return_value={}))
+        queue = MediaJobQueue(
+            lambda: store, process, retry_delay=0.01,
+            on_failed=lambda job_id, payload: index.release(payload["session_id"], payload["media_id"], owner=job_id),
+        )
+        for target, value in (("MEDIA_JOBS", queue), ("INBOUND_MEDIA", index), ("MEDIA_INBOUND_ASYNC", True)):
+            patcher = patch.object(chat_manager, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.index = index
+        app = FastAPI()
+        app.include_router(media_inbound_router)
+        self.client = TestClient(app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+        self.gate = self.client.portal.call(asyncio.Event)
+
+    def test_concurrent_duplicate_delivery_is_not_queued_twice(self):
+        headers = {"X-Internal-Token": "test-token"}
+        payload = {"session_id": "519", "media_id": "m1", "kind": "image", "mime": "image/jpeg"}
+
+        first = self.client.post("/media/inbound", headers=headers, json=payload)
+        second = self.client.post("/media/inbound", headers=headers, json=payload)
+
+        self.assertEqual(first.json()["status"], "queued")
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second.json()["status"], "in_progress")
+        self.assertEqual(second.json()["job_id"], first.json()["job_id"])
+
+        self.client.portal.call(self.gate.set)
+        for _ in range(200):
+            if self.client.get(first.json()["status_url"], headers=headers).json()["status"] == "done":
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.processed, ["m1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
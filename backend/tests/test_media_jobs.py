@@ -0,0 +1,193 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+os.environ.setdefault("INTERNAL_MEDIA_TOKEN", "test-token")
+
+import asyncio
+import tempfile
+import time
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from routes.chats import media_inbound_router
+from services import chat_manager
+from services.local_store import LocalStore
+from services.media_index import InboundMediaIndex
+from services.media_jobs import MediaJobQueue
+
+PAYLOAD = {
+    "session_id": "51999999999",
+    "media_id": "123456789",
+    "kind": "document",
+    "mime": "application/pdf",
+    "filename": "doc.pdf",
+}
+
+
+class EmptyTable:
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, *args, **kwargs):
+        return self
+
+    async def execute(self):
+        return SimpleNamespace(data=[])
+
+
+class MediaJobQueueTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "jobs.db")
+        self.stores = []
+
+    def make_queue(self, handler, **kwargs):
+        store = LocalStore(self.path)
+        self.stores.append(store)
+        self.addCleanup(store.close)
+        return MediaJobQueue(lambda: store, handler, retry_delay=0.01, **kwargs)
+
+    async def wait_for(self, queue, job_id, statuses=("done", "failed")):
+        for _ in range(200):
+            job = queue.get(job_id)
+            if job["status"] in statuses:
+                return job
+            await asyncio.sleep(0.01)
+        self.fail(f"job {job_id} sigue en {job['status']}")
+
+    def test_submit_returns_at_once_and_runs_with_bounded_concurrency(self):
+        running, peak = 0, 0
+
+        async def handler(payload):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return {"success": True, "media_id": payload["media_id"]}
+
+        async def main():
+            queue = self.make_queue(handler, concurrency=2)
+            started = time.perf_counter()
+            jobs = [await queue.submit({**PAYLOAD, "media_id": str(i)}) for i in range(6)]
+            acknowledged = time.perf_counter() - started
+            self.assertTrue(all(j["status"] == "queued" for j in jobs))
+            done = [await self.wait_for(queue, j["job_id"]) for j in jobs]
+            await queue.stop()
+            return acknowledged, done, queue.stats()
+
+        acknowledged, done, stats = asyncio.run(main())
+        self.assertLess(acknowledged, 0.05)
+        self.assertEqual(peak, 2)
+        self.assertEqual([j["result"]["media_id"] for j in done], [str(i) for i in range(6)])
+        self.assertEqual(stats, {"done": 6})
+
+    def test_transient_errors_are_retried_and_client_errors_fail(self):
+        calls = []
+
+        async def handler(payload):
+            calls.append(payload["media_id"])
+            if payload["media_id"] == "bad":
+                raise HTTPException(status_code=400, detail="mime inválido")
+            if calls.count(payload["media_id"]) < 3:
+                raise HTTPException(status_code=502, detail="Graph API caída")
+            return {"success": True}
+
+        async def main():
+            queue = self.make_queue(handler, max_attempts=3)
+            flaky = await queue.submit({"media_id": "flaky"})
+            bad = await queue.submit({"media_id": "bad"})
+            result = await self.wait_for(queue, flaky["job_id"]), await self.wait_for(queue, bad["job_id"])
+            await queue.stop()
+            return result
+
+        flaky, bad = asyncio.run(main())
+        self.assertEqual((flaky["status"], flaky["attempts"]), ("done", 3))
+        self.assertEqual((bad["status"], bad["attempts"], bad["error"]), ("failed", 1, "mime inválido"))
+
+    def test_pending_jobs_resume_after_restart(self):
+        async def first_run():
+            gate = asyncio.Event()
+
+            async def handler(payload):
+                await gate.wait()
+                return {"success": True}
+
+            queue = self.make_queue(handler, concurrency=1)
+            jobs = [await queue.submit({"media_id": str(i)}) for i in range(3)]
+            await self.wait_for(queue, jobs[0]["job_id"], ("running",))
+            await queue.stop()  # reinicio con un job a medias y dos en cola
+            return [j["job_id"] for j in jobs]
+
+        job_ids = asyncio.run(first_run())
+
+        async def second_run():
+            queue = self.make_queue(AsyncMock(return_value={"success": True}))
+            await queue.start()
+            done = [await self.wait_for(queue, job_id) for job_id in job_ids]
+            await queue.stop()
+            return done
+
+        done = asyncio.run(second_run())
+        self.assertEqual([j["status"] for j in done], ["done"] * 3)
+        self.assertEqual(done[0]["attempts"], 2)
+
+
+class MediaInboundAsyncRouteTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = LocalStore(os.path.join(tmp.name, "jobs.db"))
+        self.addCleanup(store.close)
+        self.process = AsyncMock(return_value={"success": True, "message_id": 7})
+        queue = MediaJobQueue(lambda: store, self.process, retry_delay=0.01)
+        index = InboundMediaIndex(lambda: store, AsyncMock(return_value={}))
+        for target, value in (
+            ("MEDIA_JOBS", queue),
+            ("INBOUND_MEDIA", index),
+            ("MEDIA_INBOUND_ASYNC", True),
+            ("supabase", SimpleNamespace(aclient=SimpleNamespace(table=lambda name: EmptyTable()))),
+        ):
+            patcher = patch.object(chat_manager, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app = FastAPI()
+        app.include_router(media_inbound_router)
+        self.client = TestClient(app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+    def test_inbound_media_is_acknowledged_with_202_and_job_status(self):
+        headers = {"X-Internal-Token": "test-token"}
+        response = self.client.post("/media/inbound", headers=headers, json=PAYLOAD)
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(body["status"], "queued")
+
+        for _ in range(200):
+            job = self.client.get(body["status_url"], headers=headers).json()
+            if job["status"] == "done":
+                break
+            time.sleep(0.01)
+        self.assertEqual(job["result"], {"success": True, "message_id": 7})
+        self.process.assert_awaited_once_with(PAYLOAD)
+
+        self.assertEqual(self.client.get(body["status_url"]).status_code, 401)
+        self.assertEqual(self.client.get("/media/jobs/no-existe", headers=headers).status_code, 404)
+
+    def test_invalid_payload_is_rejected_before_queueing(self):
+        response = self.client.post(
+            "/media/inbound", headers={"X-Internal-Token": "test-token"}, json={**PAYLOAD, "kind": "sticker"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.process.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
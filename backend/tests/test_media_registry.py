@@ -0,0 +1,141 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+import io
+import sys
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+
+from benchmarks.fake_graph import FakeGraph
+from benchmarks.fake_storage import FakeStorage
+from services import chat_manager
+from services.local_store import LocalStore
+from services.media_registry import MediaRegistry, media_digest
+from services.media_transfer import StorageUploader
+from services.transcoder import AudioTranscoder
+
+FAKE_FFMPEG = [sys.executable, os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fake_ffmpeg.py")]
+CATALOG = b"%PDF-1.7 catalogo" * 1000
+
+
+class MediaRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.store = LocalStore(":memory:")
+        self.addCleanup(self.store.close)
+
+    def test_whatsapp_media_ids_expire_and_can_be_forgotten(self):
+        registry = MediaRegistry(lambda: self.store, whatsapp_ttl=60)
+        digest = media_digest(CATALOG)
+        registry.remember_whatsapp(digest, "123", "media-1")
+        self.assertEqual(registry.whatsapp_media_id(digest, "123"), "media-1")
+        self.assertIsNone(registry.whatsapp_media_id(digest, "456"))  # los media_id son por número
+        registry.forget_whatsapp(digest, "123")
+        self.assertIsNone(registry.whatsapp_media_id(digest, "123"))
+
+        expired = MediaRegistry(lambda: self.store, whatsapp_ttl=-1)
+        expired.remember_whatsapp(digest, "123", "media-2")
+        self.assertIsNone(expired.whatsapp_media_id(digest, "123"))
+
+    def test_converted_audio_keeps_only_most_recently_used(self):
+        registry = MediaRegistry(lambda: self.store, converted_entries=2)
+        for name in ("a", "b"):
+            registry.remember_converted(name, b"mp3-" + name.encode(), f"{name}.mp3", "audio/mpeg")
+        self.assertEqual(registry.converted("a"), (b"mp3-a", "a.mp3", "audio/mpeg"))
+        registry.remember_converted("c", b"mp3-c", "c.mp3", "audio/mpeg")
+        self.assertIsNone(registry.converted("b"))
+        self.assertIsNotNone(registry.converted("a"))
+        self.assertEqual(registry.stats()["converted"], 2)
+
+
+class OutboundMediaDedupTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = FakeGraph().start()
+        self.addCleanup(self.graph.stop)
+        self.storage = FakeStorage().start()
+        self.addCleanup(self.storage.stop)
+        store = LocalStore(":memory:")
+        self.addCleanup(store.close)
+        self.registry = MediaRegistry(lambda: store)
+        self.transcoder = AudioTranscoder(FAKE_FFMPEG)
+
+        self.supabase = MagicMock()
+        self.supabase.client.storage.from_.return_value.get_public_url.return_value = "https://cdn/catalogo.pdf"
+
+        async def inserted():
+            return SimpleNamespace(data=[{"id": 1}])
+
+        self.supabase.aclient.table.return_value.insert.return_value.execute = inserted
+
+        for target, value in (
+            ("supabase", self.supabase),
+            ("MEDIA_REGISTRY", self.registry),
+            ("AUDIO_TRANSCODER", self.transcoder),
+            ("_storage", lambda: StorageUploader(self.storage.url, "dummy")),
+            ("get_bot_status", AsyncMock(return_value=False)),
+            ("WHATSAPP_API_URL", self.graph.url),
+            ("WHATSAPP_ACCESS_TOKEN", "dummy-token"),
+        ):
+            patcher = patch.object(chat_manager, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(os.environ, {"WHATSAPP_PHONE_NUMBER_ID": "123", "FAKE_FFMPEG_SLEEP": "0"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, session_id, content, filename="catalogo.pdf", content_type="application/pdf", media_type="document"):
+        upload = UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": content_type}))
+        return asyncio.run(chat_manager.send_media_message_to_session(session_id, upload, media_type))
+
+    def test_resending_same_file_skips_both_uploads(self):
+        first = self.send("519", CATALOG)
+        second = self.send("520", CATALOG)
+
+        self.assertEqual(first["reused"], {"storage": False, "whatsapp": False})
+        self.assertEqual(second["reused"], {"storage": True, "whatsapp": True})
+        self.assertEqual(second["mediaUrl"], "https://cdn/catalogo.pdf")
+        self.assertEqual(len(self.storage.uploads), 1)
+        self.assertEqual(len(self.graph.uploads), 1)
+        self.assertEqual([m["to"] for m in self.graph.sent], ["519", "520"])
+        self.assertEqual({m["document"]["id"] for m in self.graph.sent}, {"media-1"})
+
+    def test_media_id_rejected_by_meta_is_uploaded_again(self):
+        self.send("519", CATALOG)
+        self.graph.fail_next = [(400, {}, {"message": "(#131053) Media upload error", "code": 131053})]
+
+        result = self.send("520", CATALOG)
+
+        self.assertEqual(result["reused"], {"storage": True, "whatsapp": False})
+        self.assertEqual(len(self.graph.uploads), 2)
+        self.assertEqual(self.graph.sent[-1]["document"]["id"], "media-2")
+        self.assertEqual(self.registry.whatsapp_media_id(media_digest(CATALOG), "123"), "media-2")
+
+    def test_recipient_error_keeps_cached_media_id(self):
+        self.send("519", CATALOG)
+        self.graph.fail_next = [(400, {}, {"message": "Recipient phone number not in allowed list", "code": 131030})]
+
+        with self.assertRaises(HTTPException) as ctx:
+            self.send("520", CATALOG)
+
+        self.assertIn("131030", ctx.exception.detail)
+        self.assertEqual(len(self.graph.uploads), 1)
+        self.assertEqual(self.registry.whatsapp_media_id(media_digest(CATALOG), "123"), "media-1")
+
+    def test_converted_audio_is_cached_by_source_digest(self):
+        for session_id in ("519", "520"):
+            self.send(session_id, b"webm-audio", "nota.webm", "audio/webm", "audio")
+
+        self.assertEqual(self.transcoder.stats()["completed"], 1)
+        self.assertEqual(len(self.graph.uploads), 1)
+        self.assertIn(b"ID3webm-audio", self.graph.uploads[0])
+        self.assertEqual(self.graph.sent[1]["audio"]["id"], "media-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+os.environ.setdefault("INTERNAL_MEDIA_TOKEN", "test-token")
+
+import asyncio
+import tracemalloc
+
+from benchmarks.fake_graph import FakeGraph
+from benchmarks.fake_storage import FakeStorage
+from services import chat_manager
+from services.local_store import LocalStore
+from services.media_index import InboundMediaIndex
+from services.media_registry import MediaRegistry
+from services.media_transfer import StorageUploader, download_to_spool
+from services.whatsapp_client import WhatsAppClient
+
+VIDEO = bytes(range(256)) * (6 * 1024 * 1024 // 256)  # 6 MB
+
+
+class MediaTransferTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = FakeGraph(media={"video": VIDEO, "nota": b"hola"}).start()
+        self.addCleanup(self.graph.stop)
+        self.storage = FakeStorage().start()
+        self.addCleanup(self.storage.stop)
+
+    def pipeline(self, media_id, memory_budget):
+        async def main():
+            client = WhatsAppClient(self.graph.url, "dummy-token")
+            uploader = StorageUploader(self.storage.url, "dummy")
+            try:
+                url = (await client.media_info(media_id))["url"]
+                spool, download = await download_to_spool(client, url, memory_budget=memory_budget, chunk_size=64 * 1024)
+                with spool:
+                    upload = await uploader.upload("media", f"whatsapp-inbound/519/{media_id}.mp4", spool, download.bytes, "video/mp4", chunk_size=64 * 1024)
+                return download, upload
+            finally:
+                await client.aclose()
+                await uploader.aclose()
+
+        return asyncio.run(main())
+
+    def test_large_media_streams_through_a_bounded_buffer_and_spills_to_disk(self):
+        self.pipeline("nota", memory_budget=512 * 1024)  # calienta imports y conexiones fuera de la medición
+        tracemalloc.start()
+        try:
+            download, upload = self.pipeline("video", memory_budget=512 * 1024)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(download.bytes, len(VIDEO))
+        self.assertTrue(download.spilled)
+        self.assertEqual(upload.bytes, len(VIDEO))
+        sent = self.storage.uploads[-1]
+        self.assertEqual(sent["size"], len(VIDEO))
+        self.assertEqual(sent["path"], "media/whatsapp-inbound/519/video.mp4")
+        self.assertEqual((sent["content_type"], sent["cache_control"], sent["upsert"]), ("video/mp4", "max-age=3600", "true"))
+        # nunca se tuvo el video entero (6 MB) en memoria
+        self.assertLess(peak, 3 * 1024 * 1024)
+        self.assertGreater(download.as_dict()["mb_per_s"], 0)
+
+    def test_small_media_stays_in_memory(self):
+        download, upload = self.pipeline("nota", memory_budget=512 * 1024)
+        self.assertEqual((download.bytes, download.spilled), (4, False))
+        self.assertEqual(self.storage.uploads[0]["size"], 4)
+
+
+class InboundMediaIngestTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = FakeGraph(media={"123": VIDEO, "124": VIDEO}).start()
+        self.addCleanup(self.graph.stop)
+        self.storage = FakeStorage().start()
+        self.addCleanup(self.storage.stop)
+        self.inserted = []
+
+    def test_ingest_streams_media_and_reports_transfer(self):
+        def table(name):
+            query = MagicMock()
+
+            async def empty():
+                return SimpleNamespace(data=[])
+
+            def insert(row):
+                self.inserted.append(row)
+
+                async def execute():
+                    return SimpleNamespace(data=[{**row, "id": 7}])
+
+                return SimpleNamespace(execute=execute)
+
+            query.select.return_value.eq.return_value.execute = empty
+            query.insert = insert
+            return query
+
+        fake_supabase = MagicMock()
+        fake_supabase.aclient = SimpleNamespace(table=table)
+        fake_supabase.client.storage.from_.return_value.get_public_url.return_value = "https://cdn/video.mp4?"
+
+        def storage():
+            return StorageUploader(self.storage.url, "dummy")
+
+        store = LocalStore(":memory:")
+        self.addCleanup(store.close)
+        index = InboundMediaIndex(lambda: store, chat_manager._scan_inbound_media)
+        registry = MediaRegistry(lambda: store)
+
+        with patch.object(chat_manager, "supabase", fake_supabase), \
+                patch.object(chat_manager, "INBOUND_MEDIA", index), \
+                patch.object(chat_manager, "MEDIA_REGISTRY", registry), \
+                patch.object(chat_manager, "_storage", storage), \
+                patch.object(chat_manager, "WHATSAPP_API_URL", self.graph.url), \
+                patch.object(chat_manager, "WHATSAPP_ACCESS_TOKEN", "dummy-token"):
+            result = asyncio.run(chat_manager.ingest_inbound_media_message(
+                {"session_id": "519", "media_id": "123", "kind": "video", "mime": "video/mp4", "filename": "clip.mp4"},
+                internal_token="test-token",
+            ))
+            # El mismo archivo con otro media_id (reenviado) reutiliza lo que ya está en Storage
+            forwarded = asyncio.run(chat_manager.ingest_inbound_media_message(
+                {"session_id": "520", "media_id": "124", "kind": "video", "mime": "video/mp4", "filename": "clip.mp4"},
+                internal_token="test-token",
+            ))
+
+        self.assertEqual(result["status"], "created")
+        self.assertEqual(result["message_id"], 7)
+        self.assertEqual(result["media"]["size"], len(VIDEO))
+        self.assertEqual(result["media"]["url"], "https://cdn/video.mp4?")
+        self.assertEqual(result["transfer"]["upload"]["bytes"], len(VIDEO))
+        self.assertEqual(self.storage.uploads[0]["path"], "media/whatsapp-inbound/519/123-clip.mp4")
+        self.assertEqual(self.inserted[0]["message"]["media"]["whatsapp_media_id"], "123")
+        self.assertEqual(index.lookup("519", "123")["message_id"], 7)
+        self.assertEqual(result["transfer"]["download"]["bytes"], len(VIDEO))
+        self.assertIsNone(forwarded["transfer"]["upload"])
+        self.assertEqual(forwarded["media"]["url"], "https://cdn/video.mp4?")
+        self.assertEqual(len(self.storage.uploads), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
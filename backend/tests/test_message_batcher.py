@@ -0,0 +1,123 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+import time
+
+from services import chat_manager
+from services.message_batcher import MessageWriteBatcher
+
+
+class FakeInsert:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.batches = []
+        self.fail = None
+
+    async def __call__(self, rows):
+        start = sum(len(b) for b in self.batches)
+        self.batches.append(rows)
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise self.fail
+        return [{**row, "id": start + i + 1} for i, row in enumerate(rows)]
+
+
+class MessageWriteBatcherTests(unittest.TestCase):
+    def test_coalesces_concurrent_writes_and_returns_each_row(self):
+        insert = FakeInsert(latency=0.01)
+        batcher = MessageWriteBatcher(insert, window=0.05, max_rows=20)
+
+        async def main():
+            return await asyncio.gather(*(batcher.submit({"n": n}) for n in range(50)))
+
+        rows = asyncio.run(main())
+        self.assertEqual([len(b) for b in insert.batches], [20, 20, 10])
+        self.assertEqual([r["n"] for r in rows], list(range(50)))
+        self.assertEqual(sorted(r["id"] for r in rows), list(range(1, 51)))
+
+    def test_failed_batch_raises_in_every_caller(self):
+        insert = FakeInsert()
+        insert.fail = Exception("PostgREST 503")
+        batcher = MessageWriteBatcher(insert, window=0.01)
+
+        async def main():
+            return await asyncio.gather(*(batcher.submit({"n": n}) for n in range(3)), return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertEqual(len(insert.batches), 1)
+        self.assertTrue(all(str(r) == "PostgREST 503" for r in results))
+
+    def test_flush_writes_pending_rows_without_waiting_for_the_window(self):
+        insert = FakeInsert()
+        batcher = MessageWriteBatcher(insert, window=30)
+
+        async def main():
+            pending = [asyncio.ensure_future(batcher.submit({"n": n})) for n in range(3)]
+            await asyncio.sleep(0)
+            started = time.perf_counter()
+            await batcher.flush()
+            return time.perf_counter() - started, await asyncio.gather(*pending)
+
+        elapsed, rows = asyncio.run(main())
+        self.assertLess(elapsed, 1)
+        self.assertEqual([r["id"] for r in rows], [1, 2, 3])
+
+
+class PersistMessageBatchingTests(unittest.TestCase):
+    def setUp(self):
+        self.inserts = []
+
+        def insert(rows):
+            self.inserts.append(rows)
+
+            async def execute():
+                if isinstance(rows, dict):
+                    return SimpleNamespace(data=[{**rows, "id": 1}])
+                return SimpleNamespace(data=[{**row, "id": i + 1} for i, row in enumerate(rows)])
+
+            return SimpleNamespace(execute=execute)
+
+        self.heads, self.events = MagicMock(), MagicMock()
+        for target, value in (
+            ("supabase", SimpleNamespace(aclient=SimpleNamespace(table=lambda name: SimpleNamespace(insert=insert)))),
+            ("CONVERSATION_HEADS", self.heads),
+            ("CHAT_EVENTS", self.events),
+        ):
+            patcher = patch.object(chat_manager, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def persist_many(self, n):
+        async def main():
+            return await asyncio.gather(*(
+                chat_manager.persist_message(f"519{i}", {"type": "human", "content": str(i)}) for i in range(n)
+            ))
+
+        return asyncio.run(main())
+
+    def test_batched_persist_message_uses_one_insert(self):
+        batcher = MessageWriteBatcher(chat_manager._insert_message_batch, window=0.02)
+        with patch.object(chat_manager, "MESSAGE_BATCHER", batcher):
+            results = self.persist_many(5)
+
+        self.assertEqual(len(self.inserts), 1)
+        self.assertEqual([r.data[0]["session_id"] for r in results], [f"519{i}" for i in range(5)])
+        self.assertEqual([r.data[0]["id"] for r in results], [1, 2, 3, 4, 5])
+        self.events.publish.assert_called_once()
+        self.assertEqual(len(self.events.publish.call_args[0][0]), 5)
+
+    def test_disabled_batcher_keeps_one_insert_per_message(self):
+        results = self.persist_many(3)
+        self.assertEqual(len(self.inserts), 3)
+        self.assertTrue(all(isinstance(rows, dict) for rows in self.inserts))
+        self.assertEqual(results[0].data[0]["id"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
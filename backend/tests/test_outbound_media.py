@@ -0,0 +1,116 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+import tempfile
+import time
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+
+from benchmarks.fake_graph import FakeGraph
+from benchmarks.fake_storage import FakeStorage
+from services import chat_manager
+from services.local_store import LocalStore
+from services.media_registry import MediaRegistry
+from services.media_transfer import StorageUploader
+
+VIDEO = bytes(range(256)) * (12 * 1024 * 1024 // 256)  # 12 MB
+
+
+class StreamingUpload(UploadFile):
+    """UploadFile que falla si alguien lo lee entero de una vez."""
+    async def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            raise AssertionError("el archivo se leyó entero en memoria")
+        return await super().read(size)
+
+
+class OutboundMediaPipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = FakeGraph(latency=0.3).start()
+        self.addCleanup(self.graph.stop)
+        self.storage = FakeStorage(latency=0.3).start()
+        self.addCleanup(self.storage.stop)
+        store = LocalStore(":memory:")
+        self.addCleanup(store.close)
+
+        self.supabase = MagicMock()
+        self.supabase.client.storage.from_.return_value.get_public_url.return_value = "https://cdn/video.mp4"
+        self.persisted = []
+
+        def insert(row):
+            self.persisted.append(row)
+
+            async def execute():
+                return SimpleNamespace(data=[{"id": 1}])
+
+            return SimpleNamespace(execute=execute)
+
+        self.supabase.aclient.table.return_value.insert = insert
+
+        for target, value in (
+            ("supabase", self.supabase),
+            ("MEDIA_REGISTRY", MediaRegistry(lambda: store)),
+            ("_storage", lambda: StorageUploader(self.storage.url, "dummy")),
+            ("get_bot_status", AsyncMock(return_value=False)),
+            ("WHATSAPP_API_URL", self.graph.url),
+            ("WHATSAPP_ACCESS_TOKEN", "dummy-token"),
+        ):
+            patcher = patch.object(chat_manager, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(os.environ, {"WHATSAPP_PHONE_NUMBER_ID": "123"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, content=VIDEO):
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        spool.write(content)
+        spool.seek(0)
+        self.addCleanup(spool.close)
+        upload = StreamingUpload(spool, size=len(content), filename="video.mp4", headers=Headers({"content-type": "video/mp4"}))
+        return asyncio.run(chat_manager.send_media_message_to_session("519", upload, "video"))
+
+    def test_uploads_run_concurrently_and_stream_the_file(self):
+        started = time.perf_counter()
+        result = self.send()
+        elapsed = time.perf_counter() - started
+
+        timings = result["timings_ms"]
+        self.assertGreaterEqual(timings["storage"], 300)
+        self.assertGreaterEqual(timings["whatsapp_upload"], 300)
+        # Storage (0.3 s) y Graph (0.3 s) en paralelo, luego el envío (0.3 s): ~0.6 s y no ~0.9 s
+        self.assertLess(elapsed, 0.85)
+        self.assertLess(timings["total"], timings["storage"] + timings["whatsapp_upload"] + timings["whatsapp_send"])
+        self.assertEqual(self.storage.uploads[0]["size"], len(VIDEO))
+        self.assertIn(VIDEO, self.graph.uploads[0])
+        self.assertEqual(self.graph.sent[0]["video"]["id"], "media-1")
+        self.assertEqual(self.persisted[0]["message"]["media"]["size"], len(VIDEO))
+
+    def test_storage_failure_sends_nothing(self):
+        self.storage.fail_next = [500]
+
+        with self.assertRaises(HTTPException) as ctx:
+            self.send()
+
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertIn("Error subiendo archivo", ctx.exception.detail)
+        self.assertEqual(self.graph.sent, [])
+        self.assertEqual(self.persisted, [])
+
+    def test_oversized_file_is_rejected_while_reading(self):
+        with patch.object(chat_manager, "MAX_FILE_SIZE", 1024 * 1024):
+            with self.assertRaises(HTTPException) as ctx:
+                self.send()
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual((self.storage.uploads, self.graph.uploads), ([], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import random
+import unittest
+
+from services.range_scanner import scan_ranges
+
+
+class FakeRangeSource:
+    def __init__(self, rows, fail_once=()):
+        self.rows = rows
+        self.fail_once = set(fail_once)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch(self, start, end):
+        self.calls.append(start)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))  # las páginas terminan desordenadas
+            if start in self.fail_once:
+                self.fail_once.discard(start)
+                raise RuntimeError("timeout")
+            return self.rows[start:end + 1]
+        finally:
+            self.in_flight -= 1
+
+
+class RangeScannerTests(unittest.TestCase):
+    def test_pages_are_reassembled_in_order_within_window(self):
+        source = FakeRangeSource([{"id": i} for i in range(2350)])
+        rows = asyncio.run(scan_ranges(source.fetch, 2350, page_size=100, concurrency=3))
+        self.assertEqual([r["id"] for r in rows], list(range(2350)))
+        self.assertLessEqual(source.max_in_flight, 3)
+        self.assertEqual(len(source.calls), 24)
+
+    def test_failed_page_is_retried(self):
+        source = FakeRangeSource([{"id": i} for i in range(500)], fail_once={200})
+        rows = asyncio.run(scan_ranges(source.fetch, 500, page_size=100, concurrency=4, backoff=0))
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(source.calls.count(200), 2)
+
+    def test_rows_inserted_after_count_are_still_read(self):
+        source = FakeRangeSource([{"id": i} for i in range(250)])
+        rows = asyncio.run(scan_ranges(source.fetch, 200, page_size=100, concurrency=2))
+        self.assertEqual(len(rows), 250)
+
+    def test_shifted_rows_are_deduplicated(self):
+        data = [{"id": i} for i in range(200)]
+        data.insert(100, {"id": 99})  # fila que se desplazó y aparece en dos páginas
+        source = FakeRangeSource(data)
+        rows = asyncio.run(scan_ranges(source.fetch, 201, page_size=100, concurrency=2))
+        self.assertEqual([r["id"] for r in rows], list(range(200)))
+
+
+if __name__ == "__main__":
+    unittest.main()
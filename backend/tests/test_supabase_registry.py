@@ -0,0 +1,62 @@
+import os
+import unittest
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_postgrest import FakePostgrest
+from services.supabase_registry import SupabaseRegistry
+
+
+class SupabaseRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.server = FakePostgrest({"clients_pravi": [{"id": i} for i in range(1, 11)]}, latency=0.01).start()
+        self.addCleanup(self.server.stop)
+        self.registry = SupabaseRegistry()
+        self.addCleanup(self.registry.close)
+
+    def test_same_client_is_shared_per_url_and_key(self):
+        a = self.registry.get(self.server.url, "dummy")
+        self.assertIs(a, self.registry.get(self.server.url, "dummy"))
+        self.assertIsNot(a, self.registry.get(self.server.url, "otra"))
+        self.assertEqual(a.postgrest.session.headers["Cache-Control"], "no-cache")
+
+    def test_pool_metrics_track_requests_and_release_slots(self):
+        client = self.registry.get(self.server.url, "dummy")
+
+        def query(_):
+            return client.table("clients_pravi").select("id").eq("id", 3).execute().data
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(query, range(40)))
+
+        self.assertTrue(all(r == [{"id": 3}] for r in results))
+        metrics = self.registry.pool_metrics()[self.server.url]
+        self.assertEqual(metrics["requests"], 40)
+        self.assertEqual(metrics["in_use"], 0)
+        self.assertLessEqual(metrics["peak_in_use"], 8)
+        self.assertLessEqual(metrics["open"], 8)  # conexiones reutilizadas, no una por petición
+        self.assertEqual(metrics["idle"], metrics["open"])
+
+    def test_async_client_is_per_event_loop_and_queries_without_threads(self):
+        async def run():
+            client = self.registry.get_async(self.server.url, "dummy")
+            self.assertIs(client, self.registry.get_async(self.server.url, "dummy"))
+            results = await asyncio.gather(*(
+                client.table("clients_pravi").select("id").eq("id", i).execute() for i in range(1, 11)
+            ))
+            return client, [r.data for r in results]
+
+        first, data = asyncio.run(run())
+        self.assertEqual(data, [[{"id": i}] for i in range(1, 11)])
+        second, _ = asyncio.run(run())
+        self.assertIsNot(first, second)  # otro loop, otro pool
+        metrics = self.registry.pool_metrics()[f"{self.server.url} async"]
+        self.assertEqual(metrics["in_use"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+import sys
+import time
+
+from fastapi import HTTPException
+
+from services import chat_manager
+from services.transcoder import AudioTranscoder, TranscodeError, TranscodeTimeout, TranscoderBusy
+
+FAKE_FFMPEG = [sys.executable, os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fake_ffmpeg.py")]
+
+
+class AudioTranscoderTests(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.dict(os.environ, {"FAKE_FFMPEG_SLEEP": "0"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pipes_audio_without_blocking_the_event_loop(self):
+        os.environ["FAKE_FFMPEG_SLEEP"] = "0.3"
+        transcoder = AudioTranscoder(FAKE_FFMPEG, concurrency=2)
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            outputs = await asyncio.gather(transcoder.transcode(b"ogg-1"), transcoder.transcode(b"ogg-2"))
+            task.cancel()
+            return outputs, ticks
+
+        outputs, ticks = asyncio.run(main())
+        self.assertEqual(outputs, [b"ID3ogg-1", b"ID3ogg-2"])
+        self.assertGreater(ticks, 15)  # el loop siguió atendiendo mientras FFmpeg trabajaba
+        stats = transcoder.stats()
+        self.assertEqual(stats["completed"], 2)
+        self.assertGreaterEqual(stats["p50_ms"], 300)
+        self.assertGreaterEqual(stats["p95_ms"], stats["p50_ms"])
+
+    def test_rejects_when_slots_and_queue_are_full(self):
+        os.environ["FAKE_FFMPEG_SLEEP"] = "0.3"
+        transcoder = AudioTranscoder(FAKE_FFMPEG, concurrency=1, max_queue=1)
+
+        async def main():
+            jobs = [asyncio.create_task(transcoder.transcode(b"a")), asyncio.create_task(transcoder.transcode(b"b"))]
+            await asyncio.sleep(0.05)
+            snapshot = transcoder.stats()
+            with self.assertRaises(TranscoderBusy):
+                await transcoder.transcode(b"c")
+            return snapshot, await asyncio.gather(*jobs)
+
+        snapshot, outputs = asyncio.run(main())
+        self.assertEqual((snapshot["running"], snapshot["queued"]), (1, 1))
+        self.assertEqual(outputs, [b"ID3a", b"ID3b"])
+        self.assertEqual(transcoder.stats()["rejected"], 1)
+
+    def test_timeout_kills_ffmpeg_and_errors_are_reported(self):
+        os.environ["FAKE_FFMPEG_SLEEP"] = "5"
+        transcoder = AudioTranscoder(FAKE_FFMPEG, timeout=0.3)
+        started = time.perf_counter()
+        with self.assertRaises(TranscodeTimeout):
+            asyncio.run(transcoder.transcode(b"ogg"))
+        self.assertLess(time.perf_counter() - started, 2)
+
+        os.environ["FAKE_FFMPEG_SLEEP"] = "0"
+        with self.assertRaises(TranscodeError) as ctx:
+            asyncio.run(transcoder.transcode(b"bad-audio"))
+        self.assertIn("Invalid data", str(ctx.exception))
+        stats = transcoder.stats()
+        self.assertEqual((stats["timeouts"], stats["failed"], stats["running"]), (1, 1, 0))
+
+    def test_mp4_that_cannot_be_piped_falls_back_to_a_file(self):
+        m4a = b"\x00\x00\x00\x20ftypM4A " + b"audio"
+        output = asyncio.run(AudioTranscoder(FAKE_FFMPEG).transcode(m4a))
+        self.assertEqual(output, b"ID3" + m4a)
+
+    def test_mp4_that_times_out_is_not_retried_from_a_file(self):
+        os.environ["FAKE_FFMPEG_SLEEP"] = "5"
+        transcoder = AudioTranscoder(FAKE_FFMPEG, timeout=0.3)
+        m4a = b"\x00\x00\x00\x20ftypM4A " + b"audio"
+        with patch.object(transcoder, "_run_from_file") as from_file:
+            with self.assertRaises(TranscodeTimeout):
+                asyncio.run(transcoder.transcode(m4a))
+        from_file.assert_not_called()
+        stats = transcoder.stats()
+        self.assertEqual((stats["timeouts"], stats["failed"]), (1, 0))
+
+    def test_convert_audio_to_mp3_maps_busy_and_missing_ffmpeg(self):
+        async def busy(data):
+            raise TranscoderBusy("lleno")
+
+        with patch.object(chat_manager.AUDIO_TRANSCODER, "transcode", busy):
+            with self.assertRaises(HTTPException) as ctx:
+                asyncio.run(chat_manager.convert_audio_to_mp3(b"ogg", "nota.ogg"))
+        self.assertEqual(ctx.exception.status_code, 503)
+
+        with patch.object(chat_manager, "AUDIO_TRANSCODER", AudioTranscoder(["no-existe-ffmpeg"])):
+            with self.assertRaises(HTTPException) as ctx:
+                asyncio.run(chat_manager.convert_audio_to_mp3(b"ogg", "nota.ogg"))
+        self.assertIn("FFmpeg no está instalado", ctx.exception.detail)
+
+        with patch.object(chat_manager, "AUDIO_TRANSCODER", AudioTranscoder(FAKE_FFMPEG)):
+            converted = asyncio.run(chat_manager.convert_audio_to_mp3(b"ogg", "nota.ogg"))
+        self.assertEqual(converted, (b"ID3ogg", "nota.mp3", "audio/mpeg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
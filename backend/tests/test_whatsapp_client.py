@@ -0,0 +1,114 @@
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "dummy")
+
+import asyncio
+import json
+import time
+
+from fastapi import HTTPException
+
+from benchmarks.fake_graph import FakeGraph
+from services import chat_manager
+from services.whatsapp_client import WhatsAppClient, WhatsAppError
+
+
+class WhatsAppClientTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = FakeGraph(media={"m1": b"x" * 300_000}).start()
+        self.addCleanup(self.graph.stop)
+
+    def run_with_client(self, scenario, **kwargs):
+        async def main():
+            client = WhatsAppClient(self.graph.url, "dummy-token", backoff=0.01, **kwargs)
+            try:
+                return await scenario(client)
+            finally:
+                await client.aclose()
+
+        return asyncio.run(main())
+
+    def test_concurrent_sends_share_pooled_connections_without_blocking(self):
+        self.graph.latency = 0.2
+
+        async def scenario(client):
+            payload = {"messaging_product": "whatsapp", "to": "519", "type": "text", "text": {"body": "hola"}}
+            started = time.perf_counter()
+            await asyncio.gather(*(client.send_message("123", payload) for _ in range(10)))
+            first = time.perf_counter() - started
+            await asyncio.gather(*(client.send_message("123", payload) for _ in range(10)))
+            return first
+
+        elapsed = self.run_with_client(scenario)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len(self.graph.sent), 20)
+        # la segunda tanda reutiliza las conexiones keep-alive de la primera
+        self.assertLessEqual(len(self.graph.peers), 10)
+
+    def test_retries_429_and_5xx_honouring_retry_after(self):
+        self.graph.fail_next = [(429, {"Retry-After": "0"}), (503, {})]
+
+        result = self.run_with_client(lambda c: c.media_info("m1"))
+
+        self.assertEqual(result["id"], "m1")
+        self.assertEqual(len(self.graph.requests), 3)
+
+    def test_send_retries_429_but_not_5xx(self):
+        self.graph.fail_next = [(429, {"Retry-After": "0"})]
+        result = self.run_with_client(lambda c: c.send_message("123", {"to": "519"}))
+        self.assertEqual(result["messages"][0]["id"], "wamid.1")
+        self.assertEqual(len(self.graph.requests), 2)
+
+        # Meta pudo haber entregado el mensaje antes del 5xx: reintentar lo duplicaría
+        self.graph.fail_next = [(502, {})]
+        with self.assertRaises(WhatsAppError) as ctx:
+            self.run_with_client(lambda c: c.send_message("123", {"to": "519"}))
+        self.assertEqual(ctx.exception.status_code, 502)
+        self.assertEqual(len(self.graph.requests), 3)
+
+    def test_gives_up_after_max_retries_or_on_long_rate_limit(self):
+        self.graph.fail_next = [(500, {})] * 5
+        with self.assertRaises(WhatsAppError) as ctx:
+            self.run_with_client(lambda c: c.media_info("m1"), max_retries=2)
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertEqual(len(self.graph.requests), 3)
+
+        # Meta pide esperar 5 minutos: se devuelve el 429 en vez de bloquear la petición
+        usage = json.dumps({"123": [{"type": "whatsapp", "estimated_time_to_regain_access": 5}]})
+        self.graph.fail_next = [(429, {"X-Business-Use-Case-Usage": usage})]
+        started = time.perf_counter()
+        with self.assertRaises(WhatsAppError) as ctx:
+            self.run_with_client(lambda c: c.send_message("123", {}))
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertLess(time.perf_counter() - started, 1.0)
+
+    def test_upload_lookup_and_download_media(self):
+        async def scenario(client):
+            uploaded = await client.upload_media("123", b"contenido-del-pdf", "doc.pdf", "application/pdf")
+            info = await client.media_info("m1")
+            return uploaded, await client.download(info["url"])
+
+        uploaded, content = self.run_with_client(scenario)
+        self.assertEqual(uploaded, {"id": "media-1"})
+        self.assertIn(b"contenido-del-pdf", self.graph.uploads[0])
+        self.assertEqual(content, self.graph.media["m1"])
+
+    def test_chat_manager_maps_graph_errors_to_502(self):
+        with patch.object(chat_manager, "WHATSAPP_API_URL", self.graph.url), \
+                patch.object(chat_manager, "WHATSAPP_ACCESS_TOKEN", "dummy-token"):
+            url = asyncio.run(chat_manager.get_whatsapp_media_url("m1"))
+            spool, stats = asyncio.run(chat_manager.download_whatsapp_media(url))
+            with spool:
+                spool.seek(0)
+                self.assertEqual(spool.read(), self.graph.media["m1"])
+            self.assertEqual(stats.bytes, len(self.graph.media["m1"]))
+            with self.assertRaises(HTTPException) as ctx:
+                asyncio.run(chat_manager.get_whatsapp_media_url("no-existe"))
+        self.assertEqual(ctx.exception.status_code, 502)
+
+
+if __name__ == "__main__":
+    unittest.main()